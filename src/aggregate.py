@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+from copy import deepcopy
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from core import JSON
+
+AggregateKey = Tuple[str, str, str]
+
+def _scriptHash(script: Optional[dict]) -> str:
+    if not isinstance(script, dict):
+        return ""
+    return script.get('contentHash') or script.get('domainHash') or str(script.get('url', ""))
+
+class EventAggregator(object):
+    """Optional stage in front of `Logger.log` merging repetitive events. Identical
+    (frameUID, event, content hash) tuples seen within `window` seconds are merged into
+    one record carrying an `aggregate` field with `count`, `firstSeen` and `lastSeen`.
+    The record is emitted once its window closes, or earlier if `max_open` windows are
+    already open, so that memory stays bounded.
+    """
+
+    # How to find the content hash of an aggregated event
+    keyers: Dict[str, Callable[[dict], str]] = {
+        "[Frame Execute Script]": lambda m: _scriptHash(m.get('Script')),
+        "[Script Call Script]": lambda m: "/".join(
+            [_scriptHash(m.get('callerScript')), _scriptHash(m.get('calleeScirpt'))]
+        )
+    }
+
+    def __init__(
+        self,
+        emit: Callable[[str, Dict[str, Any]], None],
+        window: Union[int, float] = 10,
+        max_open: int = 4096,
+        events: Optional[Iterable[str]] = None
+    ) -> None:
+        """
+        Args:
+            emit (Callable[[str, Dict[str, Any]], None]): called as `emit(origin, msg)` with the merged record
+            window (Union[int, float]): second of the aggregation window
+            max_open (int): maximum number of windows kept open at the same time
+            events (Optional[Iterable[str]]): name of the aggregated events. All known events if not set.
+        """
+        if not isinstance(window, (int, float)) or window <= 0:
+            raise ValueError(f"invalid aggregation window: {window}")
+        if not isinstance(max_open, int) or max_open < 1:
+            raise ValueError(f"invalid max_open: {max_open}")
+        self.emit = emit
+        self.window: timedelta = timedelta(seconds = window)
+        self.max_open = max_open
+        self.events = set(events) if events else set(self.keyers.keys())
+        self._open: "OrderedDict[AggregateKey, Dict[str, Any]]" = OrderedDict()
+        self.merged: int = 0
+        return None
+
+    def _key(self, origin: str, record: dict) -> AggregateKey:
+        keyer = self.keyers.get(origin)
+        content = keyer(record) if keyer else hashlib.md5(JSON.dumps(record, sort_keys = True).encode()).hexdigest()
+        return (str(record.get('frameUID')), origin, content)
+
+    def offer(self, origin: str, record: Dict[str, Any]) -> bool:
+        """Take the event if it is aggregated.
+
+        Returns:
+            bool: `True` if the event has been absorbed, and the caller should not log it.
+        """
+        if origin not in self.events:
+            return False
+        now = datetime.now()
+        self.expire(now)
+
+        key = self._key(origin, record)
+        if (opened := (self._open.get(key))):
+            opened['count'] += 1
+            opened['lastSeen'] = now
+            self.merged += 1
+            return True
+
+        while len(self._open) >= self.max_open:
+            self._close(*self._open.popitem(last = False))
+        # Handlers keep mutating the state they log, e.g. the `callScriptHistory` of the
+        # scripts of `[Script Call Script]`, so the record is copied as it is when seen
+        self._open[key] = {
+            "record": deepcopy(record),
+            "count": 1,
+            "firstSeen": now,
+            "lastSeen": now
+        }
+        return True
+
+    def _close(self, key: AggregateKey, opened: Dict[str, Any]) -> None:
+        record = opened.get('record')
+        record['aggregate'] = {
+            "count": opened.get('count'),
+            "firstSeen": opened.get('firstSeen').isoformat(),
+            "lastSeen": opened.get('lastSeen').isoformat()
+        }
+        self.emit(key[1], record)
+        return None
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Close every window older than `window`. Windows are kept in opening order,
+        so only the head of the pool has to be examined.
+        """
+        now = now if now else datetime.now()
+        closed = 0
+        while self._open:
+            key, opened = next(iter(self._open.items()))
+            if now - opened.get('firstSeen') < self.window:
+                break
+            self._open.popitem(last = False)
+            self._close(key, opened)
+            closed += 1
+        return closed
+
+    def flush(self) -> bool:
+        while self._open:
+            self._close(*self._open.popitem(last = False))
+        return True
+
+    async def run(self) -> None:
+        interval = min(self.window.total_seconds(), 1)
+        while True:
+            await asyncio.sleep(interval)
+            self.expire()
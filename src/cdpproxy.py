@@ -0,0 +1,213 @@
+import asyncio
+import json
+import itertools
+from functools import partial
+from typing import Any, Dict, Optional, Set, Tuple
+
+from aiohttp import web, WSMsgType
+
+from core import ChromeBridge
+import chrometypes as Types
+
+class CdpProxy(object):
+    """Local CDP endpoint multiplexing several downstream consumers (HAR recorder, a second
+    analyzer, ...) over the single upstream browser connection of a `ChromeBridge`.
+
+    - Commands of downstream clients are re-numbered into a namespace above `ID_BASE`,
+      which `Handler.sendCommand` never reaches, and the replies are routed back with the
+      original id.
+    - Browser level events are fanned out to every client. Events of a flatten session are
+      sent to the clients sharing that session.
+    - Attaching to a target ChroMo has already attached to shares ChroMo's session, so the
+      browser instruments the target only once. Commands such as `*.enable` are still
+      forwarded, since their results, e.g. the `debuggerId` of `Debugger.enable`, are needed
+      by each client.
+
+    Downstream clients connect to `ws://<host>:<port>/devtools/browser/<id>`, which is also
+    advertised by `/json/version`.
+    """
+
+    ID_BASE = 1 << 30
+
+    def __init__(self, bridge: ChromeBridge, host: str = "127.0.0.1", port: int = 9333) -> None:
+        if not isinstance(bridge, ChromeBridge):
+            raise TypeError(f"bridge should be a ChromeBridge, not {type(bridge)}")
+        if not isinstance(port, int) or port < 0 or port > 65535:
+            raise ValueError(f"invalid port number: {port}")
+        self.bridge = bridge
+        self.host = host
+        self.port = port
+
+        self.clients: Dict[int, web.WebSocketResponse] = {}
+        self._client_ids = itertools.count(1)
+        self._upstream_ids = itertools.count(self.ID_BASE)
+        # upstream id -> (client id, downstream command)
+        self._routes: Dict[int, Tuple[Optional[int], Dict[str, Any]]] = {}
+
+        # Sessions attached by ChroMo itself: targetId -> Target.attachedToTarget params
+        self.targets: Dict[Types.Target.TargetID, Dict[str, Any]] = {}
+        # Sessions of ChroMo shared with clients: sessionId -> client ids
+        self.sharedSessions: Dict[Types.Target.SessionID, Set[int]] = {}
+        # Sessions attached by a client on its own: sessionId -> client id
+        self.clientSessions: Dict[Types.Target.SessionID, int] = {}
+        self._pendingAttach: Dict[Types.Target.TargetID, int] = {}
+        # Pending sends to clients, referenced until done
+        self._sending: Set[asyncio.Future] = set()
+
+        self.runner: Optional[web.AppRunner] = None
+        return None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/json/version", self._version)
+        app.router.add_get("/devtools/browser/{browserId}", self._serveClient)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host = self.host, port = self.port).start()
+        print(f"[+ In {self.__class__.__name__}] CDP proxy listening on ws://{self.host}:{self.port}")
+        return None
+
+    async def shutDown(self) -> bool:
+        for ws in list(self.clients.values()):
+            await ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+        return True
+
+    async def _version(self, request: web.Request) -> web.Response:
+        info: Dict[str, Any] = await asyncio.get_event_loop().run_in_executor(None, self.bridge.getDebuggeeInfo)
+        browserId = info.get("webSocketDebuggerUrl", "").rsplit("/", 1)[-1]
+        info["webSocketDebuggerUrl"] = f"ws://{self.host}:{self.port}/devtools/browser/{browserId}"
+        return web.json_response(info)
+
+    async def _serveClient(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size = 0)
+        await ws.prepare(request)
+        cid = next(self._client_ids)
+        self.clients[cid] = ws
+        print(f"[+ In {self.__class__.__name__}] client {cid} connected from {request.remote}")
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    self._forward(cid, json.loads(msg.data))
+                elif msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._disconnect(cid)
+            print(f"[+ In {self.__class__.__name__}] client {cid} disconnected")
+        return ws
+
+    def _send(self, cid: int, obj: Dict[str, Any]) -> None:
+        ws = self.clients.get(cid)
+        if ws is None or ws.closed:
+            return None
+        future = asyncio.ensure_future(ws.send_str(json.dumps(obj)))
+        self._sending.add(future)
+        future.add_done_callback(partial(self._sent, cid))
+        return None
+
+    def _sent(self, cid: int, future: asyncio.Future) -> None:
+        self._sending.discard(future)
+        if not future.cancelled() and (e := (future.exception())) is not None:
+            print(f"[+ In {self.__class__.__name__}] sending to client {cid} failed: {e!r}")
+        return None
+
+    def _reply(self, cid: int, command: Dict[str, Any], result: Dict[str, Any]) -> None:
+        reply = {"id": command.get('id'), "result": result}
+        if command.get('sessionId'):
+            reply['sessionId'] = command.get('sessionId')
+        self._send(cid, reply)
+        return None
+
+    def _forward(self, cid: int, command: Dict[str, Any]) -> None:
+        method: str = command.get('method', "")
+        params: Dict[str, Any] = command.get('params', {})
+
+        if method == "Target.attachToTarget" and params.get('flatten'):
+            if (attached := (self.targets.get(params.get('targetId')))):
+                sid = attached.get('sessionId')
+                self.sharedSessions.setdefault(sid, set()).add(cid)
+                self._send(cid, {"method": "Target.attachedToTarget", "params": attached})
+                self._reply(cid, command, {"sessionId": sid})
+                return None
+            self._pendingAttach[params.get('targetId')] = cid
+
+        if method == "Target.detachFromTarget" and params.get('sessionId') in self.sharedSessions:
+            # Never detach the session ChroMo is working on
+            self.sharedSessions[params.get('sessionId')].discard(cid)
+            self._reply(cid, command, {})
+            return None
+
+        upstream = dict(command)
+        upstream['id'] = next(self._upstream_ids)
+        self._routes[upstream['id']] = (cid, command)
+        self.bridge.sendObj(upstream)
+        return None
+
+    def _disconnect(self, cid: int) -> None:
+        self.clients.pop(cid, None)
+        for sessions in self.sharedSessions.values():
+            sessions.discard(cid)
+        for tid in [t for t, c in self._pendingAttach.items() if c == cid]:
+            self._pendingAttach.pop(tid)
+        for sid in [s for s, c in self.clientSessions.items() if c == cid]:
+            self.clientSessions.pop(sid)
+            _cmd: Types.Generic.DebugCommand = {
+                "id": next(self._upstream_ids),
+                "method": "Target.detachFromTarget",
+                "params": {"sessionId": sid}
+            }
+            self._routes[_cmd['id']] = (None, _cmd)
+            self.bridge.sendObj(_cmd)
+        return None
+
+    def publish(self, msg: Dict[str, Any]) -> bool:
+        """Route a message received from upstream.
+
+        Returns:
+            bool: `True` if the message belongs to downstream clients only, and must not be
+                dispatched to ChroMo handlers.
+        """
+        if (mid := (msg.get('id'))) is not None:
+            if mid not in self._routes:
+                return False
+            cid, command = self._routes.pop(mid)
+            if cid is not None:
+                self._send(cid, dict(msg, id = command.get('id')))
+            return True
+
+        method = msg.get('method')
+        if not method:
+            return False
+        params: Dict[str, Any] = msg.get('params', {})
+
+        if (sid := (msg.get('sessionId'))):
+            if (cid := (self.clientSessions.get(sid))) is not None:
+                self._send(cid, msg)
+                return True
+            for cid in self.sharedSessions.get(sid, ()):
+                self._send(cid, msg)
+            return False
+
+        if method == "Target.attachedToTarget":
+            tid = params.get('targetInfo', {}).get('targetId')
+            if (cid := (self._pendingAttach.pop(tid, None))) is not None:
+                self.clientSessions[params.get('sessionId')] = cid
+                self._send(cid, msg)
+                return True
+            self.targets[tid] = params
+        elif method == "Target.detachedFromTarget":
+            sid = params.get('sessionId')
+            if (cid := (self.clientSessions.pop(sid, None))) is not None:
+                self._send(cid, msg)
+                return True
+            for cid in self.sharedSessions.pop(sid, ()):
+                self._send(cid, msg)
+            self.targets = {t: p for t, p in self.targets.items() if p.get('sessionId') != sid}
+            return False
+        elif method == "Target.targetDestroyed":
+            self.targets.pop(params.get('targetId'), None)
+
+        for cid in list(self.clients.keys()):
+            self._send(cid, msg)
+        return False
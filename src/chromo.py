@@ -7,7 +7,10 @@ import pyfiglet
 
 from core import ChromeBridge, Logger, CliCmd
 import  chrometypes as Types
-from handlers import Handler
+from handlers import Handler, eventsDroppedHandler, startupSweepHandler
+from overload import LoadShedder
+from aggregate import EventAggregator
+from cdpproxy import CdpProxy
 
 class ChroMo(object):
 
@@ -37,19 +40,54 @@ class ChroMo(object):
         
         self.chrome = ChromeBridge(
             host = self.config['target']['debugeehost'],
-            port = self.config['target']['debugeeport']
+            port = self.config['target']['debugeeport'],
+            compression = self.config['target'].get('compression', False)
         )
+        self.proxy = None
+        proxy: dict = self.config.get('proxy', {})
+        if proxy.get('enable', False):
+            self.proxy = CdpProxy(
+                bridge = self.chrome,
+                host = proxy.get('host', "127.0.0.1"),
+                port = proxy.get('port', 9333)
+            )
         self.logger = Logger(
             dir_ = self.config['logging']['local']['dir'],
             username = self.config['logging']['hostname'],
             tag = self.config['logging']['tag'],
             strict_form = self.config['logging']['strict'],
             ifremote = self.config.get("logging").get('enable_remote', False),
+            writer_options = self.config['logging']['local'].get('writer'),
+            suffix = self.config['logging']['local'].get('suffix'),
+            format_ = self.config['logging']['local'].get('format'),
+            delta_options = self.config['logging']['local'].get('delta'),
+            split_options = self.config['logging']['local'].get('split'),
+            sqlite_options = self.config['logging']['local'].get('sqlite'),
+            index_options = self.config['logging']['local'].get('index'),
+            rotate_options = self.config['logging']['local'].get('rotate'),
             **self.config.get('logging').get('remote')
         )
+        self.shedder = None
+        overload: dict = self.config.get('overload', {})
+        if overload.get('enable', False):
+            self.shedder = LoadShedder(
+                steps = overload.get('steps'),
+                sample_rate = overload.get('sample_rate', 10)
+            )
+        self.aggregator = None
+        aggregate: dict = self.config.get('logging').get('aggregate', {})
+        if aggregate.get('enable', False):
+            self.aggregator = EventAggregator(
+                emit = lambda origin, msg: Handler.writeEvent(msg = msg, origin = origin),
+                window = aggregate.get('window', 10),
+                max_open = aggregate.get('max_open', 4096),
+                events = [f"[{x}]" for x in aggregate.get('events', [])]
+            )
         self.handler_host = Handler(
             interface = self.chrome,
-            logger = self.logger
+            logger = self.logger,
+            shedder = self.shedder,
+            aggregator = self.aggregator
         )
         self.clicmd = CliCmd.getScheme()
 
@@ -58,14 +96,21 @@ class ChroMo(object):
             "id": 1,
             "method": "Target.attachToBrowserTarget"
         }
+        # Reserve the id, so that commands of the startup sweep do not collide with it.
+        Handler._pending_command[_cmd['id']] = None
         self.chrome.sendObj(_cmd)
         pass
     
     def registerCliFunction(self) -> None:
         self.clicmd['log']['config']['show'] = lambda slf=self:\
-            print(f" +logging directory:  {slf.logger.logdir}{os.linesep} +log file name:      {slf.logger.new_file}{os.linesep} +file stream opened: {not slf.logger.fs.closed}{os.linesep} +logging paused:    {not slf.logger.onlogging}")
+            print(f" +logging directory:  {slf.logger.logdir}{os.linesep} +log file name:      {slf.logger.new_file}{os.linesep} +file stream opened: {not slf.logger.writer.closed}{os.linesep} +logging paused:    {not slf.logger.onlogging}")
         self.clicmd['log']['config']['set'] = lambda lines, slf=self: slf.logger.setLogFile(**dict([x.split("=") for x in lines]))
         self.clicmd['log']['config']['cd'] = lambda lines, slf=self: slf.logger.setDirectory(lines[0]) if lines else print(f"[+ Please specify directory]")
+        self.clicmd['log']['stats'] = lambda slf=self: [
+                [print(f" +{(f + ' ' if f else '') + k + ':':<20} {v}") for f, x in slf.logger.streams.items() for k, v in x.writer.stats().items()],
+                slf.logger.database and [print(f" +sqlite {k + ':':<13} {v}") for k, v in slf.logger.database.stats().items()],
+                slf.logger.remote and [print(f" +remote {k + ':':<13} {v}") for k, v in slf.logger.remote.stats().items()]
+            ]
         self.clicmd['log']['pause'] = lambda slf=self: slf.logger.disableLogging and print(f"{slf.logger.onlogging}")
         self.clicmd['log']['start'] = lambda slf=self: slf.logger.enableLogging and print(f"{slf.logger.onlogging}")
         self.clicmd['event']['show']['active'] = lambda slf=self: [print(" ".join((str(x[1]), x[0]))) for x in slf.handler_host._activedevent.items() if x[1] > 0]
@@ -74,20 +119,46 @@ class ChroMo(object):
             if not "all" in events else [slf.handler_host.disableEvent(x) for x in slf.handler_host._activedevent.keys()]
         self.clicmd['event']['enable'] = lambda events,slf=self: [slf.handler_host.enableEvent(x) for x in events]\
             if not "all" in events else [slf.handler_host.enableEvent(x) for x in slf.handler_host._activedevent.keys()]
-        self.clicmd['exit'] = lambda slf=self: slf.logger.shutDown() and slf.chrome.shutDown() and asyncio.get_event_loop().stop() and exit(0)
-        self.clicmd['help'] = lambda : print(f" +log config show/set [username=lien tag=chen]/cd <directory>{os.linesep} +log pause/start{os.linesep}{os.linesep} +event show active/all{os.linesep} +event enable/disable all/<sequenc of nums>{os.linesep} +exit")
+        self.clicmd['chrome']['config'] = lambda slf=self: print(
+            f" +debugee:             {slf.chrome.debuggee_dest}{os.linesep} +compression:         {slf.chrome.aws.compress if slf.chrome.aws else slf.chrome.compression}{os.linesep}" +\
+            os.linesep.join(f" +{k + ':':<20} {v}" for k, v in slf.chrome.wireStats.items()))
+        self.clicmd['exit'] = lambda slf=self: (not slf.aggregator or slf.aggregator.flush()) and slf.logger.close() and slf.chrome.shutDown() and asyncio.get_event_loop().stop() and exit(0)
+        self.clicmd['help'] = lambda : print(f" +log config show/set [username=lien tag=chen]/cd <directory>{os.linesep} +log pause/start/stats{os.linesep}{os.linesep} +event show active/all{os.linesep} +event enable/disable all/<sequenc of nums>{os.linesep}{os.linesep} +chrome config{os.linesep} +exit")
         return None
 
     async def entrypoint(self) -> None:
+        await self.chrome.open()
+        if self.proxy:
+            await self.proxy.start()
         print(f"[+ In {self.__class__.__name__}] run attachToBrowser...")
         self.attachToBrowser()
         print(f"[+ In {self.__class__.__name__}] browser attaching success")
 
         tsk = asyncio.create_task(self.startCli())
+        sweep: dict = self.config['target'].get('startup_sweep', {})
+        if sweep.get('enable', True):
+            asyncio.create_task(
+                startupSweepHandler._INSTANCE.sweep(
+                    window = sweep.get('window', 8),
+                    timeout = sweep.get('timeout', 10)
+                )
+            )
+        if self.aggregator:
+            asyncio.create_task(self.aggregator.run())
+        if self.shedder:
+            asyncio.create_task(
+                eventsDroppedHandler._INSTANCE.report(
+                    interval = self.config['overload'].get('report_interval', 30)
+                )
+            )
 
         while True:
             msg = self.chrome.getReply()
             if msg:
+                if self.proxy and self.proxy.publish(msg):
+                    continue
+                if self.shedder and not self.shedder.admit(msg):
+                    continue
                 asyncio.create_task(self.handler_host.dispatch(msg))
             else:
                 await asyncio.sleep(0)
@@ -1,5 +1,5 @@
 import os, sys
-from datetime import datetime, timedelta
+from datetime import datetime
 from asyncio.exceptions import InvalidStateError
 import requests
 import websocket
@@ -8,27 +8,42 @@ import asyncio
 import copy
 import aiohttp
 import requests
-from typing import Generator, Iterable, Type, Union, List, Dict, Any, Optional
+from typing import Generator, Iterable, Type, Union, List, Dict, Any, Optional, Set
 import json
 from functools import partial
 from itertools import tee
 
 import chrometypes as Types
-
-class JSON(object):
-    dumps = partial(json.dumps, default = lambda o: None)
+from logwriter import BatchedWriter
+from logrotate import LogRotator
+from remotesink import RemoteSink
+from spool import DiskSpool
+from logformat import JSON, TextFormat, getFormat
+from logdelta import FrameDeltaEncoder
+from logstream import FamilyRouter, LogStream
+from logindex import OffsetIndexer, appendSegment, indexPath
+from logblock import decompressedSize
+from sqlitesink import SqliteSink
 
 class ChromeBridge(object):
     """
     This object implement the raw IO with debugging browser process
     """
 
-    def __init__(self, host: str = "localhost", port: int = 9222, timeout: Union[int, float] = 0):
+    def __init__(
+        self, 
+        host: str = "localhost", 
+        port: int = 9222, 
+        timeout: Union[int, float] = 0,
+        compression: bool = False
+    ):
         """
         Args:
             host (str): IP or Hostname of the debugee browser
             port (int): port of the debugee browser
             timeout (int | float): second of the websocket for blocking function like WebSocket.recv
+            compression (bool): negotiate permessage-deflate with the debugee. The connection is
+                then opened by `open` inside the event loop.
         """
 
         if not isinstance(host, str):
@@ -47,6 +62,21 @@ class ChromeBridge(object):
         self.port = port
         self.wstimeout = timeout
         self.coreQueue = asyncio.Queue()
+        self.compression = compression
+        self.ws: Optional[websocket.WebSocket] = None
+        self.aws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Pending sends of the compressed connection, referenced until done
+        self._sending: Set[asyncio.Future] = set()
+        # The wire counters are only measured on the compressed connection, see `_countWireBytes`
+        self.wireStats: Dict[str, Optional[int]] = {
+            "rxMessages": 0,
+            "rxPayloadBytes": 0,
+            "rxWireBytes": 0 if compression else None,
+            "txMessages": 0,
+            "txPayloadBytes": 0,
+            "txWireBytes": 0 if compression else None
+        }
 
         ready = False
 
@@ -60,12 +90,11 @@ class ChromeBridge(object):
                     break
             except requests.exceptions.ConnectionError:
                 time.sleep(1)
-        print(f"[+ In {self.__class__.__name__}] run connectBrowser")
-        self.connectBrowser()
+        if not self.compression:
+            print(f"[+ In {self.__class__.__name__}] run connectBrowser")
+            self.connectBrowser()
 
-    def connectBrowser(self) -> None:
-        """Connect to Global debugee (Browser) itself
-        """
+    def getDebuggeeInfo(self) -> Types.Generic.GlobalDebugableInfo:
         _endpoint = "/json/version"
         while True:
             try:
@@ -75,8 +104,12 @@ class ChromeBridge(object):
                 break
             except requests.exceptions.ConnectionError:
                 time.sleep(3)
+        return json.loads(_rsp.text)
 
-        debugeeinfo: Types.Generic.GlobalDebugableInfo = json.loads(_rsp.text)
+    def connectBrowser(self) -> None:
+        """Connect to Global debugee (Browser) itself
+        """
+        debugeeinfo: Types.Generic.GlobalDebugableInfo = self.getDebuggeeInfo()
 
         self.ws: websocket.WebSocket = websocket.create_connection(
             url = debugeeinfo.get("webSocketDebuggerUrl")
@@ -85,6 +118,76 @@ class ChromeBridge(object):
         print(f"[+ In ChroMo] attach to browser success")
         return None
 
+    async def open(self) -> None:
+        """Open the compressed connection if `compression` is set. Nothing to do otherwise,
+        since the plain connection has been opened in `__init__`.
+        """
+        if self.compression and not self.aws:
+            print(f"[+ In {self.__class__.__name__}] run connectBrowserCompressed")
+            await self.connectBrowserCompressed()
+        return None
+
+    async def connectBrowserCompressed(self) -> None:
+        """Connect to Global debugee (Browser) with permessage-deflate. Received messages
+        are queued into `coreQueue` by a reader task and taken by `getReply`.
+        """
+        debugeeinfo: Types.Generic.GlobalDebugableInfo = await asyncio.get_event_loop().run_in_executor(
+            None, self.getDebuggeeInfo
+        )
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession()
+        self.aws = await self.session.ws_connect(
+            url = debugeeinfo.get("webSocketDebuggerUrl"),
+            compress = 15,
+            max_msg_size = 0
+        )
+        if self.aws.compress:
+            print(f"[+ In {self.__class__.__name__}] permessage-deflate negotiated, window bits: {self.aws.compress}")
+        else:
+            print(f"[+ In {self.__class__.__name__}] debugee does not support permessage-deflate, uncompressed")
+        self._countWireBytes()
+        asyncio.create_task(self._receiveCompressed())
+        print(f"[+ In ChroMo] attach to browser success")
+        return None
+
+    def _countWireBytes(self) -> None:
+        """Hook the byte counters on the raw connection under the aiohttp websocket.
+        This relies on aiohttp (3.7) internals, the wire counters are disabled (`None`)
+        if they are not available.
+        """
+        try:
+            conn = self.aws._response.connection
+            protocol, transport = conn.protocol, conn.transport
+            data_received, write = protocol.data_received, transport.write
+        except AttributeError:
+            self.wireStats["rxWireBytes"] = self.wireStats["txWireBytes"] = None
+            return None
+
+        def _received(data: bytes) -> None:
+            self.wireStats["rxWireBytes"] += len(data)
+            return data_received(data)
+
+        def _write(data: bytes) -> None:
+            self.wireStats["txWireBytes"] += len(data)
+            return write(data)
+
+        protocol.data_received = _received
+        transport.write = _write
+        return None
+
+    async def _receiveCompressed(self) -> None:
+        aws = self.aws
+        while True:
+            msg = await aws.receive()
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self.coreQueue.put_nowait(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                if self.aws is aws:
+                    print(f"[+ In {self.__class__.__name__}] connection closed, reconnecting...")
+                    self.aws = None
+                    await self.connectBrowserCompressed()
+                return None
+
     def listTabs(self) -> List[Types.Generic.TabInfo]:
         """Return a List of tabInfo
         An example of a tab in the returned list will looks like:
@@ -118,24 +221,57 @@ class ChromeBridge(object):
         Todo:
             Implement the blocking send command and receive from the send result
         """
-        self.ws.send(
-            payload = json.dumps(obj)
-        )
+        payload = json.dumps(obj)
+        size = len(payload.encode())
+        if self.compression:
+            if self.aws is None:
+                # Reconnecting, see `_receiveCompressed`
+                print(f"[+ In {self.__class__.__name__}] not connected, command dropped: {obj.get('method')}")
+                return None
+            future = asyncio.ensure_future(self.aws.send_str(payload))
+            self._sending.add(future)
+            future.add_done_callback(self._sent)
+        else:
+            self.ws.send(
+                payload = payload
+            )
+        self.wireStats["txMessages"] += 1
+        self.wireStats["txPayloadBytes"] += size
         return obj.get('id')
+
+    def _sent(self, future: asyncio.Future) -> None:
+        self._sending.discard(future)
+        if not future.cancelled() and (e := (future.exception())) is not None:
+            print(f"[+ In {self.__class__.__name__}] send failed: {e!r}")
+        return None
     
     def getReply(self) -> Union[Dict["str", Any], None]:
-        try:
-            _msg = self.ws.recv()
-            _rply_obj: Dict["str", Any] = json.loads(_msg)
-        except BlockingIOError:
-            _rply_obj = {}
-        except websocket._exceptions.WebSocketConnectionClosedException:
-            _rply_obj = {}
-            self.connectBrowser()
+        if self.compression:
+            try:
+                _msg = self.coreQueue.get_nowait()
+            except asyncio.QueueEmpty:
+                return {}
+        else:
+            try:
+                _msg = self.ws.recv()
+            except BlockingIOError:
+                return {}
+            except websocket._exceptions.WebSocketConnectionClosedException:
+                self.connectBrowser()
+                return {}
+        self.wireStats["rxMessages"] += 1
+        self.wireStats["rxPayloadBytes"] += len(_msg.encode())
+        _rply_obj: Dict["str", Any] = json.loads(_msg)
         return _rply_obj
     
     def shutDown(self) -> bool:
-        self.ws.close()
+        if self.ws:
+            self.ws.close()
+        if self.aws:
+            aws, self.aws = self.aws, None
+            asyncio.ensure_future(aws.close())
+        if self.session and not self.session.closed:
+            asyncio.ensure_future(self.session.close())
         return True
 
 class Logger(object):
@@ -148,6 +284,14 @@ class Logger(object):
         stdout: Optional[bool] = False, 
         strict_form: Optional[bool] = False,
         ifremote: Optional[bool] = False,
+        writer_options: Optional[Dict[str, Any]] = None,
+        suffix: Optional[str] = None,
+        format_: Optional[str] = None,
+        delta_options: Optional[Dict[str, Any]] = None,
+        rotate_options: Optional[Dict[str, Any]] = None,
+        split_options: Optional[Dict[str, Any]] = None,
+        sqlite_options: Optional[Dict[str, Any]] = None,
+        index_options: Optional[Dict[str, Any]] = None,
         **kwargs
     ) -> None:
         """Using `dir_` to specify the directory that the logging destination. 
@@ -159,15 +303,55 @@ class Logger(object):
             username (Optional[str]): `username` will be set to `default` if not set
             tag (Optional[str]): `tag` wil be set to `default` if not set.
             stdout (Optional[bool]): specify if display logged event to stdout.
+            writer_options (Optional[Dict[str, Any]]): batching and durability policy of the
+                `BatchedWriter` writing the log file.
+            suffix (Optional[str]): suffix of log file name. Default suffix of the format if not set.
+            format_ (Optional[str]): record format of the log file, `text` or `msgpack`.
+                See `logformat`.
+            delta_options (Optional[Dict[str, Any]]): delta encoding of `frameInfo` in the log
+                file, see `logdelta`. Disabled if not set or `enable` is unset.
+            rotate_options (Optional[Dict[str, Any]]): rotation, compression and retention policy
+                of the `LogRotator`.
+            split_options (Optional[Dict[str, Any]]): one stream per event family, see `logstream`.
+                Disabled if not set or `enable` is unset. `families` overrides the default families.
+            sqlite_options (Optional[Dict[str, Any]]): also insert records into an SQLite database,
+                see `sqlitesink`. Disabled if not set or `enable` is unset. `path` defaults to
+                `<dir_>/<username>-<tag>.sqlite`.
+            index_options (Optional[Dict[str, Any]]): write the sidecar offset index of each log
+                file, see `logindex`. Disabled if not set or `enable` is unset.
         """
         super().__init__()
         self.stdout = stdout
-        self.fs = None
+        self.rotator: LogRotator = LogRotator(**(rotate_options or {}))
+        self.format = getFormat(format_, strict = strict_form)
+
+        delta_options = dict(delta_options or {})
+        ifdelta = delta_options.pop('enable', False)
+        index_options = dict(index_options or {})
+        ifindex = index_options.pop('enable', False)
+        split_options = dict(split_options or {})
+        self.router: Optional[FamilyRouter] = None
+        if split_options.get('enable', False):
+            self.router = FamilyRouter(split_options.get('families'))
+        # Sequence number shared by the split streams, orders the records of a same timestamp
+        self.seq: int = 0
+        self.streams: Dict[str, LogStream] = {
+            family: LogStream(
+                family = family,
+                writer = BatchedWriter(**(writer_options or {})),
+                delta = FrameDeltaEncoder(**delta_options) if ifdelta else None,
+                index = OffsetIndexer(**index_options) if ifindex else None
+            )
+            for family in (self.router.families if self.router else [""])
+        }
+        self.suffix: str = suffix if suffix else self.format.suffix
+        if self.writer.block_records:
+            self.suffix += ".gz"
+        self.remote: Optional[RemoteSink] = None
+        self.database: Optional[SqliteSink] = None
         self.onlogging: bool = True
         self.strict: bool = strict_form
         self.ifremote: bool = ifremote
-        self.time_range: timedelta = timedelta(hours = 24)
-        self.current_time: datetime = datetime.now()
         if dir_:
             if not isinstance(dir_, str):
                 raise TypeError(f"dir_ should be type str, not {dir_}")
@@ -194,55 +378,85 @@ class Logger(object):
         if not os.path.isdir(self.logdir):
             raise NotADirectoryError(f"{self.logdir} is not a directory")
         
-        t = f"{self.tag}-{self.current_time.date().isoformat()}"
-        self.setLogFile(username = self.username, tag = t)
-        asyncio.create_task(self.flush())
+        self.setLogFile(username = self.username, tag = self.tag)
+        for stream in self.streams.values():
+            self.rotator.retireLeftovers(stream.path)
+        if sqlite_options and sqlite_options.get('enable', False):
+            self.setLogDatabase(sqlite_options)
         if ifremote:
             self.setLogRemote(kwargs)
             self.checkRemoteAlive()
         
         return None
-        
+
+    @property
+    def writer(self) -> BatchedWriter:
+        """Writer of the first stream, the only one in the single layout"""
+        return next(iter(self.streams.values())).writer
+
+    @property
+    def new_file(self) -> str:
+        return ", ".join(x.new_file for x in self.streams.values())
     
-    def log(self, origin: str, event: str, debug: Optional[bool] = False) -> None:
+    def log(
+        self, 
+        event_name: str, 
+        event_data: Dict[str, Any], 
+        event_number: int = 0, 
+        debug: Optional[bool] = False
+    ) -> None:
+        """Log a structured record. The record is built once, and encoded exactly once
+        per sink: the log file (in `self.format`) and the remote terminal.
+
+        Args:
+            event_name (str): name of the event, e.g. `[Frame Execute Script]`
+            event_data (Dict[str, Any]): the event message emitted by a handler
+            event_number (int): number of the event
+            debug (Optional[bool]): also print the logged line to stdout
+        """
         if not self.onlogging:
             return None
         now: datetime = datetime.now()
         now_iso: str = now.isoformat()
 
-        if now - self.current_time > self.time_range:
-            pass
-            #self.current_time: datetime = now
-            #t = f"{self.tag}-{self.current_time.date().isoformat()}"
-            #self.setLogFile(username = self.username, tag = t)
+        stream = self.streams[self.router.family(event_name)] if self.router else self.streams[""]
+        if self.rotator.due(stream.file_date, now, stream.written):
+            self.rotate(now, stream)
         
-        if self.strict or self.ifremote:
-            evt_num, evt_name = origin.split(" - ")
-            structured_event: Dict[str, Any] = json.loads(event)
-            structured_event = {
-                "eventNumber": evt_num,
-                "eventName": evt_name,
-                "eventData": json.loads(event),
-                "timestamp": now_iso
-            }
-            if self.strict:
-                event = json.dumps(structured_event)
-            if self.ifremote:
-                structured_event['fields'] = {}
-                structured_event['fields']['hostname'] = self.username
-                structured_event['fields']['logtag'] = self.tag
-                asyncio.create_task(self.logToRemote(structured_event))
+        record: Dict[str, Any] = {
+            "eventNumber": str(event_number),
+            "eventName": event_name,
+            "eventData": event_data,
+            "timestamp": now_iso
+        }
+        if self.router:
+            self.seq += 1
+            record['seq'] = self.seq
+        if self.ifremote:
+            self.logToRemote(dict(record, fields = {"hostname": self.username, "logtag": self.tag}))
+        if self.database:
+            # Encoded here, the event data may still be updated by handlers once logged
+            self.database.offer(record, JSON.dumps(event_data))
             
-        msg = " - ".join([now_iso, origin, event])
-        print(msg, file = self.fs)
+        if stream.delta:
+            # The remote terminal still gets full snapshots
+            record = dict(record, eventData = stream.delta.encode(event_data))
+        data = self.format.encode(record)
+        offset, stream.written = stream.written, stream.written + len(data)
+        stream.writer.write(data)
+        if stream.index:
+            stream.index.add(offset, len(data), record)
+            if stream.index.due:
+                self._sealIndex(stream)
 
         if debug:
-            print(msg)
+            print(TextFormat.line(record, self.strict))
         return None
 
     def setLogFile(self, username: Optional[str] = None, tag: Optional[str] = None) -> None:
-        """New log file. It will close current file stream if file stream still
-        opened. and open a new file stream.
+        """New log file named `<username>-<tag>-<date><suffix>`, one per stream in the split
+        layout. It will close current file stream if file stream still opened. and open a new
+        file stream.
 
         Args:
             username (Optional[str]): [description]
@@ -259,25 +473,61 @@ class Logger(object):
         if not isinstance(tag, str):
             raise TypeError(f"tag should be str, not {type(tag)}")
 
-        self.new_file = "".join([username, "-", tag, ".log"])
-        full_path = os.path.join(self.logdir, self.new_file)
+        self.username, self.tag = username, tag
+        for stream in self.streams.values():
+            stream.file_date = datetime.now().date()
+            full_path = self.rotator.resumePath(self.logdir, stream.prefix(username, tag), self.suffix, stream.file_date)
+            self._switchFile(stream, full_path)
 
-        if os.path.exists(full_path):
-            print(f"[+ File already existed]: Appending...")
-            if self.fs and not self.fs.closed:
-                print(f"[+ Closing old file stream...]")
-                self.fs.flush()
-                self.fs.close()
-            self.fs = open(full_path, "a")
-            print(os.linesep + "=" * 50 + os.linesep, file = self.fs)
-        else:
-            print("[+ Log file not existed]: Creating...")
-            if self.fs and not self.fs.closed:
+            if not stream.writer.closed:
                 print(f"[+ Closing old file stream...]")
-                self.fs.flush()
-                self.fs.close()
-            self.fs = open(full_path, "x")
+            if os.path.exists(full_path):
+                print(f"[+ File already existed]: Appending...")
+                # Binary formats skip the magic wherever it is found
+                header = self.format.magic or (os.linesep + "=" * 50 + os.linesep + os.linesep).encode("utf-8")
+                # Offsets of the index are in the decompressed content
+                size = decompressedSize(full_path) if self.writer.block_records else os.path.getsize(full_path)
+                stream.written = size + len(header)
+                stream.writer.open(full_path, "a", header = header)
+            else:
+                print("[+ Log file not existed]: Creating...")
+                stream.written = len(self.format.magic)
+                stream.writer.open(full_path, "x", header = self.format.magic)
+
+    def rotate(self, now: Optional[datetime] = None, stream: Optional[LogStream] = None) -> None:
+        """Continue in the next `<username>-<tag>-<date>[.<index>]<suffix>` file. The completed
+        file is compressed in background once the writer has closed it.
+
+        Args:
+            now (Optional[datetime]): current time
+            stream (Optional[LogStream]): stream to rotate, all of them if not set
+        """
+        now = now if now else datetime.now()
+        for stream in ([stream] if stream else self.streams.values()):
+            stream.file_date = now.date()
+            full_path = self.rotator.nextPath(self.logdir, stream.prefix(self.username, self.tag), self.suffix, stream.file_date)
+            self._switchFile(stream, full_path)
+            stream.written = len(self.format.magic)
+            stream.writer.open(full_path, "x", header = self.format.magic, on_close = self.rotator.retire)
+        return None
+
+    def _switchFile(self, stream: LogStream, full_path: str) -> None:
+        if stream.path:
+            self._sealIndex(stream)
+            self.rotator.active.discard(stream.path)
+        self.rotator.active.add(full_path)
+        stream.path = full_path
+        if stream.delta:
+            # Every log file starts with keyframes
+            stream.delta.reset()
+        return None
     
+    def _sealIndex(self, stream: LogStream) -> None:
+        """Append the pending index segment of the stream, once its records are written"""
+        if stream.index and (segment := (stream.index.seal())):
+            stream.writer.call(partial(appendSegment, indexPath(stream.path), segment))
+        return None
+
     def setDirectory(self, dir_: str) -> int:
         if not isinstance(dir_, str):
             raise TypeError(f"dir_ is not a str, is {type(dir_)}")
@@ -299,7 +549,6 @@ class Logger(object):
         host = kwargs.get('host', '192.168.50')
         port = kwargs.get('port', 8080)
 
-        self.session = aiohttp.ClientSession()
         self.remote_url = "".join(
             [
                 scheme,
@@ -309,33 +558,51 @@ class Logger(object):
                 ":" + str(port)
             ]
         )
+        spool = None
+        spool_options: Dict[str, Any] = dict(kwargs.get('spool') or {})
+        if spool_options.pop('enable', False):
+            spool = DiskSpool(
+                dir_ = spool_options.pop('dir', None) or os.path.join(self.logdir, "spool"),
+                **spool_options
+            )
+        self.remote = RemoteSink(url = self.remote_url, spool = spool, **(kwargs.get('shipping') or {}))
+        return None
+
+    def setLogDatabase(self, options: Dict[str, Any]) -> None:
+        options = dict(options)
+        options.pop('enable', None)
+        path = options.pop('path', None) or os.path.join(self.logdir, f"{self.username}-{self.tag}.sqlite")
+        self.database = SqliteSink(path = path, **options)
+        print(f"[+ Logging to database]: {path}")
         return None
 
     def checkRemoteAlive(self) -> None:
         if not self.remote_url:
             raise NotImplementedError(f"[In {self.__class__.__name__}]: remote url not exists")
-        r = requests.head(self.remote_url)
-        if r.ok:
+        try:
+            r = requests.head(self.remote_url, timeout = 10)
+        except requests.RequestException:
+            # Records are kept by the remote sink until the terminal is back
+            r = None
+        if r is not None and r.ok:
             print(f"[In {self.__class__.__name__}]: Remote logging terminal health ok. Url: {self.remote_url}")
         else:
             print(f"[In {self.__class__.__name__}]: Remote logging terminal health not ok. Url: {self.remote_url}")
         return None
 
-    async def logToRemote(self, msg: Dict[str, Any]) -> None:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url = self.remote_url, data = json.dumps(msg)) as rsp:
-                return rsp.ok
-
-    async def flush(self):
-        while True:
-            await asyncio.sleep(delay = 60)
-            if self.fs and not self.fs.closed:
-                self.fs.flush()
+    def logToRemote(self, msg: Dict[str, Any]) -> None:
+        """Queue the record for the next bulk post of the remote sink"""
+        self.remote.offer(JSON.dumps(msg))
+        return None
 
     @property
     def disableLogging(self) -> bool:
         self.onlogging = False
-        self.fs.flush()
+        for stream in self.streams.values():
+            self._sealIndex(stream)
+            stream.writer.flush()
+        if self.database:
+            self.database.flush()
         return self.onlogging
 
     @property
@@ -343,16 +610,27 @@ class Logger(object):
         self.onlogging = True
         return self.onlogging
 
+    def close(self) -> bool:
+        """Write out everything queued and stop the writer threads"""
+        for stream in self.streams.values():
+            if stream.writer.thread.is_alive():
+                self._sealIndex(stream)
+                stream.writer.stop()
+        self.rotator.shutDown(wait = False)
+        if self.database and self.database.thread.is_alive():
+            self.database.stop()
+        if self.remote:
+            self.remote.close()
+        return True
+
     async def shutDown(self) -> bool:
-        if self.fs and not self.fs.closed:
-            self.fs.close()
-        if self.session and not self.session.closed:
-            await self.session.close()
+        if self.remote:
+            await self.remote.shutDown()
+        self.close()
         return True
 
     def __exit__(self):
-        if self.fs:
-            self.fs.close()
+        self.close()
 
 class CliCmd(object):
     _Cmd: dict = {
@@ -364,7 +642,8 @@ class CliCmd(object):
                     "strict": None
                 },
                 "pause": None,
-                "start": None
+                "start": None,
+                "stats": None
             },
             "event": {
                 "show": {
@@ -1,6 +1,6 @@
 from asyncio import windows_events
 from itertools import tee
-from typing import Callable, Dict, Literal, Optional, Tuple, TypedDict, Union, List
+from typing import Any, Callable, Dict, Literal, Optional, Tuple, TypedDict, Union, List
 import asyncio
 import hashlib
 import copy
@@ -12,6 +12,8 @@ import time
 
 from core import ChromeBridge, Logger, create_window
 from core import JSON as json
+from overload import LoadShedder
+from aggregate import EventAggregator
 import chromeevents as Events
 import chrometypes as Types
 from chromods import FrameStatus, FrameStatusPool, NetworkSession, ScheduledNavigationPool, ScriptInfo, FrameScheduleInfo, NetworkInfo, StructuredUrl
@@ -38,6 +40,8 @@ class Handler(object):
 
     interface: ChromeBridge
     logger: Logger
+    shedder: Optional[LoadShedder] = None
+    aggregator: Optional[EventAggregator] = None
 
     def __init_subclass__(cls, interested_event: Union[str, List[str]], output_events: List[str]) -> None:
         cls.interested_event = interested_event
@@ -62,10 +66,18 @@ class Handler(object):
                 pass
         return super().__init_subclass__()
     
-    def __init__(self, interface: ChromeBridge, logger: Logger) -> None:
+    def __init__(
+        self, 
+        interface: ChromeBridge, 
+        logger: Logger, 
+        shedder: Optional[LoadShedder] = None,
+        aggregator: Optional[EventAggregator] = None
+    ) -> None:
         super().__init__()
         self.__class__.interface = interface
         self.__class__.logger = logger
+        self.__class__.shedder = shedder
+        self.__class__.aggregator = aggregator
 
     @classmethod
     async def dispatch(cls, msg: Union[Types.Generic.DebugReply, dict]) -> None:
@@ -74,23 +86,28 @@ class Handler(object):
             msg (Unioon[Types.Generic.DebugReply, Events.BaseEvenv]): the message that debuggee should reply
         """
 
-        if event := (msg.get('method')):
-            if not cls._subhandlers.get(event, None):
-                #print(f"[+ Dispatch Error] Handler for the event {event} are not implement yet with msg: {msg}")
-                # raise NotImplementedError(f"[Dispatch Error] Handler for the event {event} are not implement yet")
-                pass
-            else:
-                await cls._subhandlers.get(event).handle(msg)
-            return None
+        started = time.monotonic()
+        try:
+            if event := (msg.get('method')):
+                if not cls._subhandlers.get(event, None):
+                    #print(f"[+ Dispatch Error] Handler for the event {event} are not implement yet with msg: {msg}")
+                    # raise NotImplementedError(f"[Dispatch Error] Handler for the event {event} are not implement yet")
+                    pass
+                else:
+                    await cls._subhandlers.get(event).handle(msg)
+                return None
 
-        if mid := (msg.get('id')):
-            async with cls.cmd_lock:
-                cls._pending_command[mid] = msg
+            if mid := (msg.get('id')):
+                async with cls.cmd_lock:
+                    cls._pending_command[mid] = msg
+                return None
+            
+            print(f"[+ Dispatch Error] Handler does not recognize the message {msg}")
             return None
-        
-        print(f"[+ Dispatch Error] Handler does not recognize the message {msg}")
-        return None
-        #raise TypeError(f"[Dispatch Error] Handler does not recognize the message {msg}")
+            #raise TypeError(f"[Dispatch Error] Handler does not recognize the message {msg}")
+        finally:
+            if cls.shedder:
+                cls.shedder.done(time.monotonic() - started)
 
     async def sendCommand(
         self, 
@@ -123,28 +140,41 @@ class Handler(object):
     
     def logEvent(
         self, 
-        msg:str, 
+        msg: Dict[str, Any], 
         origin: Optional[str] = None, 
         debug: bool = False
     ) -> None:
+        """Log the event `origin` with `msg` as event data. `msg` is kept structured,
+        each sink of the logger encodes it exactly once.
+        """
         event_id = Handler._activedevent.get(origin, None)
         assert event_id is not None
 
         if event_id < 0:
             return None
+        if self.shedder and not self.shedder.keepEvent(origin):
+            return None
 
         if origin:
             if not isinstance(origin, str):
                 raise TypeError(f"origin is not str, is {type(origin)}")
-        if not isinstance(msg, str):
-            raise TypeError(f"msg is not str, is {type(msg)}")
+        if not isinstance(msg, dict):
+            raise TypeError(f"msg is not dict, is {type(msg)}")
         
         origin = self.__class__.__name__ if not origin else origin
-        origin = " - ".join([str(event_id), origin])
+        if self.aggregator and self.aggregator.offer(origin, msg):
+            return None
+        self.writeEvent(msg = msg, origin = origin, debug = debug)
+        return None
 
-        self.logger.log(
-            origin = self.__class__.__name__ if not origin else origin,
-            event = msg,
+    @classmethod
+    def writeEvent(cls, msg: Dict[str, Any], origin: str, debug: bool = False) -> None:
+        """Hand an event over to the logger. It is also the output of `EventAggregator`.
+        """
+        cls.logger.log(
+            event_number = abs(Handler._activedevent.get(origin, 0)),
+            event_name = origin,
+            event_data = msg,
             debug = debug
         )
         return None
@@ -313,7 +343,7 @@ class TargetAttachedHandler(
             _msg['frameInfo'].pop('navigationStatus')
 
             self.logEvent(
-                msg = json.dumps(_msg),
+                msg = _msg,
                 origin = "[Frame Info Update to]"
             )
             if (_openerFrameId := (t.get('openerFrameId'))):
@@ -330,7 +360,7 @@ class TargetAttachedHandler(
                 _msg['frameInfo'].pop('scriptStatus', {})
 
                 self.logEvent(
-                    msg = json.dumps(_msg),
+                    msg = _msg,
                     origin = "[Main Frame Created]" if self.frameStatusPool[fid]['mainFrame'] else "[Sub-Frame Created]"
                 )
             else:
@@ -370,7 +400,7 @@ class TargetAttachedHandler(
 
         try:
             self.logEvent(
-                msg = json.dumps(_msg),
+                msg = _msg,
                 origin = "[Main Frame Created]" if frameStatus.get('mainFrame') else "[Sub-Frame Created]"
             )
         except:
@@ -665,6 +695,152 @@ class TargetCreatedHandler(
         msg = await self.sendCommand(command = _cmd)
         return None
 
+class startupSweepHandler(
+    Handler,
+    interested_event = [],
+    output_events = ["[Sub-Frame Created]"]
+):
+    """Not bound to any debuggee event. Right after attaching to the browser, targets that
+    already existed (e.g. tabs opened before a service restart) never emit `Target.targetCreated`.
+    `sweep` attaches to them concurrently, and seeds `frameStatusPool` from their frame tree.
+    """
+    _INSTANCE = None
+
+    def __init__(self) -> None:
+        return None
+
+    async def handle(self, msg: dict) -> None:
+        return None
+
+    async def sweep(self, window: int = 8, timeout: Union[int, float] = 10) -> int:
+        """Attach to every pre-existing page and iframe target.
+
+        Args:
+            window (int): maximum number of targets being attached at the same time
+            timeout (Union[int, float]): second to wait for `Target.attachedToTarget` of a target
+
+        Returns:
+            int: number of swept targets
+        """
+        rsp = await self.sendCommand(command = {"method": "Target.getTargets"})
+        targets: List[Types.Target.TargetInfo] = rsp.get('result', {}).get('targetInfos', [])
+
+        candidates: List[Types.Target.TargetInfo] = []
+        async with self.trgt_session_lock:
+            for t in targets:
+                if not t.get('type') in ['page', 'iframe']:
+                    continue
+                if urlparse(url = t.get('url', ""))[0] == '':
+                    continue
+                if self._target_session.get(t.get('targetId')):
+                    # Attached or being attached by TargetCreatedHandler
+                    continue
+                self._target_session[t.get('targetId')] = "Pending"
+                candidates.append(t)
+
+        semaphore = asyncio.Semaphore(window)
+        async def _bounded(t: Types.Target.TargetInfo) -> None:
+            async with semaphore:
+                await self._attachAndSeed(t, timeout)
+
+        results = await asyncio.gather(*[_bounded(t) for t in candidates], return_exceptions = True)
+        for t, result in zip(candidates, results):
+            if isinstance(result, Exception):
+                print(f"[+ In {self.__class__.__name__}] sweeping target {t.get('targetId')} failed: {result!r}")
+        print(f"[+ In {self.__class__.__name__}] {len(candidates)} pre-existing targets swept")
+        return len(candidates)
+
+    async def _attachAndSeed(self, t: Types.Target.TargetInfo, timeout: Union[int, float]) -> None:
+        tid = t.get('targetId')
+        rsp = await self.sendCommand(
+            command = {
+                "method": "Target.attachToTarget",
+                "params": {
+                    "targetId": tid,
+                    "flatten": True
+                }
+            }
+        )
+        sessionId = rsp.get('result', {}).get('sessionId')
+        if not sessionId:
+            async with self.trgt_session_lock:
+                if self._target_session.get(tid) == "Pending":
+                    self._target_session.pop(tid)
+            return None
+
+        # The frame itself is registered by TargetAttachedHandler
+        deadline = time.monotonic() + timeout
+        while not tid in self.frameStatusPool:
+            if time.monotonic() > deadline:
+                return None
+            await asyncio.sleep(0)
+
+        rsp = await self.sendCommand(
+            command = {
+                "method": "Page.getFrameTree",
+                "sessionId": sessionId
+            }
+        )
+        if (tree := (rsp.get('result', {}).get('frameTree'))):
+            await self.seedFrameTree(tree)
+        return None
+
+    async def seedFrameTree(self, tree: Types.Page.FrameTree) -> int:
+        """Register all frames of `tree` in `frameStatusPool` in one pass, and emit
+        `[Sub-Frame Created]` for every child frame that was not known yet.
+        """
+        created: List[dict] = []
+        async with self.frame_status_lock:
+            stack_ = [(tree, None)]
+            while stack_:
+                node, parentFrameId = stack_.pop()
+                frame: Types.Page.Frame = node.get('frame', {})
+                fid = frame.get('id')
+                stack_.extend((child, fid) for child in node.get('childFrames', []) or [])
+
+                if (frameStatus := (self.frameStatusPool.get(fid))):
+                    if not frameStatus.get('loaderId'):
+                        frameStatus['loaderId'] = frame.get('loaderId')
+                    continue
+
+                parentStatus = self.frameStatusPool.get(parentFrameId, {})
+                frameStatus: FrameStatus = {
+                    "loaderId": frame.get('loaderId'),
+                    "openerFrameUID": parentStatus.get('UID'),
+                    "title": frame.get('name'),
+                    "url": urlparse(url = frame.get('url', ""))._asdict(),
+                    "mainFrame": parentFrameId is None,
+                    "UID": uuid.uuid4().__str__(),
+                    "contactedDomains": set(),
+                    "scriptStatus": dict(),
+                    "networkSessions": dict(),
+                    "navigationStatus": {
+                        "onScheduling": False,
+                        "reason": None,
+                        "destinationUrl": None,
+                        "script": None
+                    }
+                }
+                self.frameStatusPool[fid] = frameStatus
+                _msg = {
+                    "parentFrameUID": parentStatus.get('UID'),
+                    "frameUID": frameStatus.get('UID'),
+                    "frameId": fid,
+                    "frameInfo": deepcopy(frameStatus)
+                }
+                _msg['frameInfo'].pop('contactedDomains')
+                _msg['frameInfo'].pop('scriptStatus')
+                _msg['frameInfo'].pop('networkSessions')
+                _msg['frameInfo'].pop('navigationStatus')
+                created.append(_msg)
+
+        for _msg in created:
+            self.logEvent(
+                msg = _msg,
+                origin = "[Sub-Frame Created]"
+            )
+        return len(created)
+
 class targetInfoChangeHandler(
     Handler, 
     interested_event = "Target.targetInfoChanged",
@@ -707,7 +883,7 @@ class targetInfoChangeHandler(
             msg['frameInfo'].pop('navigationStatus')
 
             self.logEvent(
-                msg = json.dumps(msg),
+                msg = msg,
                 origin = "[Frame Info Update to]"
             )
 
@@ -717,7 +893,7 @@ class targetInfoChangeHandler(
         }
         """
         self.logEvent(
-            msg = json.dumps(well_msg),
+            msg = well_msg,
             origin = "[Target Update to]"
         )
         """
@@ -752,7 +928,7 @@ class targetDestroyHandler(
                 "sessionId": sessid
             }
             self.logEvent(
-                msg = json.dumps(well_msg),
+                msg = well_msg,
                 origin = "[Target Destroyed]"
             )
         frameStatus = self.frameStatusPool.pop(destroyedTargetId, {})
@@ -873,7 +1049,7 @@ class frameAttachedHandler(
         _msg['frameInfo'].pop('networkSessions')
         _msg['frameInfo'].pop('navigationStatus')
         self.logEvent(
-            msg = json.dumps(_msg),
+            msg = _msg,
             origin = "[Frame Attach to Frame]"
         )
         
@@ -904,7 +1080,7 @@ class frameAttachedHandler(
             _msg['Script'].pop('httpGetUrls', None)
 
             self.logEvent(
-                msg = json.dumps(_msg),
+                msg = _msg,
                 origin = "[Script Create Sub-Frame]"
             )
         else:
@@ -933,7 +1109,7 @@ class downloadWillBeginHandler(
             "downloadInfo": event_
         }
         self.logEvent(
-            msg = json.dumps(_msg),
+            msg = _msg,
             origin = "[File Download Start]"
         )
         return None
@@ -951,7 +1127,7 @@ class fileChooserOpenedHandler(
     async def handle(self, msg: Events.Page.fileChooserOpened) -> None:
         event_ = msg.get('params')
         self.logEvent(
-            msg = json.dumps(event_),
+            msg = event_,
             origin = "[File Chooser Opened]",
             debug = True
         )
@@ -1090,7 +1266,7 @@ class scriptParsedHandler(
                 "Script": deepcopy(scriptInfo)
             }
             self.logEvent(
-                msg = json.dumps(script_initiate_info),
+                msg = script_initiate_info,
                 origin = "[Script Spawn Script]"
             )
             self.handleStackTrace(strace = stack_, frameStatus = frameStatus)
@@ -1102,12 +1278,14 @@ class scriptParsedHandler(
         }
         if not _scheme.endswith("-extension"):
             self.logEvent(
-                msg = json.dumps(exe_msg),
+                msg = exe_msg,
                 origin = "[Frame Execute Script]"
             )
         return None
 
     def handleStackTrace(self, strace: Types.Runtime.StackTrace, frameStatus: FrameStatus):
+        if self.shedder and self.shedder.skipStackTrace():
+            return None
         #print(f"[+ Debugging] handleStackTrace called")
         #print(f"StackTrace: {strace}")
         #print("=======================")
@@ -1136,7 +1314,7 @@ class scriptParsedHandler(
             ]
         except:
             print(scriptInfo_pair)
-        [self.logEvent(msg = json.dumps(x), origin = "[Script Call Script]") for x in output_context]
+        [self.logEvent(msg = x, origin = "[Script Call Script]") for x in output_context]
         [caller["callScriptHistory"].add(callee.get('contentHash')) for callee, caller in scriptInfo_pair if isinstance(callee, dict) and isinstance(caller, dict) and isinstance(caller.get('callScriptHistory'), set)]
         pass
 
@@ -1224,7 +1402,7 @@ class frameNavigatedHandler(
             self.frameStatusPool[frameId] = frameStatus
 
             self.logEvent(
-                msg = json.dumps(_msg),
+                msg = _msg,
                 origin = "[Frame Navigate by Other]"
             )
             return None
@@ -1274,7 +1452,7 @@ class frameNavigatedHandler(
             _msg['script'].pop('httpGetUrls')
 
         self.logEvent(
-            msg = json.dumps(_msg),
+            msg = _msg,
             origin = f"[Frame Navigate by {self.initiator_map.get(reasons.get('reason'))}]"
         )
         return None
@@ -1540,4 +1718,32 @@ class responseReceivedHandler(
             return None
         
         head["response"] = event_.get('response')
-        pass
\ No newline at end of file
+        pass
+
+
+class eventsDroppedHandler(
+    Handler,
+    interested_event = [],
+    output_events = ["[Events Dropped]"]
+):
+    """Not bound to any debuggee event. It periodically emits what the `LoadShedder`
+    has shed, so that analysts know where the gaps in the log are.
+    """
+    _INSTANCE = None
+
+    def __init__(self) -> None:
+        return None
+
+    async def handle(self, msg: dict) -> None:
+        return None
+
+    async def report(self, interval: Union[int, float] = 30) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if not self.shedder:
+                continue
+            if (summary := (self.shedder.summary())):
+                self.logEvent(
+                    msg = summary,
+                    origin = "[Events Dropped]"
+                )
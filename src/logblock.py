@@ -0,0 +1,142 @@
+"""Block compressed log files. A block is a complete gzip member holding whole records,
+so that the file as a whole is a valid gzip stream (`zcat` works), and each block can be
+decompressed on its own.
+
+As in BGZF, the gzip header of each block carries an extra subfield `CH` with the size of
+the whole member, so a reader can hop from block to block by reading headers only, and
+seek straight to a block boundary.
+"""
+import io
+import zlib
+import struct
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+# ID1 ID2 CM FLG(FEXTRA) MTIME XFL OS XLEN | SI1 SI2 SLEN BSIZE
+_HEADER = struct.Struct("<BBBBIBBH")
+_SUBFIELD = struct.Struct("<ccHI")
+_TRAILER = struct.Struct("<II")
+HEADER_SIZE = _HEADER.size + _SUBFIELD.size
+
+def compressBlock(data: bytes, level: int = 6) -> bytes:
+    """Compress `data` into one gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+    size = HEADER_SIZE + len(body) + _TRAILER.size
+    return b"".join([
+        _HEADER.pack(0x1f, 0x8b, 8, 4, 0, 0, 255, _SUBFIELD.size),
+        _SUBFIELD.pack(b"C", b"H", 4, size),
+        body,
+        _TRAILER.pack(zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+    ])
+
+def blockSize(header: bytes) -> Optional[int]:
+    """Size of the member starting with `header`, `None` if it is not a block"""
+    if len(header) < HEADER_SIZE:
+        return None
+    id1, id2, cm, flg, _, _, _, xlen = _HEADER.unpack_from(header)
+    if (id1, id2, cm) != (0x1f, 0x8b, 8) or not flg & 4 or xlen != _SUBFIELD.size:
+        return None
+    si1, si2, slen, size = _SUBFIELD.unpack_from(header, _HEADER.size)
+    if (si1, si2, slen) != (b"C", b"H", 4):
+        return None
+    return size
+
+def isBlockFile(path: str) -> bool:
+    with open(path, "rb") as fd:
+        return blockSize(fd.read(HEADER_SIZE)) is not None
+
+def decompressedSize(path: str) -> int:
+    """Size of the content of the complete blocks of a block compressed file"""
+    with open(path, "rb") as fd:
+        return sum(x[2] for x in BlockReader(fd).sizes())
+
+def decompressBlock(block: bytes) -> bytes:
+    data = zlib.decompress(block[HEADER_SIZE:-_TRAILER.size], -zlib.MAX_WBITS)
+    crc, _ = _TRAILER.unpack_from(block, len(block) - _TRAILER.size)
+    if zlib.crc32(data) & 0xffffffff != crc:
+        raise ValueError("block checksum mismatch")
+    return data
+
+class BlockReader(object):
+    """Random access to the blocks of a block compressed log file. A block still being
+    written at the end of the file is not reported, which allows tailing the active file.
+    """
+
+    def __init__(self, fd: BinaryIO) -> None:
+        self.fd = fd
+        return None
+
+    def blocks(self, start: int = 0) -> Iterator[Tuple[int, int]]:
+        """Yield `(offset, size)` of the complete blocks from `start`, a block boundary"""
+        offset = start
+        while True:
+            self.fd.seek(offset)
+            size = blockSize(self.fd.read(HEADER_SIZE))
+            if size is None:
+                return None
+            self.fd.seek(offset + size - 1)
+            if not self.fd.read(1):
+                return None
+            yield offset, size
+            offset += size
+
+    def sizes(self, start: int = 0) -> Iterator[Tuple[int, int, int]]:
+        """Yield `(offset, size, decompressed size)` of the complete blocks from `start`"""
+        for offset, size in list(self.blocks(start)):
+            self.fd.seek(offset + size - 4)
+            yield offset, size, struct.unpack("<I", self.fd.read(4))[0]
+
+    def read(self, offset: int, size: Optional[int] = None) -> bytes:
+        """Decompress the block at `offset`"""
+        self.fd.seek(offset)
+        if size is None:
+            size = blockSize(self.fd.read(HEADER_SIZE))
+            if size is None:
+                raise ValueError(f"no block at offset {offset}")
+            self.fd.seek(offset)
+        return decompressBlock(self.fd.read(size))
+
+    def stream(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the decompressed blocks between the boundaries `start` and `end`"""
+        # Locate the blocks first, reading them moves the file position
+        spans = []
+        for offset, size in self.blocks(start):
+            if end is not None and offset >= end:
+                break
+            spans.append((offset, size))
+        for offset, size in spans:
+            yield self.read(offset, size)
+
+    def reader(self, start: int = 0, end: Optional[int] = None, closefd: bool = False) -> BinaryIO:
+        """File-like object over the decompressed content between `start` and `end`.
+        The underlying file is closed with it if `closefd` is set.
+        """
+        stream = _BlockStream(self.stream(start, end), self.fd if closefd else None)
+        return io.BufferedReader(stream, buffer_size = 1 << 20)
+
+class _BlockStream(io.RawIOBase):
+
+    def __init__(self, blocks: Iterator[bytes], fd: Optional[BinaryIO] = None) -> None:
+        self._blocks = blocks
+        self._current = memoryview(b"")
+        self._fd = fd
+        return None
+
+    def close(self) -> None:
+        if self._fd:
+            self._fd.close()
+        return super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        while not self._current:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._current = memoryview(block)
+        n = min(len(buf), len(self._current))
+        buf[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
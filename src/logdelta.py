@@ -0,0 +1,123 @@
+"""Delta encoding of the `frameInfo` snapshots embedded in frame events.
+
+The encoder keeps the last `frameInfo` written per frame. The `frameInfo` of the next
+event of the frame is replaced by
+    "frameInfoDelta": {"frame": <frame key>, "set": {<changed fields>}, "unset": [<removed fields>]}
+Keyframes, holding the full `frameInfo` as before, are written the first time a frame is
+seen in a file and every `keyframe_interval` events of the frame, so that every log file
+can be rebuilt on its own.
+
+    python src/logdelta.py rebuild <src> <dst>
+"""
+import argparse
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+FrameKey = str
+
+class FrameDeltaEncoder(object):
+
+    def __init__(self, keyframe_interval: int = 64) -> None:
+        """
+        Args:
+            keyframe_interval (int): write a full `frameInfo` every N events of a frame
+        """
+        if not isinstance(keyframe_interval, int) or keyframe_interval < 1:
+            raise ValueError(f"invalid keyframe_interval: {keyframe_interval}")
+        self.keyframe_interval = keyframe_interval
+        # frame key -> (last frameInfo written, events since the keyframe)
+        self._last: Dict[FrameKey, Tuple[Dict[str, Any], int]] = {}
+        return None
+
+    @staticmethod
+    def frameKey(event_data: Dict[str, Any]) -> Optional[FrameKey]:
+        return event_data.get('frameId') or event_data.get('frameInfo', {}).get('UID')
+
+    def reset(self) -> None:
+        """Forget every frame, called when a new log file is started"""
+        self._last.clear()
+        return None
+
+    def encode(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the event data to write. `event_data` itself is never modified."""
+        info = event_data.get('frameInfo')
+        if not isinstance(info, dict) or not (key := (self.frameKey(event_data))):
+            return event_data
+        last, count = self._last.get(key, (None, 0))
+        if last is None or count + 1 >= self.keyframe_interval:
+            self._last[key] = (info, 0)
+            return event_data
+
+        self._last[key] = (info, count + 1)
+        encoded = dict(event_data)
+        encoded.pop('frameInfo')
+        encoded['frameInfoDelta'] = {
+            "frame": key,
+            "set": {k: v for k, v in info.items() if k not in last or last[k] != v},
+            "unset": [k for k in last if k not in info]
+        }
+        return encoded
+
+class FrameDeltaDecoder(object):
+    """Rebuild full `frameInfo` snapshots. Records must be decoded in the order they have
+    been written, from the start of a log file.
+    """
+
+    def __init__(self) -> None:
+        self._last: Dict[FrameKey, Dict[str, Any]] = {}
+        return None
+
+    def reset(self) -> None:
+        self._last.clear()
+        return None
+
+    def decode(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(event_data, dict):
+            return event_data
+        if isinstance((info := (event_data.get('frameInfo'))), dict):
+            if (key := (FrameDeltaEncoder.frameKey(event_data))):
+                self._last[key] = info
+            return event_data
+        delta = event_data.get('frameInfoDelta')
+        if not isinstance(delta, dict) or (last := (self._last.get(delta.get('frame')))) is None:
+            # Not a delta, or its keyframe is not in what has been read
+            return event_data
+        info = dict(last)
+        info.update(delta.get('set', {}))
+        for k in delta.get('unset', []):
+            info.pop(k, None)
+        self._last[delta.get('frame')] = info
+        decoded = dict(event_data)
+        decoded.pop('frameInfoDelta')
+        decoded['frameInfo'] = info
+        return decoded
+
+def rebuild(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield records with full `frameInfo` snapshots"""
+    decoder = FrameDeltaDecoder()
+    for record in records:
+        data = record.get('eventData')
+        if isinstance(data, dict) and 'frameInfoDelta' in data:
+            record = dict(record, eventData = decoder.decode(data))
+        else:
+            decoder.decode(data)
+        yield record
+
+if __name__ == '__main__':
+    from logformat import readRecords, detectFormat, getFormat
+
+    parser = argparse.ArgumentParser(description = "Rebuild full frameInfo snapshots of a delta encoded log file")
+    sub = parser.add_subparsers(dest = "command", required = True)
+    rb = sub.add_parser("rebuild", help = "Write a copy of the log file with full frameInfo snapshots")
+    rb.add_argument("src", type = str, help = "Delta encoded log file")
+    rb.add_argument("dst", type = str, help = "Destination log file, in the format of the source. Must not exist.")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        fmt = getFormat(detectFormat(args.src))
+        count = 0
+        with open(args.dst, "xb") as fd:
+            fd.write(fmt.magic)
+            for record in rebuild(readRecords(args.src, rebuild = False)):
+                fd.write(fmt.encode(record))
+                count += 1
+        print(f"[+ {count} records rebuilt]")
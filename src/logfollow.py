@@ -0,0 +1,183 @@
+"""Follow the log files of a stream while they are written.
+
+The position is the file being read and the offset of the next record in its decompressed
+content. Each `poll` reads only the records appended since the previous one, and only whole
+records: a text line without its line separator, or a block still being written, is left for
+the next poll. When the next file of the stream appears, the current one is complete: it is
+read to its end, compressed or not, and the follower moves on.
+
+`CaptureFollower` follows every stream of a capture, the family streams of the split layout
+included, and merges the records polled from them back in writing order.
+"""
+import io
+import os
+import gzip
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from logblock import BlockReader, HEADER_SIZE, blockSize
+from logdelta import FrameDeltaDecoder
+from logformat import MsgpackFormat, Record, TextFormat, detectFormat, getFormat
+from logrotate import LOG_NAME
+from logstream import captureName, mergeRecords, streamFiles
+
+FileKey = Tuple[str, int]
+
+def fileKey(path: str) -> FileKey:
+    m = LOG_NAME.match(os.path.basename(path))
+    return (m.group('date'), int(m.group('index') or 0)) if m else ("", 0)
+
+class LogFollower(object):
+
+    def __init__(self, path: str, chunk_size: int = 1 << 22) -> None:
+        """
+        Args:
+            path (str): first log file to read. The files written after it in the same stream
+                (`<username>-<tag>[-<family>]`) are followed.
+            chunk_size (int): bytes read at once from a plain file
+        """
+        m = LOG_NAME.match(os.path.basename(path))
+        if not m:
+            raise ValueError(f"not a log file name: {path}")
+        self.logdir = os.path.dirname(path) or "."
+        self.prefix = m.group('prefix')
+        self.chunk_size = chunk_size
+        # Detected once the stream has content
+        self.format: Optional[Union[TextFormat, MsgpackFormat]] = None
+        self.key: FileKey = fileKey(path)
+        # Offset of the next record in the decompressed content of the current file
+        self.offset: int = 0
+        # File offset of the next block, for block compressed files
+        self.block: int = 0
+        self.decoder = FrameDeltaDecoder()
+        self.stats: Dict[str, int] = {"files": 1, "records": 0}
+        return None
+
+    def _files(self) -> Dict[FileKey, str]:
+        return {fileKey(x): x for x in streamFiles(self.logdir, self.prefix)}
+
+    def poll(self) -> List[Record]:
+        """Records appended since the last poll, with full `frameInfo` snapshots"""
+        records: List[Record] = []
+        while True:
+            files = self._files()
+            path = files.get(self.key)
+            later = sorted(k for k in files if k > self.key)
+            if path:
+                records.extend(self._read(path, complete = bool(later)))
+            if not later:
+                return records
+            # The next file is only created once the current one is closed
+            self.key, self.offset, self.block = later[0], 0, 0
+            self.decoder.reset()
+            self.stats["files"] += 1
+
+    def _read(self, path: str, complete: bool) -> List[Record]:
+        if self.format is None:
+            if not os.path.getsize(path):
+                return []
+            self.format = getFormat(detectFormat(path))
+        with open(path, "rb") as fd:
+            if not path.endswith(".gz"):
+                return self._readPlain(fd, complete)
+            if blockSize(fd.read(HEADER_SIZE)) is not None:
+                return self._readBlocks(fd)
+        with gzip.open(path, "rb") as fd:
+            # A plain file compressed once completed, the offset is still valid
+            return self._readPlain(fd, complete = True)
+
+    def _decode(self, data: bytes, final: bool) -> Tuple[List[Record], int]:
+        """Records of `data`, and the size of what they span. Partial records at the end are
+        left unless `final`.
+        """
+        if not self.format.binary and not final:
+            data = data[:data.rfind(b"\n") + 1]
+        records, consumed = [], len(data) if not self.format.binary else 0
+        for offset, size, record in self.format.scan(io.BytesIO(data)):
+            records.append(record)
+            if self.format.binary:
+                consumed = offset + size
+        return records, consumed
+
+    def _readPlain(self, fd: BinaryIO, complete: bool) -> List[Record]:
+        records: List[Record] = []
+        fd.seek(self.offset)
+        pending = b""
+        while (chunk := (fd.read(self.chunk_size))):
+            data = pending + chunk
+            decoded, consumed = self._decode(data, final = False)
+            records.extend(decoded)
+            self.offset += consumed
+            pending = data[consumed:]
+        if complete and pending:
+            decoded, _ = self._decode(pending, final = True)
+            records.extend(decoded)
+            self.offset += len(pending)
+        return self._rebuild(records)
+
+    def _readBlocks(self, fd: BinaryIO) -> List[Record]:
+        records: List[Record] = []
+        reader = BlockReader(fd)
+        for offset, size, usize in reader.sizes(self.block):
+            # Blocks hold whole records
+            decoded, _ = self._decode(reader.read(offset, size), final = True)
+            records.extend(decoded)
+            self.block, self.offset = offset + size, self.offset + usize
+        return self._rebuild(records)
+
+    def _rebuild(self, records: List[Record]) -> List[Record]:
+        rebuilt = []
+        for record in records:
+            data = record.get('eventData')
+            if isinstance(data, dict) and 'frameInfoDelta' in data:
+                record = dict(record, eventData = self.decoder.decode(data))
+            else:
+                self.decoder.decode(data)
+            rebuilt.append(record)
+        self.stats["records"] += len(rebuilt)
+        return rebuilt
+
+class CaptureFollower(object):
+    """Follow every stream of the capture (`<username>-<tag>`) of a log file. The records
+    polled together from the family streams of the split layout are merged back in writing
+    order (see `logstream.mergeRecords`), a record flushed late by its stream may still come
+    after later records of other streams.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 22) -> None:
+        """
+        Args:
+            path (str): first log file to read, of any stream of the capture. Other streams
+                are read from their first file of the same day.
+            chunk_size (int): bytes read at once from a plain file
+        """
+        m = LOG_NAME.match(os.path.basename(path))
+        if not m:
+            raise ValueError(f"not a log file name: {path}")
+        self.logdir = os.path.dirname(path) or "."
+        self.capture = captureName(path)
+        self.date, self.suffix = m.group('date'), m.group('suffix')
+        self.chunk_size = chunk_size
+        self.followers: Dict[str, LogFollower] = {m.group('prefix'): LogFollower(path, chunk_size)}
+        return None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {k: sum(x.stats[k] for x in self.followers.values()) for k in ("files", "records")}
+
+    def _discover(self) -> None:
+        """Follow the streams of the capture started since the last poll"""
+        for entry in os.scandir(self.logdir):
+            m = LOG_NAME.match(entry.name)
+            if not m or m.group('suffix') != self.suffix or (prefix := (m.group('prefix'))) in self.followers:
+                continue
+            if captureName(prefix) == self.capture:
+                self.followers[prefix] = LogFollower(os.path.join(self.logdir, f"{prefix}-{self.date}{self.suffix}"), self.chunk_size)
+        return None
+
+    def poll(self) -> List[Record]:
+        """Records appended to the streams since the last poll, with full `frameInfo` snapshots"""
+        self._discover()
+        polled = [x for x in (f.poll() for f in self.followers.values()) if x]
+        if len(polled) <= 1:
+            return polled[0] if polled else []
+        return list(mergeRecords(polled))
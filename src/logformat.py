@@ -0,0 +1,203 @@
+"""Record formats of the `Logger` file sink, and the streaming reader of log files.
+
+A record is the dict built by `Logger.log`:
+    {"eventNumber": str, "eventName": str, "eventData": dict, "timestamp": str}
+
+Formats:
+    text:    `<timestamp> - <eventNumber> - <eventName> - <json>` lines. The json is the whole
+             record in strict mode, only `eventData` otherwise.
+    msgpack: `CHROMO-MP` magic when the file is created, then msgpack records, each prefixed
+             with its length as a 4 bytes big-endian integer.
+
+Files may be plain, gzipped after rotation, or block compressed (see `logblock`).
+
+    python src/logformat.py convert <src> <dst> [--to text|msgpack] [--legacy]
+"""
+import os
+import io
+import json
+import gzip
+import struct
+import argparse
+from functools import partial
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+from logblock import BlockReader, HEADER_SIZE, blockSize
+from logdelta import rebuild as rebuildFrameInfo
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+Record = Dict[str, Any]
+
+class JSON(object):
+    dumps = partial(json.dumps, default = lambda o: None)
+
+class TextFormat(object):
+    name = "text"
+    suffix = ".log"
+    binary = False
+    magic = b""
+
+    def __init__(self, strict: bool = True) -> None:
+        self.strict = strict
+        return None
+
+    @staticmethod
+    def line(record: Record, strict: bool = True) -> str:
+        return " - ".join([
+            record.get('timestamp'),
+            str(record.get('eventNumber')),
+            record.get('eventName'),
+            JSON.dumps(record if strict else record.get('eventData'))
+        ])
+
+    def encode(self, record: Record) -> bytes:
+        return (self.line(record, self.strict) + os.linesep).encode("utf-8")
+
+    @staticmethod
+    def decode(line: Union[str, bytes]) -> Optional[Record]:
+        """Parse a strict or a legacy line. `None` is returned for lines that are not
+        records, such as the separator written when a file is appended.
+        """
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors = "replace")
+        # Neither the timestamp, the number nor the name contain " - ", the json may
+        cells = line.rstrip("\r\n").split(" - ", 3)
+        if len(cells) != 4:
+            return None
+        timestamp, number, name, data = cells
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return None
+        if isinstance(data, dict) and 'eventData' in data and 'eventName' in data:
+            return data
+        return {
+            "eventNumber": number,
+            "eventName": name,
+            "eventData": data,
+            "timestamp": timestamp
+        }
+
+    def iterate(self, fd: BinaryIO) -> Iterator[Record]:
+        for line in fd:
+            if (record := (self.decode(line))) is not None:
+                yield record
+
+    def scan(self, fd: BinaryIO, offset: int = 0) -> Iterator[Tuple[int, int, Record]]:
+        """Yield `(offset, size, record)`, `fd` being positioned at `offset`"""
+        for line in fd:
+            if (record := (self.decode(line))) is not None:
+                yield offset, len(line), record
+            offset += len(line)
+
+class MsgpackFormat(object):
+    name = "msgpack"
+    suffix = ".mpk"
+    binary = True
+    magic = b"CHROMO-MP"
+    _length = struct.Struct(">I")
+
+    def __init__(self, strict: bool = True) -> None:
+        if msgpack is None:
+            raise ModuleNotFoundError("msgpack is required by the msgpack log format, run `pip install msgpack`")
+        self.strict = strict
+        self._packer = msgpack.Packer(default = lambda o: None, use_bin_type = True)
+        return None
+
+    def encode(self, record: Record) -> bytes:
+        body = self._packer.pack(record)
+        return self._length.pack(len(body)) + body
+
+    def iterate(self, fd: BinaryIO) -> Iterator[Record]:
+        """Stream records. Magics, found at the start of the file and wherever a file has been
+        concatenated, are skipped. A truncated record at the end is ignored, since the writer
+        may still be writing it.
+        """
+        for _, _, record in self.scan(fd):
+            yield record
+
+    def scan(self, fd: BinaryIO, offset: int = 0) -> Iterator[Tuple[int, int, Record]]:
+        """Yield `(offset, size, record)`, `fd` being positioned at `offset`"""
+        size = self._length.size
+        while True:
+            head = fd.read(size)
+            # No record is long enough to start with the magic
+            if head == self.magic[:size] and fd.read(len(self.magic) - size) == self.magic[size:]:
+                offset += len(self.magic)
+                continue
+            if len(head) < size:
+                return None
+            (length, ) = self._length.unpack(head)
+            body = fd.read(length)
+            if len(body) < length:
+                return None
+            yield offset, size + length, msgpack.unpackb(body, raw = False, strict_map_key = False)
+            offset += size + length
+
+FORMATS = {x.name: x for x in (TextFormat, MsgpackFormat)}
+
+def getFormat(name: Optional[str] = None, strict: bool = True) -> Union[TextFormat, MsgpackFormat]:
+    name = name if name else TextFormat.name
+    if name not in FORMATS:
+        raise ValueError(f"unknown log format: {name}, should be one of {list(FORMATS.keys())}")
+    return FORMATS[name](strict = strict)
+
+def openLog(path: str) -> BinaryIO:
+    fd = open(path, "rb")
+    if path.endswith(".gz"):
+        if blockSize(fd.read(HEADER_SIZE)) is not None:
+            # Block compressed, possibly still being written
+            return BlockReader(fd).reader(closefd = True)
+        fd.close()
+        return gzip.open(path, "rb")
+    return io.BufferedReader(fd, buffer_size = 1 << 20)
+
+def detectFormat(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    for fmt in FORMATS.values():
+        if fmt.suffix and name.endswith(fmt.suffix) and fmt.binary:
+            return fmt.name
+    with openLog(path) as fd:
+        head = fd.read(len(MsgpackFormat.magic))
+    return MsgpackFormat.name if head == MsgpackFormat.magic else TextFormat.name
+
+def readRecords(path: str, format_: Optional[str] = None, rebuild: bool = True) -> Iterator[Record]:
+    """Stream the records of a log file, plain or gzipped, in any format. Delta encoded
+    `frameInfo` are rebuilt unless `rebuild` is unset.
+    """
+    fmt = getFormat(format_ or detectFormat(path))
+    with openLog(path) as fd:
+        if rebuild:
+            yield from rebuildFrameInfo(fmt.iterate(fd))
+        else:
+            yield from fmt.iterate(fd)
+
+def convert(src: str, dst: str, to: str, strict: bool = True) -> int:
+    fmt = getFormat(to, strict = strict)
+    count = 0
+    with open(dst, "xb") as fd:
+        fd.write(fmt.magic)
+        for record in readRecords(src):
+            fd.write(fmt.encode(record))
+            count += 1
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Chromo log format tools")
+    sub = parser.add_subparsers(dest = "command", required = True)
+    conv = sub.add_parser("convert", help = "Convert a log file between the text and the msgpack format")
+    conv.add_argument("src", type = str, help = "Source log file, plain or gzipped")
+    conv.add_argument("dst", type = str, help = "Destination log file, must not exist")
+    conv.add_argument("--to", type = str, choices = list(FORMATS.keys()), help = "Destination format, guessed from the suffix if not set")
+    conv.add_argument("--legacy", action = "store_true", help = "Write legacy text lines, with only the event data")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        to = args.to
+        if not to:
+            to = MsgpackFormat.name if args.dst.endswith(MsgpackFormat.suffix) else TextFormat.name
+        print(f"[+ {convert(args.src, args.dst, to, strict = not args.legacy)} records converted]")
@@ -0,0 +1,369 @@
+"""Sidecar offset index of log files.
+
+`<log name>.idx` sits next to the log file (`.gz` excluded, the index stays valid once the
+file is compressed). It maps frame UIDs, event names and time buckets to the offsets of the
+records in the decompressed content of the file. The index is a sequence of segments, one
+json line each, appended by the writer thread every `segment_records` records:
+    {"n": <records>, "start": <offset>, "end": <offset>, "b": <bucket length>,
+     "t": [[<bucket>, <offset of its first record>], ...],
+     "e": {<eventName>: [<offsets>]}, "f": {<frame UID>: [<offsets>]}}
+Offsets lists are delta encoded. Records not covered by a segment, such as those logged
+since the last one, are found by scanning, so lookups are always complete.
+
+The `frameInfoDelta` of the records found are rebuilt into full `frameInfo` (see `logdelta`),
+by decoding the `frameInfo` of the file from its start to the last of them.
+
+    python src/logindex.py build <log> [<log> ...]
+    python src/logindex.py stats <log>
+"""
+import os
+import io
+import json
+import gzip
+import bisect
+import argparse
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from logblock import BlockReader, HEADER_SIZE, blockSize
+from logformat import Record, detectFormat, getFormat, openLog
+from logreader import LogReader
+
+INDEX_SUFFIX = ".idx"
+# Event data fields holding a frame UID
+FRAME_KEYS = ("frameUID", "frameNewUID", "frameOriginUID", "parentFrameUID", "originFrameUID")
+# Time bucket -> length of the ISO timestamp prefix
+BUCKETS = {"second": 19, "minute": 16, "hour": 13}
+
+def indexPath(path: str) -> str:
+    return (path[:-3] if path.endswith(".gz") else path) + INDEX_SUFFIX
+
+def appendSegment(path: str, segment: str) -> None:
+    with open(path, "a", encoding = "utf-8") as fd:
+        fd.write(segment)
+    return None
+
+def _deltas(offsets: List[int]) -> List[int]:
+    return [offsets[0]] + [b - a for a, b in zip(offsets, offsets[1:])]
+
+def _offsets(deltas: List[int]) -> List[int]:
+    offsets, total = [], 0
+    for x in deltas:
+        total += x
+        offsets.append(total)
+    return offsets
+
+class OffsetIndexer(object):
+    """Gather the postings of the records of a log file into segments"""
+
+    def __init__(self, segment_records: int = 4096, bucket: str = "minute") -> None:
+        """
+        Args:
+            segment_records (int): records per segment
+            bucket (str): time bucket, `second`, `minute` or `hour`
+        """
+        if not isinstance(segment_records, int) or segment_records < 1:
+            raise ValueError(f"invalid segment_records: {segment_records}")
+        if bucket not in BUCKETS:
+            raise ValueError(f"invalid bucket: {bucket}, should be one of {list(BUCKETS.keys())}")
+        self.segment_records = segment_records
+        self.bucket_length = BUCKETS[bucket]
+        self.reset()
+        return None
+
+    @property
+    def due(self) -> bool:
+        return self.count >= self.segment_records
+
+    def reset(self) -> None:
+        self.count: int = 0
+        self.start: Optional[int] = None
+        self.end: int = 0
+        self.bucket: Optional[str] = None
+        self.times: List[Tuple[str, int]] = []
+        self.events: Dict[str, List[int]] = {}
+        self.frames: Dict[str, List[int]] = {}
+        return None
+
+    def add(self, offset: int, size: int, record: Record) -> None:
+        if self.start is None:
+            self.start = offset
+        self.end = offset + size
+        self.count += 1
+        self.events.setdefault(record.get('eventName'), []).append(offset)
+        if isinstance((data := (record.get('eventData'))), dict):
+            for key in FRAME_KEYS:
+                if isinstance((uid := (data.get(key))), str) and uid:
+                    postings = self.frames.setdefault(uid, [])
+                    if not postings or postings[-1] != offset:
+                        postings.append(offset)
+        bucket = (record.get('timestamp') or "")[:self.bucket_length]
+        if bucket != self.bucket:
+            self.times.append((bucket, offset))
+            self.bucket = bucket
+        return None
+
+    def seal(self) -> Optional[str]:
+        """The segment of the records added since the last one, `None` if there are none"""
+        if not self.count:
+            return None
+        segment = json.dumps({
+            "n": self.count,
+            "start": self.start,
+            "end": self.end,
+            "b": self.bucket_length,
+            "t": self.times,
+            "e": {k: _deltas(v) for k, v in self.events.items()},
+            "f": {k: _deltas(v) for k, v in self.frames.items()}
+        }, separators = (",", ":"))
+        self.reset()
+        return segment + "\n"
+
+class OffsetIndex(object):
+
+    def __init__(self) -> None:
+        self.records: int = 0
+        self.bucket_length: int = BUCKETS["minute"]
+        # (start, end) of the segments, in file order
+        self.spans: List[Tuple[int, int]] = []
+        self.times: List[Tuple[str, int]] = []
+        self.events: Dict[str, List[int]] = {}
+        self.frames: Dict[str, List[int]] = {}
+        return None
+
+    @classmethod
+    def load(cls, path: str) -> "OffsetIndex":
+        """Load a sidecar index. A segment cut short by a crash is ignored."""
+        index = cls()
+        with open(path, "r", encoding = "utf-8") as fd:
+            for line in fd:
+                try:
+                    segment = json.loads(line)
+                except ValueError:
+                    continue
+                index.records += segment['n']
+                index.bucket_length = segment.get('b', index.bucket_length)
+                index.spans.append((segment['start'], segment['end']))
+                index.times.extend((b, o) for b, o in segment['t'])
+                for key, postings in (("e", index.events), ("f", index.frames)):
+                    for k, v in segment[key].items():
+                        postings.setdefault(k, []).extend(_offsets(v))
+        return index
+
+    @property
+    def end(self) -> int:
+        return self.spans[-1][1] if self.spans else 0
+
+    def gaps(self) -> List[Tuple[int, Optional[int]]]:
+        """Ranges not covered by a segment, the last one runs to the end of the file"""
+        gaps, position = [], 0
+        for start, end in self.spans:
+            if start > position:
+                gaps.append((position, start))
+            position = max(position, end)
+        gaps.append((position, None))
+        return gaps
+
+    def offsets(self, frame: Optional[str] = None, event: Optional[str] = None) -> Optional[List[int]]:
+        """Sorted offsets of the records of `frame` and `event`, `None` if neither is set"""
+        postings = []
+        if frame is not None:
+            postings.append(self.frames.get(frame, []))
+        if event is not None:
+            postings.append(self.events.get(event, []))
+        if not postings:
+            return None
+        if len(postings) == 1:
+            return postings[0]
+        return sorted(set(postings[0]).intersection(*postings[1:]))
+
+    def span(self, start: Optional[str] = None, end: Optional[str] = None) -> Tuple[int, Optional[int]]:
+        """Offsets range of the buckets between the timestamps `start` and `end`"""
+        buckets = [b for b, _ in self.times]
+        low, high = 0, None
+        if start:
+            i = bisect.bisect_left(buckets, start[:self.bucket_length])
+            low = self.times[i][1] if i < len(buckets) else self.end
+        if end and (i := (bisect.bisect_right(buckets, end[:self.bucket_length]))) < len(buckets):
+            high = self.times[i][1]
+        return low, high
+
+class LogSeeker(object):
+    """Read records at offsets of the decompressed content of a plain, gzipped or block
+    compressed log file.
+    """
+
+    def __init__(self, path: str, format_: Optional[str] = None) -> None:
+        self.path = path
+        self.format = getFormat(format_ or detectFormat(path))
+        self.fd: BinaryIO = open(path, "rb")
+        self.blocks: Optional[List[Tuple[int, int]]] = None
+        if path.endswith(".gz"):
+            if blockSize(self.fd.read(HEADER_SIZE)) is not None:
+                # (file offset, decompressed offset) of each block
+                self.blocks, position = [], 0
+                for offset, _, size in BlockReader(self.fd).sizes():
+                    self.blocks.append((offset, position))
+                    position += size
+            else:
+                self.fd.close()
+                self.fd = gzip.open(path, "rb")
+        return None
+
+    def __enter__(self) -> "LogSeeker":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+        return None
+
+    def close(self) -> None:
+        self.fd.close()
+        return None
+
+    def _reader(self, start: int, end: Optional[int] = None) -> BinaryIO:
+        if self.blocks is None:
+            self.fd.seek(start)
+            return self.fd
+        # Blocks hold whole records, only those overlapping [start, end) are read
+        positions = [x[1] for x in self.blocks]
+        i = bisect.bisect_right(positions, start) - 1
+        if i < 0:
+            return io.BytesIO()
+        j = bisect.bisect_left(positions, end) if end is not None else len(positions)
+        reader = BlockReader(self.fd).reader(
+            start = self.blocks[i][0],
+            end = self.blocks[j][0] if j < len(positions) else None
+        )
+        reader.read(start - self.blocks[i][1])
+        return reader
+
+    def scan(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, Record]]:
+        """Yield `(offset, record)` of the records from `start`, a record boundary, to `end`"""
+        for offset, _, record in self.format.scan(self._reader(start, end), start):
+            if end is not None and offset >= end:
+                return None
+            yield offset, record
+
+    def at(self, offset: int) -> Optional[Record]:
+        return next((r for _, r in self.scan(offset, offset + 1)), None)
+
+def matches(
+    record: Record,
+    frame: Optional[str] = None,
+    event: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> bool:
+    timestamp = record.get('timestamp') or ""
+    if event is not None and record.get('eventName') != event:
+        return False
+    if start and timestamp < start:
+        return False
+    if end and timestamp[:len(end)] > end:
+        return False
+    if frame is not None:
+        data = record.get('eventData')
+        if not isinstance(data, dict) or frame not in (data.get(k) for k in FRAME_KEYS):
+            return False
+    return True
+
+def lookup(
+    path: str,
+    frame: Optional[str] = None,
+    event: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format_: Optional[str] = None
+) -> Iterator[Record]:
+    """Records of a log file matching every predicate set, in file order. The sidecar index
+    is used when it exists, the file is scanned otherwise.
+
+    Args:
+        frame (Optional[str]): frame UID, in any of `FRAME_KEYS`
+        event (Optional[str]): event name, e.g. `[Frame Execute Script]`
+        start (Optional[str]): earliest ISO timestamp
+        end (Optional[str]): latest ISO timestamp, a prefix such as `2021-06-01T10` included
+    """
+    predicate = lambda r: matches(r, frame = frame, event = event, start = start, end = end)
+    index = OffsetIndex.load(indexPath(path)) if os.path.exists(indexPath(path)) else None
+    with LogSeeker(path, format_) as seeker:
+        if index is None:
+            yield from (r for _, r in rebuildFound(path, [x for x in seeker.scan() if predicate(x[1])]))
+            return None
+        low, high = index.span(start, end)
+        offsets = index.offsets(frame = frame, event = event)
+        found: List[Tuple[int, Record]] = []
+        if offsets is None:
+            for span_start, span_end in index.spans:
+                if span_end <= low or (high is not None and span_start >= high):
+                    continue
+                found.extend(x for x in seeker.scan(max(span_start, low), span_end) if predicate(x[1]))
+        else:
+            lo, hi = bisect.bisect_left(offsets, low), bisect.bisect_left(offsets, high) if high is not None else len(offsets)
+            for offset in offsets[lo:hi]:
+                if (record := (seeker.at(offset))) is not None and predicate(record):
+                    found.append((offset, record))
+        for gap_start, gap_end in index.gaps():
+            found.extend(x for x in seeker.scan(gap_start, gap_end) if predicate(x[1]))
+        found.sort(key = lambda x: x[0])
+        yield from (r for _, r in rebuildFound(path, found))
+
+def _isDelta(record: Record) -> bool:
+    return isinstance((data := (record.get('eventData'))), dict) and 'frameInfoDelta' in data
+
+def rebuildFound(path: str, found: List[Tuple[int, Record]]) -> List[Tuple[int, Record]]:
+    """Rebuild the `frameInfoDelta` of records found at offsets of a log file. Keyframes are
+    only guaranteed at the start of a file, so the file is read from there, only the records
+    holding a `frameInfo` being decoded.
+    """
+    pending = {offset: i for i, (offset, record) in enumerate(found) if _isDelta(record)}
+    if not pending:
+        return found
+    found, last = list(found), max(pending)
+    names = {found[i][1].get('eventName') for i in pending.values()}
+    with LogReader(path) as reader:
+        for record in reader.records(events = names):
+            if record.offset > last:
+                break
+            if (i := (pending.get(record.offset))) is not None and (rebuilt := (record.record())) is not None:
+                found[i] = (record.offset, rebuilt)
+    return found
+
+def build(path: str, segment_records: int = 4096, bucket: str = "minute", format_: Optional[str] = None) -> int:
+    """Write the sidecar index of an existing log file, replacing any previous one"""
+    fmt = getFormat(format_ or detectFormat(path))
+    indexer = OffsetIndexer(segment_records = segment_records, bucket = bucket)
+    tmp, count = indexPath(path) + ".tmp", 0
+    with openLog(path) as fd, open(tmp, "w", encoding = "utf-8") as out:
+        for offset, size, record in fmt.scan(fd):
+            indexer.add(offset, size, record)
+            count += 1
+            if indexer.due:
+                out.write(indexer.seal())
+        if (segment := (indexer.seal())):
+            out.write(segment)
+    os.replace(tmp, indexPath(path))
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Chromo log offset index tools")
+    sub = parser.add_subparsers(dest = "command", required = True)
+    bld = sub.add_parser("build", help = "Build the sidecar index of existing log files")
+    bld.add_argument("logs", type = str, nargs = "+", help = "Log files, plain or gzipped")
+    bld.add_argument("--segment-records", type = int, default = 4096, help = "Records per index segment")
+    bld.add_argument("--bucket", type = str, choices = list(BUCKETS.keys()), default = "minute", help = "Time bucket")
+    st = sub.add_parser("stats", help = "Show what the sidecar index of a log file covers")
+    st.add_argument("log", type = str, help = "Log file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for path in args.logs:
+            print(f"[+ {path}]: {build(path, args.segment_records, args.bucket)} records indexed")
+    elif args.command == "stats":
+        index = OffsetIndex.load(indexPath(args.log))
+        print(f" +records:  {index.records}")
+        print(f" +segments: {len(index.spans)}")
+        print(f" +indexed:  {index.end} bytes")
+        print(f" +events:   {len(index.events)}")
+        print(f" +frames:   {len(index.frames)}")
+        print(f" +buckets:  {len(set(b for b, _ in index.times))}")
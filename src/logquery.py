@@ -0,0 +1,252 @@
+"""Query the records of a log directory.
+
+    python src/logquery.py <logdir or log> [...] [--event "Frame Execute Script"] [--frame <UID>]
+        [--domain <domain>] [--hash <contentHash>] [--since <iso>] [--until <iso>] [-j N] [--scan]
+
+Records matching every predicate are printed as json lines, capture by capture; the records
+of split streams are merged back in writing order, see `logstream.mergeRecords`. Each capture (`<username>-<tag>`) is read
+from the fastest source available:
+    sqlite: its `<username>-<tag>.sqlite` database (see `sqlitesink`), selected on the indexed
+            event name, timestamp, frame and script columns. Values of other keys are searched
+            in the event data of the events holding them only.
+    index:  the sidecar `.idx` of each log file (see `logindex`), for event, frame or time
+            predicates
+    scan:   the log files, split in chunks read by `-j` processes. Records whose raw bytes do
+            not hold every value searched are skipped without being decoded.
+`--scan` ignores the database and the indexes.
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from logformat import Record
+from logindex import indexPath, lookup, matches
+from logreader import LogReader
+from logstream import captureFiles, mergeRecords
+from sqlitesink import SCRIPT_KEYS
+
+# Keys of the event data holding a script, `SCRIPT_KEYS` and those of script to script events
+SCRIPTS = SCRIPT_KEYS + ("parentScript", "childScript")
+# Events of `handlers` holding frame UIDs, or frame urls, besides the `frame_uid` column of
+# `sqlitesink`
+FRAME_EVENTS = (
+    "[Frame Info Update to]", "[Main Frame Created]", "[Sub-Frame Created]", "[Frame Attach to Frame]",
+    "[Frame Navigate by Script]", "[Frame Navigate by HTTP]", "[Frame Navigate by HTML]",
+    "[Frame Navigate by User]", "[Frame Navigate by Other]"
+)
+# Events holding scripts besides the one of the `script_hash` and `script_domain` columns
+SCRIPT_EVENTS = ("[Script Spawn Script]", "[Script Call Script]", "[Script Initiate Remote Script]")
+CHUNK_SIZE = 1 << 26
+
+# (path, start, end) of a log file range, or (database, None, None)
+Task = Tuple[str, Optional[int], Optional[int]]
+
+def _domainOf(host: Any, domain: str) -> bool:
+    if not isinstance(host, str) or not host:
+        return False
+    host = host.split(":", 1)[0].lower()
+    return host == domain or host.endswith("." + domain)
+
+class Query(object):
+    """Predicates of a query, all of those set must match"""
+
+    def __init__(
+        self,
+        event: Optional[str] = None,
+        frame: Optional[str] = None,
+        domain: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            event (Optional[str]): event name, e.g. `[Frame Execute Script]`
+            frame (Optional[str]): frame UID, in any of `FRAME_KEYS`
+            domain (Optional[str]): domain of a script of the event or of the frame url,
+                subdomains included
+            content_hash (Optional[str]): content hash of a script of the event
+            since (Optional[str]): earliest ISO timestamp
+            until (Optional[str]): latest ISO timestamp, a prefix such as `2021-06-01T10` included
+        """
+        self.event = event
+        self.frame = frame
+        self.domain = domain.lower() if domain else None
+        self.content_hash = content_hash
+        self.since = since
+        self.until = until
+        return None
+
+    def needles(self, delta: bool = False) -> List[bytes]:
+        """Values that the raw bytes of a matching record hold. The frame url of a
+        `frameInfoDelta` is only there when it changed, so the domain is left out for `delta`.
+        Values that json would escape are left out.
+        """
+        values = [self.frame, self.content_hash] + ([] if delta else [self.domain])
+        return [x.encode("utf-8") for x in values if x and x.isascii() and x.isprintable() and '"' not in x and "\\" not in x]
+
+    def scripts(self, data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        return (x for k in SCRIPTS if isinstance((x := (data.get(k))), dict))
+
+    def matches(self, record: Record) -> bool:
+        if not matches(record, frame = self.frame, event = self.event, start = self.since, end = self.until):
+            return False
+        data = record.get('eventData')
+        data = data if isinstance(data, dict) else {}
+        if self.content_hash is not None and not any(x.get('contentHash') == self.content_hash for x in self.scripts(data)):
+            return False
+        if self.domain is not None:
+            url = (data.get('frameInfo') or {}).get('url') if isinstance(data.get('frameInfo'), dict) else None
+            hosts = [x.get('domain') for x in self.scripts(data)] + [url.get('netloc') if isinstance(url, dict) else None]
+            if not any(_domainOf(x, self.domain) for x in hosts):
+                return False
+        return True
+
+    def where(self) -> Tuple[str, List[str]]:
+        """SQL selection of the `events` table of `sqlitesink`, narrower than the query"""
+        clauses, params = [], []
+        if self.event is not None:
+            clauses.append("event_name = ?")
+            params.append(self.event)
+        if self.since:
+            clauses.append("ts >= ?")
+            params.append(self.since)
+        if self.until:
+            # Any timestamp of the `until` prefix sorts before it
+            clauses.append("ts <= ?")
+            params.append(self.until + "\uffff")
+        # Candidates are selected on the indexed columns, the values of other keys are only
+        # searched in the event data of the events that may hold them. Domains match with their
+        # subdomains and ports, so the `script_domain` index is scanned rather than searched.
+        searched = (
+            (self.frame, "frame_uid = ?", [self.frame], FRAME_EVENTS),
+            (self.content_hash, "script_hash = ?", [self.content_hash], SCRIPT_EVENTS),
+            (self.domain, "script_domain LIKE ? OR script_domain LIKE ?", [f"%{self.domain}", f"%{self.domain}:%"], FRAME_EVENTS + SCRIPT_EVENTS)
+        )
+        for value, indexed, values, events in searched:
+            if value:
+                clauses.append(
+                    f"id IN (SELECT id FROM events WHERE {indexed} UNION ALL SELECT id FROM events "
+                    f"WHERE event_name IN ({', '.join('?' * len(events))}) AND instr(data, ?) > 0)"
+                )
+                params.extend(values + list(events) + [value])
+        return " AND ".join(clauses) or "1", params
+
+def useIndex(path: str, query: Query) -> bool:
+    indexed = query.event or query.frame or query.since or query.until
+    return bool(indexed) and os.path.exists(indexPath(path))
+
+def readDatabase(path: str, query: Query) -> Iterator[Record]:
+    where, params = query.where()
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri = True)
+    try:
+        rows = conn.execute(f"SELECT seq, ts, event_number, event_name, data FROM events WHERE {where} ORDER BY id", params)
+        for seq, ts, event_number, event_name, data in rows:
+            record: Record = {"eventNumber": str(event_number), "eventName": event_name, "eventData": json.loads(data), "timestamp": ts}
+            if seq is not None:
+                record["seq"] = seq
+            if query.matches(record):
+                yield record
+    finally:
+        conn.close()
+
+def scan(path: str, query: Query, start: int = 0, end: Optional[int] = None) -> Iterator[Record]:
+    needles, delta_needles = query.needles(), query.needles(delta = True)
+    with LogReader(path) as reader:
+        for record in reader.records(events = [query.event] if query.event else None, start = start, end = end):
+            if not all(record.contains(x) for x in (delta_needles if record.contains(b"frameInfoDelta") else needles)):
+                continue
+            if (decoded := (record.record())) is not None and query.matches(decoded):
+                yield decoded
+
+def run(task: Task, query: Query) -> List[Record]:
+    path, start, end = task
+    if path.endswith(".sqlite"):
+        return list(readDatabase(path, query))
+    if start is None:
+        return [x for x in lookup(path, frame = query.frame, event = query.event, start = query.since, end = query.until) if query.matches(x)]
+    return list(scan(path, query, start, end))
+
+def _run(args: Tuple[Task, Query]) -> List[Record]:
+    return run(*args)
+
+def plan(paths: Iterable[str], query: Query, use_indexes: bool = True, chunk_size: int = CHUNK_SIZE) -> List[Tuple[str, str, List[Task]]]:
+    """`(capture, stream prefix, tasks)` of the query, the tasks of a stream in file order"""
+    planned = []
+    for capture, streams in captureFiles(paths).items():
+        logdir = os.path.dirname(next(iter(streams.values()))[0]) or "."
+        database = os.path.join(logdir, f"{capture}.sqlite")
+        if use_indexes and os.path.exists(database):
+            planned.append((capture, capture, [(database, None, None)]))
+            continue
+        for prefix, files in streams.items():
+            tasks: List[Task] = []
+            for path in files:
+                if use_indexes and useIndex(path, query):
+                    tasks.append((path, None, None))
+                    continue
+                with LogReader(path) as reader:
+                    tasks.extend((path, start, end) for start, end in reader.split(chunk_size))
+            planned.append((capture, prefix, tasks))
+    return planned
+
+def search(paths: Iterable[str], query: Query, jobs: int = 1, use_indexes: bool = True, chunk_size: int = CHUNK_SIZE) -> Iterator[Record]:
+    """Records of the log files or directories matching `query`, see the module doc"""
+    planned = plan(paths, query, use_indexes, chunk_size)
+    tasks = [(x, query) for _, _, stream in planned for x in stream]
+    if jobs <= 1 or len(tasks) <= 1:
+        results = map(_run, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers = jobs)
+        results = pool.map(_run, tasks)
+    try:
+        position = 0
+        while position < len(planned):
+            capture = planned[position][0]
+            streams = []
+            while position < len(planned) and planned[position][0] == capture:
+                streams.append(chain.from_iterable(next(results) for _ in planned[position][2]))
+                position += 1
+            if len(streams) == 1:
+                yield from streams[0]
+            else:
+                yield from mergeRecords([list(x) for x in streams])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Query the records of Chromo logs, printed as json lines")
+    parser.add_argument("logs", type = str, nargs = "+", help = "Log directories or log files, plain or gzipped, in any format")
+    parser.add_argument("--event", type = str, help = "Event name, e.g. \"Frame Execute Script\"")
+    parser.add_argument("--frame", type = str, help = "Frame UID")
+    parser.add_argument("--domain", type = str, help = "Domain of a script of the event or of the frame url, subdomains included")
+    parser.add_argument("--hash", type = str, help = "Content hash of a script of the event")
+    parser.add_argument("--since", type = str, help = "Earliest ISO timestamp")
+    parser.add_argument("--until", type = str, help = "Latest ISO timestamp, e.g. 2021-06-01T10")
+    parser.add_argument("-j", "--jobs", type = int, default = os.cpu_count() or 1, help = "Worker processes scanning log files")
+    parser.add_argument("--scan", action = "store_true", help = "Scan the log files, ignoring databases and sidecar indexes")
+    args = parser.parse_args()
+
+    for path in args.logs:
+        if not os.path.exists(path):
+            parser.error(f"log file not found: {path}")
+    q = Query(
+        event = f"[{args.event.strip().strip('[]')}]" if args.event else None,
+        frame = args.frame,
+        domain = args.domain,
+        content_hash = args.hash,
+        since = args.since,
+        until = args.until
+    )
+    count = 0
+    for record in search(args.logs, q, jobs = args.jobs, use_indexes = not args.scan):
+        sys.stdout.write(json.dumps(record) + "\n")
+        count += 1
+    print(f"[+ {count} records]", file = sys.stderr)
@@ -0,0 +1,333 @@
+"""Memory-mapped log reader shared by the offline tools.
+
+Plain files are memory-mapped, compressed ones are decompressed block by block (or chunk by
+chunk for gzipped files). Each record is yielded as a `LogRecord`, which only holds the
+position of the record in the buffer: nothing is copied nor parsed until a field is read.
+With an event name filter, text files are matched by a regular expression over the buffer,
+so that skipped records cost no Python code at all.
+
+Formats, detected from the content:
+    text:    `<timestamp> - <eventNumber> - <eventName> - <json>` lines, strict or not
+             (see `logformat`)
+    console: `[<eventName>]: <python literal>` lines, as printed by early versions, e.g. `logs/*.txt`
+    msgpack: length-prefixed msgpack records (see `logformat`)
+"""
+import os
+import re
+import ast
+import json
+import gzip
+import mmap
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from logblock import BlockReader, HEADER_SIZE, blockSize
+from logdelta import FrameDeltaDecoder
+from logformat import MsgpackFormat, Record, openLog
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+TEXT, CONSOLE, MSGPACK = "text", "console", "msgpack"
+Buffer = Union[bytes, mmap.mmap]
+
+_TEXT_LINE = re.compile(rb"^\d{4}-\d{2}-\d{2}T[^ \n]* - ", re.M)
+_CONSOLE_LINE = re.compile(rb"^\[[^\]\n]+\]:? [\[{]", re.M)
+_SEP = b" - "
+
+class LogRecord(object):
+    """A record at `[start, end)` of `buffer`. Fields are sliced and decoded when read."""
+
+    __slots__ = ("buffer", "start", "end", "kind", "offset", "_name", "_record")
+
+    def __init__(self, buffer: Buffer, start: int, end: int, kind: str, offset: int, name: Optional[str] = None) -> None:
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.kind = kind
+        # Offset of the record in the decompressed content of the file, that of its length
+        # prefix for msgpack as in `logindex`
+        self.offset = offset
+        self._name = name
+        self._record: Optional[Record] = None
+        return None
+
+    @property
+    def raw(self) -> bytes:
+        return self.buffer[self.start:self.end]
+
+    def _cells(self) -> Tuple[int, int, int]:
+        """Positions of the three separators of a text line"""
+        i1 = self.buffer.find(_SEP, self.start, self.end)
+        i2 = self.buffer.find(_SEP, i1 + 3, self.end)
+        i3 = self.buffer.find(_SEP, i2 + 3, self.end)
+        return i1, i2, i3
+
+    @property
+    def eventName(self) -> Optional[str]:
+        if self._name is None:
+            if self.kind == TEXT:
+                _, i2, i3 = self._cells()
+                self._name = self.buffer[i2 + 3:i3].decode("utf-8", errors = "replace")
+            elif self.kind == CONSOLE:
+                self._name = self.buffer[self.start:self.buffer.find(b"]", self.start, self.end) + 1].decode("utf-8", errors = "replace")
+            else:
+                self._name = (self.record() or {}).get('eventName')
+        return self._name
+
+    @property
+    def timestamp(self) -> Optional[str]:
+        if self.kind == TEXT and self._record is None:
+            return self.buffer[self.start:self.buffer.find(_SEP, self.start, self.end)].decode("utf-8")
+        return (self.record() or {}).get('timestamp')
+
+    @property
+    def eventData(self) -> Any:
+        return (self.record() or {}).get('eventData')
+
+    def contains(self, needle: bytes) -> bool:
+        """Whether the raw record contains `needle`, without decoding it"""
+        return self.buffer.find(needle, self.start, self.end) >= 0
+
+    def record(self) -> Optional[Record]:
+        """The record as built by `Logger.log`, `None` if it can not be decoded"""
+        if self._record is not None:
+            return self._record
+        try:
+            if self.kind == TEXT:
+                i1, i2, i3 = self._cells()
+                data = json.loads(self.buffer[i3 + 3:self.end])
+                if isinstance(data, dict) and 'eventData' in data and 'eventName' in data:
+                    self._record = data
+                else:
+                    self._record = {
+                        "eventNumber": self.buffer[i1 + 3:i2].decode("utf-8"),
+                        "eventName": self.eventName,
+                        "eventData": data,
+                        "timestamp": self.timestamp
+                    }
+            elif self.kind == CONSOLE:
+                close = self.buffer.find(b"]", self.start, self.end)
+                payload = self.buffer[close + 1:self.end].lstrip(b":").strip().decode("utf-8", errors = "replace")
+                try:
+                    data = ast.literal_eval(payload)
+                except (ValueError, SyntaxError, MemoryError, RecursionError):
+                    data = payload
+                self._record = {"eventNumber": "0", "eventName": self.eventName, "eventData": data, "timestamp": None}
+            else:
+                self._record = msgpack.unpackb(self.buffer[self.start:self.end], raw = False, strict_map_key = False)
+        except ValueError:
+            return None
+        return self._record
+
+    def rebuild(self, decoder: FrameDeltaDecoder) -> None:
+        """Pass the record through the `frameInfo` delta decoder, see `logdelta`"""
+        if (record := (self.record())) is not None:
+            data = decoder.decode(record.get('eventData'))
+            if data is not record.get('eventData'):
+                self._record = dict(record, eventData = data)
+        return None
+
+class LogReader(object):
+    """Reader of one log file, plain or compressed, in any format. Records of a memory-mapped
+    file are only valid until the reader is closed.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 23) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.fd = open(path, "rb")
+        self._map: Optional[mmap.mmap] = None
+        self.compressed = path.endswith(".gz")
+        self.blocks = self.compressed and blockSize(self.fd.read(HEADER_SIZE)) is not None
+        self.fd.seek(0)
+        if not self.compressed and os.fstat(self.fd.fileno()).st_size:
+            self._map = mmap.mmap(self.fd.fileno(), 0, access = mmap.ACCESS_READ)
+        self.kind = self._detect()
+        if self.kind == MSGPACK and msgpack is None:
+            raise ModuleNotFoundError("msgpack is required to read msgpack logs, run `pip install msgpack`")
+        return None
+
+    def __enter__(self) -> "LogReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+        return None
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self.fd.close()
+        return None
+
+    def _head(self, size: int = 1 << 16) -> bytes:
+        if self._map is not None:
+            return self._map[:size]
+        if not self.compressed:
+            return b""
+        with openLog(self.path) as fd:
+            return fd.read(size)
+
+    def _detect(self) -> str:
+        head = self._head()
+        if self.path.endswith((MsgpackFormat.suffix, MsgpackFormat.suffix + ".gz")) or head.startswith(MsgpackFormat.magic):
+            return MSGPACK
+        text, console = _TEXT_LINE.search(head), _CONSOLE_LINE.search(head)
+        if console and (not text or console.start() < text.start()):
+            return CONSOLE
+        return TEXT
+
+    def _line(self, position: int) -> int:
+        """Start of the first line at or after `position` of the memory-mapped file"""
+        if position <= 0:
+            return 0
+        start = self._map.find(b"\n", position - 1)
+        return len(self._map) if start < 0 else start + 1
+
+    def split(self, size: int) -> List[Tuple[int, Optional[int]]]:
+        """Byte ranges of about `size`, whose records `records` reads independently. Only a
+        memory-mapped text file without delta encoded `frameInfo`, which depend on the records
+        before them, is split.
+        """
+        if self._map is None or self.kind == MSGPACK or len(self._map) <= size or self._map.find(b"frameInfoDelta") >= 0:
+            return [(0, None)]
+        return [(x, x + size if x + size < len(self._map) else None) for x in range(0, len(self._map), size)]
+
+    def _chunks(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[Buffer, int]]:
+        """Yield `(buffer, offset of the buffer in the decompressed content)`, each buffer
+        holding whole records
+        """
+        if self._map is not None:
+            if start or end is not None:
+                # The lines starting in the range
+                start, end = self._line(start), self._line(end) if end is not None else len(self._map)
+                yield self._map[start:end], start
+            else:
+                yield self._map, 0
+            return None
+        if start or end is not None:
+            raise ValueError("only memory-mapped text files are read by range")
+        if not self.compressed:
+            return None
+        if self.blocks:
+            with open(self.path, "rb") as fd:
+                reader, position = BlockReader(fd), 0
+                for offset, size, usize in reader.sizes():
+                    yield reader.read(offset, size), position
+                    position += usize
+            return None
+        with gzip.open(self.path, "rb") as fd:
+            pending, position = b"", 0
+            while (chunk := (fd.read(self.chunk_size))):
+                data = pending + chunk
+                cut = self._boundary(data)
+                yield data[:cut], position
+                position += cut
+                pending = data[cut:]
+            if pending:
+                yield pending, position
+
+    def _boundary(self, data: bytes) -> int:
+        """End of the last whole record of `data`"""
+        if self.kind != MSGPACK:
+            return data.rfind(b"\n") + 1
+        position = 0
+        for _, end in self._spans(data):
+            position = end
+        return position
+
+    def _spans(self, buffer: Buffer) -> Iterator[Tuple[int, int]]:
+        """`(start, end)` of the records of `buffer`, the body only for msgpack"""
+        size, length, magic = len(buffer), MsgpackFormat._length, MsgpackFormat.magic
+        position = 0
+        if self.kind == MSGPACK:
+            while position + length.size <= size:
+                if buffer[position:position + len(magic)] == magic:
+                    position += len(magic)
+                    continue
+                (body, ) = length.unpack_from(buffer, position)
+                if position + length.size + body > size:
+                    return None
+                yield position + length.size, position + length.size + body
+                position += length.size + body
+            return None
+        while position < size:
+            end = buffer.find(b"\n", position)
+            end = size if end < 0 else end
+            line_end = end - 1 if end > position and buffer[end - 1] == 13 else end
+            if line_end > position and (self._isConsole(buffer, position, line_end) if self.kind == CONSOLE else 48 <= buffer[position] <= 57):
+                yield position, line_end
+            position = end + 1
+
+    @staticmethod
+    def _isConsole(buffer: Buffer, start: int, end: int) -> bool:
+        """`[<eventName>]: <dict or list>`, other lines printed are not records"""
+        if buffer[start] != 91 or (close := (buffer.find(b"]", start, end))) < 0:
+            return False
+        position = close + 2 if buffer[close + 1:close + 2] == b":" else close + 1
+        return buffer[position:position + 2] in (b" {", b" [")
+
+    def _matches(self, buffer: Buffer, names: Set[str]) -> Iterator[Tuple[int, int, str]]:
+        """`(start, end, eventName)` of the text lines of `names`, found without Python code
+        for the other lines
+        """
+        if self.kind == TEXT:
+            alternatives = b"|".join(re.escape(x.encode("utf-8")) for x in sorted(names))
+            pattern = re.compile(rb"^[^ \n]+ - [^ \n]+ - (" + alternatives + rb") - ", re.M)
+        else:
+            alternatives = b"|".join(re.escape(x.encode("utf-8")) for x in sorted(names))
+            pattern = re.compile(rb"^(" + alternatives + rb"):? [\[{]", re.M)
+        for m in pattern.finditer(buffer):
+            end = buffer.find(b"\n", m.end())
+            end = len(buffer) if end < 0 else end
+            if end > m.start() and buffer[end - 1] == 13:
+                end -= 1
+            yield m.start(), end, m.group(1).decode("utf-8")
+
+    def records(
+        self,
+        events: Optional[Iterable[str]] = None,
+        rebuild: bool = True,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> Iterator[LogRecord]:
+        """Yield the records of the file, of the `events` names if set. Delta encoded
+        `frameInfo` are rebuilt unless `rebuild` is unset. With `start` or `end`, only the
+        records starting in that range are read, see `split`.
+        """
+        names = set(events) if events else None
+        decoder = FrameDeltaDecoder() if rebuild else None
+        for buffer, base in self._chunks(start, end):
+            # The frameInfo of a delta encoded file are decoded in order, those of skipped
+            # records included. Whether a compressed file is delta encoded is not known upfront.
+            delta = rebuild and (self._map is None or buffer.find(b"frameInfoDelta") >= 0)
+            if names is not None and self.kind != MSGPACK and not delta:
+                for start, end, name in self._matches(buffer, names):
+                    yield LogRecord(buffer, start, end, self.kind, base + start, name)
+                continue
+            needles = [msgpack.packb(x) for x in names] if names is not None and self.kind == MSGPACK else None
+            prefix = MsgpackFormat._length.size if self.kind == MSGPACK else 0
+            for start, end in self._spans(buffer):
+                record = LogRecord(buffer, start, end, self.kind, base + start - prefix)
+                framed = delta and record.contains(b"frameInfo")
+                if needles is not None and not any(record.contains(x) for x in needles):
+                    wanted = False
+                else:
+                    wanted = names is None or record.eventName in names
+                if framed:
+                    record.rebuild(decoder)
+                if wanted:
+                    yield record
+
+    def dicts(self, events: Optional[Iterable[str]] = None, rebuild: bool = True) -> Iterator[Record]:
+        """Decoded records, those that can not be decoded are skipped"""
+        for record in self.records(events = events, rebuild = rebuild):
+            if (decoded := (record.record())) is not None:
+                yield decoded
+
+def readLog(path: str, events: Optional[Iterable[str]] = None, rebuild: bool = True) -> Iterator[Record]:
+    """Decoded records of a log file, see `LogReader`"""
+    with LogReader(path) as reader:
+        yield from reader.dicts(events = events, rebuild = rebuild)
@@ -0,0 +1,179 @@
+import os
+import re
+import gzip
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List, Set, Tuple
+
+from logindex import indexPath
+
+# <username>-<tag>-<date>[.<index>]<suffix>[.gz]
+LOG_NAME = re.compile(r"^(?P<prefix>.+)-(?P<date>\d{4}-\d{2}-\d{2})(\.(?P<index>\d+))?(?P<suffix>\.[^.]+)(?P<gz>\.gz)?$")
+
+class LogRotator(object):
+    """Rotation policy of the `Logger` file sink. Log files are named
+    `<username>-<tag>-<date>[.<index>]<suffix>`: a new file is started when the day changes
+    (`daily`) or when the current one reaches `max_bytes`.
+
+    Completed files are handed to `retire`, which gzips them and enforces the retention
+    limits on a background worker, so the event loop and the writer thread never wait on it.
+    """
+
+    def __init__(
+        self,
+        daily: bool = True,
+        max_bytes: int = 0,
+        compress: bool = True,
+        max_files: int = 0,
+        max_total_bytes: int = 0
+    ) -> None:
+        """
+        Args:
+            daily (bool): start a new file when the date changes
+            max_bytes (int): start a new file once the current one reaches it. 0 to disable.
+            compress (bool): gzip completed files
+            max_files (int): maximum number of completed files kept per `<username>-<tag>`. 0 for no limit.
+            max_total_bytes (int): maximum disk usage of completed files per `<username>-<tag>`. 0 for no limit.
+        """
+        for name, value in (("max_bytes", max_bytes), ("max_files", max_files), ("max_total_bytes", max_total_bytes)):
+            if not isinstance(value, int) or value < 0:
+                raise ValueError(f"invalid {name}: {value}")
+        self.daily = daily
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.max_files = max_files
+        self.max_total_bytes = max_total_bytes
+        # Files being written, never subject to retention
+        self.active: Set[str] = set()
+        # Last index handed out per first file of the day
+        self._indexes: Dict[str, int] = {}
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "chromo-log-rotate")
+        return None
+
+    def due(self, opened: date, now: datetime, written: int) -> bool:
+        """
+        Args:
+            opened (date): date of the current file
+            now (datetime): current time
+            written (int): size of the current file in bytes
+        """
+        if self.daily and now.date() != opened:
+            return True
+        if self.max_bytes and written >= self.max_bytes:
+            return True
+        return False
+
+    @staticmethod
+    def fileName(prefix: str, day: date, suffix: str, index: int = 0) -> str:
+        return "".join([prefix, "-", day.isoformat(), f".{index}" if index else "", suffix])
+
+    def nextPath(self, logdir: str, prefix: str, suffix: str, day: date) -> str:
+        """Path of the next file of the day, skipping those already taken by a plain or
+        a compressed file. Indexes only move forward, since the writer may not have created
+        the files handed out before, and retention may have removed older ones.
+        """
+        key = os.path.join(logdir, self.fileName(prefix, day, suffix))
+        index = self._indexes.get(key, -1) + 1
+        while True:
+            path = os.path.join(logdir, self.fileName(prefix, day, suffix, index))
+            if not os.path.exists(path) and not os.path.exists(path + ".gz"):
+                self._indexes[key] = index
+                return path
+            index += 1
+
+    def resumePath(self, logdir: str, prefix: str, suffix: str, day: date) -> str:
+        """Path to continue logging in for the day: the last file of the day if it is still
+        uncompressed and has room left, the one after it otherwise.
+        """
+        key = os.path.join(logdir, self.fileName(prefix, day, suffix))
+        compressed: Dict[int, bool] = {}
+        for path, m in self._siblings(key):
+            if m.group('date') != day.isoformat():
+                continue
+            index = int(m.group('index') or 0)
+            compressed[index] = compressed.get(index, False) or bool(m.group('gz'))
+        last = max(compressed.keys(), default = -1)
+        if last >= 0 and not compressed[last]:
+            path = os.path.join(logdir, self.fileName(prefix, day, suffix, last))
+            if not (self.max_bytes and os.path.getsize(path) >= self.max_bytes):
+                self._indexes[key] = last
+                return path
+        self._indexes[key] = last + 1
+        return os.path.join(logdir, self.fileName(prefix, day, suffix, last + 1))
+
+    def retire(self, path: str) -> None:
+        """Hand a completed log file to the background worker"""
+        self.executor.submit(self._retire, path)
+        return None
+
+    def retireLeftovers(self, current: str) -> int:
+        """Retire the files of the same `<username>-<tag>` left by a previous run. Uncompressed
+        files are compressed if `compress` is set, and retention applies either way.
+        """
+        leftovers = [
+            path for path, matched in self._siblings(current)
+            if not matched.group('gz') and os.path.abspath(path) != os.path.abspath(current)
+        ] if self.compress else []
+        for path in leftovers:
+            self.retire(path)
+        if not leftovers:
+            self.executor.submit(self._retire, current, False)
+        return len(leftovers)
+
+    def shutDown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait = wait)
+        return None
+
+    def _siblings(self, path: str) -> List[Tuple[str, "re.Match"]]:
+        logdir, name = os.path.split(path)
+        matched = LOG_NAME.match(name)
+        if not matched:
+            return []
+        siblings = []
+        for entry in os.scandir(logdir or "."):
+            m = LOG_NAME.match(entry.name)
+            if entry.is_file() and m and m.group('prefix') == matched.group('prefix') and m.group('suffix') == matched.group('suffix'):
+                siblings.append((entry.path, m))
+        return siblings
+
+    def _retire(self, path: str, compress: bool = True) -> None:
+        try:
+            if compress and self.compress and os.path.exists(path) and not path.endswith(".gz"):
+                path = self._compress(path)
+            self._enforceRetention(path)
+        except OSError as e:
+            print(f"[+ In {self.__class__.__name__}] retiring {path} failed: {e}")
+        return None
+
+    @staticmethod
+    def _compress(path: str) -> str:
+        tmp, dest = path + ".gz.tmp", path + ".gz"
+        with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp, dest)
+        os.remove(path)
+        return dest
+
+    def _enforceRetention(self, path: str) -> None:
+        if not self.max_files and not self.max_total_bytes:
+            return None
+        # Only completed files are subject to retention, the newest is kept first.
+        active = {os.path.abspath(x) for x in self.active}
+        completed = [
+            p for p, m in self._siblings(path)
+            if (m.group('gz') or not self.compress) and os.path.abspath(p) not in active
+        ]
+        completed.sort(key = lambda p: os.path.getmtime(p), reverse = True)
+        kept, total = 0, 0
+        for p in completed:
+            size = os.path.getsize(p)
+            if (self.max_files and kept >= self.max_files) or (self.max_total_bytes and total + size > self.max_total_bytes):
+                os.remove(p)
+                if os.path.exists(indexPath(p)):
+                    os.remove(indexPath(p))
+                print(f"[+ In {self.__class__.__name__}] retention limit reached, removed {p}")
+                continue
+            kept += 1
+            total += size
+        return None
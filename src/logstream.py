@@ -0,0 +1,176 @@
+"""Log streams of the `Logger` file sink.
+
+In the `single` layout every event goes to the one `<username>-<tag>-<date>[.<index>]<suffix>`
+stream. In the `split` layout, each event family goes to its own
+`<username>-<tag>-<family>-<date>[.<index>]<suffix>` stream, and every record carries a `seq`
+number shared by all streams, so that the combined order can be restored by `mergeRecords`.
+`seq` restarts with the service while the streams of the day are appended, so records are
+merged by timestamp first, and by `seq` between records of the same timestamp.
+
+    python src/logstream.py merge <logdir> <username>-<tag> <dst> [--families frame,navigation]
+"""
+import os
+import heapq
+import argparse
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from logwriter import BatchedWriter
+from logdelta import FrameDeltaEncoder
+from logindex import OffsetIndexer
+from logrotate import LOG_NAME
+from logformat import FORMATS, getFormat, readRecords
+
+# Event family -> event names. A name ending with `*` matches by prefix.
+FAMILIES: Dict[str, List[str]] = {
+    "frame": [
+        "[Main Frame Created]",
+        "[Sub-Frame Created]",
+        "[Frame Info Update to]",
+        "[Frame Attach to Frame]",
+        "[Target Destroyed]",
+        "[Target Update to]"
+    ],
+    "navigation": ["[Frame Navigate by *"],
+    "script": [
+        "[Frame Execute Script]",
+        "[Script Call Script]",
+        "[Script Create Sub-Frame]",
+        "[Script Spawn Script]",
+        "[Script Reference to]"
+    ],
+    "network": [
+        "[Script Initiate Remote Script]",
+        "[Frame Request to Host]",
+        "[Host Redirect to Host]",
+        "[Script Request to Host]"
+    ],
+    "download": ["[File Download Start]", "[File Chooser Opened]"]
+}
+# Family of the events not listed
+OTHER = "other"
+
+class LogStream(object):
+    """State of one stream: its writer, the file it is writing, the delta encoder of
+    `frameInfo` which is reset with every new file, and the indexer of the file.
+    """
+
+    def __init__(
+        self,
+        family: str,
+        writer: BatchedWriter,
+        delta: Optional[FrameDeltaEncoder] = None,
+        index: Optional[OffsetIndexer] = None
+    ) -> None:
+        self.family = family
+        self.writer = writer
+        self.delta = delta
+        self.index = index
+        self.path: Optional[str] = None
+        self.file_date: date = date.today()
+        self.written: int = 0
+        return None
+
+    @property
+    def new_file(self) -> Optional[str]:
+        return os.path.basename(self.path) if self.path else None
+
+    def prefix(self, username: str, tag: str) -> str:
+        return "-".join([username, tag, self.family]) if self.family else "-".join([username, tag])
+
+class FamilyRouter(object):
+
+    def __init__(self, families: Optional[Dict[str, List[str]]] = None) -> None:
+        families = families if families else FAMILIES
+        self.families: List[str] = list(families.keys()) + [OTHER]
+        self._exact: Dict[str, str] = {}
+        self._prefix: List[tuple] = []
+        for family, names in families.items():
+            for name in names:
+                if name.endswith("*"):
+                    self._prefix.append((name[:-1], family))
+                else:
+                    self._exact[name] = family
+        self._cache: Dict[str, str] = {}
+        return None
+
+    def family(self, event_name: str) -> str:
+        if (family := (self._cache.get(event_name))):
+            return family
+        family = self._exact.get(event_name)
+        if not family:
+            family = next((f for p, f in self._prefix if event_name.startswith(p)), OTHER)
+        self._cache[event_name] = family
+        return family
+
+def streamFiles(logdir: str, prefix: str) -> List[str]:
+    """Files of a stream, in writing order"""
+    found: Dict[tuple, str] = {}
+    for entry in os.scandir(logdir):
+        m = LOG_NAME.match(entry.name)
+        if not entry.is_file() or not m or m.group('prefix') != prefix:
+            continue
+        key = (m.group('date'), int(m.group('index') or 0))
+        # A file being compressed exists twice for a moment, the compressed one is complete
+        if key not in found or m.group('gz'):
+            found[key] = entry.path
+    return [found[key] for key in sorted(found.keys())]
+
+def captureName(path: str) -> str:
+    """`<username>-<tag>` of a log file, shared by its rotated files and its split streams"""
+    name = os.path.basename(path)
+    prefix = m.group('prefix') if (m := (LOG_NAME.match(name))) else name
+    for family in list(FAMILIES.keys()) + [OTHER]:
+        if prefix.endswith("-" + family):
+            return prefix[:-len(family) - 1]
+    return prefix
+
+def captureFiles(paths: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+    """`<username>-<tag>` -> stream prefix -> log files in writing order, of log files or
+    directories of log files
+    """
+    found: Dict[str, Dict[str, List[str]]] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            prefixes = sorted({m.group('prefix') for x in os.listdir(path) if (m := (LOG_NAME.match(x)))})
+            for prefix in prefixes:
+                found.setdefault(captureName(prefix), {})[prefix] = streamFiles(path, prefix)
+        else:
+            m = LOG_NAME.match(os.path.basename(path))
+            prefix = m.group('prefix') if m else os.path.basename(path)
+            found.setdefault(captureName(path), {}).setdefault(prefix, []).append(path)
+    return found
+
+def readStream(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        yield from readRecords(path)
+
+def mergeKey(record: Dict[str, Any]) -> tuple:
+    return (record.get('timestamp') or "", record.get('seq', 0))
+
+def mergeRecords(streams: Iterable[Iterable[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Restore the combined order of records of split streams, each in writing order"""
+    return heapq.merge(*streams, key = mergeKey)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Chromo split log streams tools")
+    sub = parser.add_subparsers(dest = "command", required = True)
+    merge = sub.add_parser("merge", help = "Merge split streams back into one log file")
+    merge.add_argument("logdir", type = str, help = "Log directory")
+    merge.add_argument("name", type = str, help = "<username>-<tag> of the streams")
+    merge.add_argument("dst", type = str, help = "Destination log file, must not exist")
+    merge.add_argument("--families", type = str, help = "Comma separated families to merge, all if not set")
+    merge.add_argument("--to", type = str, choices = list(FORMATS.keys()), default = "text", help = "Destination format")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        families = args.families.split(",") if args.families else list(FAMILIES.keys()) + [OTHER]
+        streams = [readStream(streamFiles(args.logdir, f"{args.name}-{f}")) for f in families]
+        fmt = getFormat(args.to)
+        count = 0
+        with open(args.dst, "xb") as fd:
+            fd.write(fmt.magic)
+            for record in mergeRecords(streams):
+                fd.write(fmt.encode(record))
+                count += 1
+        print(f"[+ {count} records merged from {len(streams)} streams]")
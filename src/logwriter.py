@@ -0,0 +1,288 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from logblock import compressBlock
+
+class BatchedWriter(object):
+    """Writer stage of `Logger`. Records are put into a bounded queue by the event loop, and
+    written to the log file by a dedicated thread in large batches, so that a slow disk never
+    stalls CDP processing.
+
+    Durability policy, whichever comes first:
+        - `flush_records`: flush once N records have been written since the last flush
+        - `flush_interval_ms`: flush T milliseconds after the first unflushed record
+        - `fsync`: also fsync the file at every flush
+
+    File operations (`open`, `flush`, `close`) and `call` go through the same queue, so they
+    are applied in order with the records.
+
+    With `block_records`, the file is block compressed (see `logblock`): records are gathered
+    into a gzip member every N records, and at every flush so that the file can be tailed.
+    """
+
+    _OPEN, _WRITE, _FLUSH, _CLOSE, _STOP, _CALL = range(6)
+
+    def __init__(
+        self,
+        queue_size: int = 65536,
+        batch_records: int = 1024,
+        flush_records: int = 1024,
+        flush_interval_ms: Union[int, float] = 1000,
+        fsync: bool = False,
+        block_records: int = 0,
+        block_level: int = 6
+    ) -> None:
+        """
+        Args:
+            queue_size (int): maximum number of queued records. `write` blocks when it is reached.
+            batch_records (int): maximum number of records written in one batch
+            flush_records (int): flush every N records. 0 to disable.
+            flush_interval_ms (Union[int, float]): flush every T milliseconds. 0 to disable.
+            fsync (bool): fsync the file at every flush
+            block_records (int): write a compressed block every N records. 0 to disable.
+            block_level (int): zlib compression level of the blocks
+        """
+        for name, value in (("queue_size", queue_size), ("batch_records", batch_records)):
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"invalid {name}: {value}")
+        if not isinstance(flush_records, int) or flush_records < 0:
+            raise ValueError(f"invalid flush_records: {flush_records}")
+        if not isinstance(block_records, int) or block_records < 0:
+            raise ValueError(f"invalid block_records: {block_records}")
+        if not isinstance(block_level, int) or not 0 <= block_level <= 9:
+            raise ValueError(f"invalid block_level: {block_level}")
+        if not isinstance(flush_interval_ms, (int, float)) or flush_interval_ms < 0:
+            raise ValueError(f"invalid flush_interval_ms: {flush_interval_ms}")
+
+        self.queue: "queue.Queue[Tuple[int, Any]]" = queue.Queue(maxsize = queue_size)
+        self.batch_records = batch_records
+        self.flush_records = flush_records
+        self.flush_interval: float = flush_interval_ms / 1000
+        self.fsync = fsync
+        self.block_records = block_records
+        self.block_level = block_level
+
+        self.path: Optional[str] = None
+        self._fd = None
+        self._unflushed: int = 0
+        self._first_unflushed: float = 0.0
+        self._block: List[bytes] = []
+        self._stats: Dict[str, Union[int, float]] = {
+            "records": 0,
+            "batches": 0,
+            "bytes": 0,
+            "diskBytes": 0,
+            "blocks": 0,
+            "lastBatch": 0,
+            "maxBatch": 0,
+            "lastWriteMs": 0.0,
+            "maxWriteMs": 0.0,
+            "totalWriteMs": 0.0,
+            "flushes": 0,
+            "stalls": 0,
+            "errors": 0
+        }
+
+        self.thread = threading.Thread(target = self._run, name = "chromo-log-writer", daemon = True)
+        self.thread.start()
+        return None
+
+    @property
+    def closed(self) -> bool:
+        return self._fd is None or self._fd.closed
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Write latency and batch size of the writer thread"""
+        stats = dict(self._stats)
+        stats["queued"] = self.queue.qsize()
+        stats["totalWriteMs"] = round(stats["totalWriteMs"], 3)
+        stats["avgBatch"] = round(stats["records"] / stats["batches"], 2) if stats["batches"] else 0
+        stats["avgWriteMs"] = round(stats["totalWriteMs"] / stats["batches"], 3) if stats["batches"] else 0
+        stats["ratio"] = round(stats["bytes"] / stats["diskBytes"], 2) if stats["diskBytes"] else 0
+        return stats
+
+    def _put(self, item: Tuple[int, Any]) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Back pressure: the writer thread is behind
+            self._stats["stalls"] += 1
+            self.queue.put(item)
+        return None
+
+    def open(
+        self, 
+        path: str, 
+        mode: str = "a", 
+        header: Optional[Union[str, bytes]] = None,
+        on_close: Optional[Callable[[str], None]] = None
+    ) -> None:
+        """Switch to the file at `path`. The current file is flushed and closed first.
+
+        Args:
+            path (str): path of the new log file
+            mode (str): "a" to append, "x" to create
+            header (Optional[Union[str, bytes]]): written right after opening
+            on_close (Optional[Callable[[str], None]]): called from the writer thread with the
+                path of the previous file once it is closed
+        """
+        self._put((self._OPEN, (path, mode, header, on_close)))
+        return None
+
+    def write(self, data: Union[str, bytes]) -> None:
+        self._put((self._WRITE, data))
+        return None
+
+    def call(self, fn: Callable[[], None]) -> None:
+        """Run `fn` in the writer thread, once the records written before have been handed
+        to the file.
+        """
+        self._put((self._CALL, fn))
+        return None
+
+    def flush(self, wait: bool = False) -> None:
+        done = threading.Event()
+        self._put((self._FLUSH, done))
+        if wait:
+            done.wait()
+        return None
+
+    def close(self, wait: bool = True) -> None:
+        done = threading.Event()
+        self._put((self._CLOSE, done))
+        if wait:
+            done.wait()
+        return None
+
+    def stop(self) -> bool:
+        done = threading.Event()
+        self._put((self._STOP, done))
+        done.wait()
+        self.thread.join()
+        return True
+
+    def _get(self) -> Optional[Tuple[int, Any]]:
+        timeout = None
+        if self._unflushed and self.flush_interval:
+            timeout = max(self._first_unflushed + self.flush_interval - time.monotonic(), 0)
+        try:
+            return self.queue.get(timeout = timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self) -> None:
+        pending: Optional[Tuple[int, Any]] = None
+        while True:
+            item, pending = pending if pending else self._get(), None
+            op, arg = item if item is not None else (self._FLUSH, None)
+            try:
+                if op == self._WRITE:
+                    batch: List[Union[str, bytes]] = [arg]
+                    while len(batch) < self.batch_records:
+                        try:
+                            nxt = self.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if nxt[0] != self._WRITE:
+                            pending = nxt
+                            break
+                        batch.append(nxt[1])
+                    self._write(batch)
+                elif op == self._OPEN:
+                    self._open(*arg)
+                elif op == self._FLUSH:
+                    self._flush()
+                elif op == self._CALL:
+                    arg()
+                elif op in (self._CLOSE, self._STOP):
+                    self._close()
+            except Exception as e:
+                # The thread keeps draining the queue whatever fails, or `write` would block
+                # the event loop once the queue is full
+                self._stats["errors"] += 1
+                print(f"[+ In {self.__class__.__name__}] log writing error: {e!r}")
+            finally:
+                if op != self._WRITE and arg is not None and isinstance(arg, threading.Event):
+                    arg.set()
+            if op == self._STOP:
+                return None
+
+    def _open(self, path: str, mode: str, header: Optional[Union[str, bytes]], on_close: Optional[Callable[[str], None]]) -> None:
+        previous = None if self.closed else self.path
+        self._close()
+        if previous and on_close:
+            on_close(previous)
+        self._fd = open(path, mode + "b")
+        self.path = path
+        if header:
+            header = header.encode("utf-8") if isinstance(header, str) else header
+            if self.block_records:
+                self._block.append(header)
+            else:
+                self._fd.write(header)
+        return None
+
+    def _write(self, batch: List[Union[str, bytes]]) -> None:
+        if self.closed:
+            self._stats["errors"] += len(batch)
+            return None
+        records = [x.encode("utf-8") if isinstance(x, str) else x for x in batch]
+        size = sum(len(x) for x in records)
+        started = time.monotonic()
+        if self.block_records:
+            for record in records:
+                self._block.append(record)
+                if len(self._block) >= self.block_records:
+                    self._writeBlock()
+        else:
+            self._fd.write(b"".join(records))
+            self._stats["diskBytes"] += size
+        elapsed = (time.monotonic() - started) * 1000
+
+        if not self._unflushed:
+            self._first_unflushed = started
+        self._unflushed += len(batch)
+        self._stats["records"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["bytes"] += size
+        self._stats["lastBatch"] = len(batch)
+        self._stats["maxBatch"] = max(self._stats["maxBatch"], len(batch))
+        self._stats["lastWriteMs"] = round(elapsed, 3)
+        self._stats["maxWriteMs"] = max(self._stats["maxWriteMs"], round(elapsed, 3))
+        self._stats["totalWriteMs"] += elapsed
+
+        if self.flush_records and self._unflushed >= self.flush_records:
+            self._flush()
+        return None
+
+    def _writeBlock(self) -> None:
+        if not self._block:
+            return None
+        block = compressBlock(b"".join(self._block), self.block_level)
+        self._block = []
+        self._fd.write(block)
+        self._stats["diskBytes"] += len(block)
+        self._stats["blocks"] += 1
+        return None
+
+    def _flush(self) -> None:
+        if self.closed:
+            return None
+        # A partial block is cut, so that readers see every flushed record
+        self._writeBlock()
+        self._fd.flush()
+        if self.fsync:
+            os.fsync(self._fd.fileno())
+        self._unflushed = 0
+        self._stats["flushes"] += 1
+        return None
+
+    def _close(self) -> None:
+        if self.closed:
+            return None
+        self._flush()
+        self._fd.close()
+        return None
@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+SAMPLE_SCRIPT = 1
+SKIP_STACKTRACE = 2
+DROP_NETWORK = 3
+
+class LoadShedder(object):
+    """Overload guard of the dispatch path. It watches the number of dispatched but
+    unfinished messages and the handler latency, and degrades in steps when the
+    configured limits are crossed:
+
+        level 1: sample `[Frame Execute Script]`
+        level 2: skip stack-trace analysis (`[Script Call Script]`)
+        level 3: drop `Network.*` events
+
+    Everything that has been shed is counted, so that a periodic `[Events Dropped]`
+    summary can be logged.
+    """
+
+    def __init__(
+        self,
+        steps: Optional[List[Dict[str, Any]]] = None,
+        sample_rate: int = 10,
+        smoothing: float = 0.2
+    ) -> None:
+        """
+        Args:
+            steps (Optional[List[Dict[str, Any]]]): One entry per degradation level, each with
+                `pending` (number of unfinished messages) and `latency_ms` (smoothed handler latency).
+                Crossing either limit of a step enters the level.
+            sample_rate (int): Only one out of `sample_rate` sampled events is kept.
+            smoothing (float): Weight of the newest latency sample in the moving average.
+        """
+        if steps is None:
+            steps = [
+                {"pending": 200, "latency_ms": 50},
+                {"pending": 500, "latency_ms": 200},
+                {"pending": 1000, "latency_ms": 500}
+            ]
+        if not isinstance(steps, list) or len(steps) > DROP_NETWORK:
+            raise ValueError(f"steps should be a list of at most {DROP_NETWORK} levels, not {steps}")
+        if not isinstance(sample_rate, int) or sample_rate < 1:
+            raise ValueError(f"invalid sample_rate: {sample_rate}")
+        if not 0 < smoothing <= 1:
+            raise ValueError(f"invalid smoothing: {smoothing}")
+
+        self.steps = [(int(s.get('pending', 0)), float(s.get('latency_ms', 0)) / 1000) for s in steps]
+        self.sample_rate = sample_rate
+        self.smoothing = smoothing
+
+        self.level: int = 0
+        self.pending: int = 0
+        self.latency: float = 0.0
+        self.peak_level: int = 0
+        self.dropped: Dict[str, int] = {}
+        self.since: datetime = datetime.now()
+        self._sampled: Dict[str, int] = {}
+        return None
+
+    def _evaluate(self) -> None:
+        crossed = sum(
+            1 for pending, latency in self.steps
+            if (pending and self.pending >= pending) or (latency and self.latency >= latency)
+        )
+        if crossed > self.level:
+            self.level = crossed
+        elif crossed < self.level:
+            # Step down one level at a time and only once well below the limits. A limit
+            # left unset does not hold the level.
+            pending, latency = self.steps[self.level - 1]
+            if (not pending or self.pending < pending / 2) and (not latency or self.latency < latency / 2):
+                self.level -= 1
+        self.peak_level = max(self.peak_level, self.level)
+        return None
+
+    def _drop(self, name: str) -> None:
+        self.dropped[name] = self.dropped.get(name, 0) + 1
+        return None
+
+    def admit(self, msg: Dict[str, Any]) -> bool:
+        """Decide if an incoming message should be dispatched. Command replies are always
+        admitted since `Handler.sendCommand` is waiting for them.
+        """
+        self._evaluate()
+        method = msg.get('method')
+        if method and self.level >= DROP_NETWORK and method.startswith("Network."):
+            self._drop(method)
+            return False
+        self.pending += 1
+        return True
+
+    def done(self, elapsed: float) -> None:
+        """Called when an admitted message has been handled.
+
+        Args:
+            elapsed (float): second spent in dispatching the message
+        """
+        self.pending = max(self.pending - 1, 0)
+        self.latency += self.smoothing * (elapsed - self.latency)
+        return None
+
+    def keepEvent(self, origin: str) -> bool:
+        if self.level < SAMPLE_SCRIPT or origin != "[Frame Execute Script]":
+            return True
+        seen = self._sampled.get(origin, 0)
+        self._sampled[origin] = seen + 1
+        if seen % self.sample_rate == 0:
+            return True
+        self._drop(origin)
+        return False
+
+    def skipStackTrace(self) -> bool:
+        if self.level < SKIP_STACKTRACE:
+            return False
+        self._drop("[Script Call Script]")
+        return True
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """Return the drop summary since the last call and reset the counters.
+        `None` is returned if nothing has been shed in the meantime.
+        """
+        now = datetime.now()
+        if not self.dropped and not self.peak_level:
+            self.since = now
+            return None
+        report = {
+            "since": self.since.isoformat(),
+            "until": now.isoformat(),
+            "level": self.level,
+            "peakLevel": self.peak_level,
+            "pending": self.pending,
+            "latencyMs": round(self.latency * 1000, 3),
+            "dropped": self.dropped
+        }
+        self.dropped = {}
+        self.peak_level = self.level
+        self.since = now
+        return report
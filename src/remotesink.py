@@ -0,0 +1,315 @@
+import asyncio
+import gzip
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Set, Union
+
+import aiohttp
+import requests
+
+from spool import DiskSpool
+
+class RemoteSink(object):
+    """Remote sink of `Logger`. Records are encoded as NDJSON lines into a batch, and
+    the batch is posted in one bulk request once it reaches `batch_records` records or
+    `batch_bytes` bytes, or `max_age_ms` after its first record.
+
+    All requests go through one pooled `aiohttp.ClientSession`, at most `max_inflight`
+    of them at the same time. Batches waiting for a free slot are queued up to
+    `max_pending` batches.
+
+    Without a `spool`, a failed batch or the oldest one beyond `max_pending` is dropped.
+    With a `DiskSpool`, it is written to the spool instead, and so are the following
+    batches to keep the order, until a background drainer has replayed the spool at
+    `drain_rate` records per second. The drainer retries with an exponential backoff
+    between `retry_ms` and `max_retry_ms` while the remote is down.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        batch_records: int = 500,
+        batch_bytes: int = 1 << 20,
+        max_age_ms: Union[int, float] = 1000,
+        compress: bool = True,
+        max_inflight: int = 4,
+        max_pending: int = 64,
+        timeout: Union[int, float] = 10,
+        spool: Optional[DiskSpool] = None,
+        drain_rate: int = 2000,
+        retry_ms: Union[int, float] = 1000,
+        max_retry_ms: Union[int, float] = 60000
+    ) -> None:
+        """
+        Args:
+            url (str): url of the remote logging terminal
+            batch_records (int): post a batch once it holds N records
+            batch_bytes (int): post a batch once it reaches N bytes before compression
+            max_age_ms (Union[int, float]): post a batch T milliseconds after its first record
+            compress (bool): gzip request bodies
+            max_inflight (int): maximum number of concurrent requests, also the size of the connection pool
+            max_pending (int): maximum number of batches waiting for a request slot
+            timeout (Union[int, float]): second of a request
+            spool (Optional[DiskSpool]): spool of the batches that cannot be shipped
+            drain_rate (int): maximum records per second replayed from the spool
+            retry_ms (Union[int, float]): first delay before retrying to drain the spool
+            max_retry_ms (Union[int, float]): maximum delay before retrying to drain the spool
+        """
+        for name, value in (
+            ("batch_records", batch_records), ("batch_bytes", batch_bytes),
+            ("max_inflight", max_inflight), ("max_pending", max_pending),
+            ("drain_rate", drain_rate)
+        ):
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"invalid {name}: {value}")
+        for name, value in (
+            ("max_age_ms", max_age_ms), ("timeout", timeout),
+            ("retry_ms", retry_ms), ("max_retry_ms", max_retry_ms)
+        ):
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"invalid {name}: {value}")
+        if spool is not None and not isinstance(spool, DiskSpool):
+            raise TypeError(f"spool should be a DiskSpool, not {type(spool)}")
+
+        self.url = url
+        self.batch_records = batch_records
+        self.batch_bytes = batch_bytes
+        self.max_age: float = max_age_ms / 1000
+        self.compress = compress
+        self.max_inflight = max_inflight
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.spool = spool
+        self.drain_rate = drain_rate
+        self.retry: float = retry_ms / 1000
+        self.max_retry: float = max_retry_ms / 1000
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._batch: List[bytes] = []
+        self._batch_size: int = 0
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self._pending: Deque[List[bytes]] = deque()
+        self._inflight: int = 0
+        # Posts in flight, referenced until done
+        self._posts: Set[asyncio.Future] = set()
+        self._idle: Optional[asyncio.Event] = None
+
+        # Spool IO runs on a single worker, so appends and reads are applied in order.
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._spooling: bool = False
+        self._spool_seq: int = 0
+        self._drainer: Optional[asyncio.Task] = None
+        if spool:
+            self._io = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "chromo-log-spool")
+            # Replay what a previous run has left
+            self._spooling = not spool.empty
+
+        self._stats: Dict[str, Union[int, float]] = {
+            "records": 0,
+            "shipped": 0,
+            "batches": 0,
+            "bytes": 0,
+            "wireBytes": 0,
+            "failures": 0,
+            "dropped": 0,
+            "spooled": 0,
+            "drained": 0,
+            "lastPostMs": 0.0,
+            "maxPostMs": 0.0
+        }
+        return None
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        stats = dict(self._stats)
+        stats["buffered"] = len(self._batch)
+        stats["pendingBatches"] = len(self._pending)
+        stats["inflight"] = self._inflight
+        if self.spool:
+            stats.update({f"spool{k[0].upper()}{k[1:]}": v for k, v in self.spool.stats().items()})
+        return stats
+
+    def _session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit = self.max_inflight),
+                timeout = aiohttp.ClientTimeout(total = self.timeout)
+            )
+        return self.session
+
+    def offer(self, record: str) -> None:
+        """Add a JSON encoded record to the current batch. Must be called from the event loop."""
+        line = (record + "\n").encode("utf-8")
+        self._batch.append(line)
+        self._batch_size += len(line)
+        self._stats["records"] += 1
+        if len(self._batch) >= self.batch_records or self._batch_size >= self.batch_bytes:
+            self._seal()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_event_loop().call_later(self.max_age, self._seal)
+        return None
+
+    def _seal(self) -> None:
+        """Close the current batch and hand it over for posting"""
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        if not self._batch:
+            return None
+        batch, self._batch, self._batch_size = self._batch, [], 0
+        if self._spooling:
+            # Records already wait in the spool, keep the order
+            self._spoolBatch(batch)
+            return None
+        self._pending.append(batch)
+        while len(self._pending) > self.max_pending:
+            # The remote is behind
+            self._lose(self._pending.popleft())
+        self._pump()
+        return None
+
+    def _pump(self) -> None:
+        while self._pending and self._inflight < self.max_inflight:
+            self._inflight += 1
+            if self._idle:
+                self._idle.clear()
+            post = asyncio.ensure_future(self._post(self._pending.popleft()))
+            self._posts.add(post)
+            post.add_done_callback(self._posts.discard)
+        return None
+
+    def _lose(self, batch: List[bytes]) -> None:
+        """A batch could not be shipped: spool it if possible, drop it otherwise"""
+        if self.spool:
+            self._spoolBatch(batch)
+        else:
+            self._stats["dropped"] += len(batch)
+        return None
+
+    def _spoolBatch(self, batch: List[bytes]) -> None:
+        self._spooling = True
+        self._spool_seq += 1
+        self._stats["spooled"] += len(batch)
+        self._io.submit(self.spool.append, batch)
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.ensure_future(self._drain())
+        return None
+
+    def _body(self, batch: List[bytes]) -> bytes:
+        body = b"".join(batch)
+        return gzip.compress(body, compresslevel = 5) if self.compress else body
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/x-ndjson"}
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+        return headers
+
+    async def _send(self, batch: List[bytes]) -> bool:
+        ok = False
+        started = time.monotonic()
+        try:
+            body = self._body(batch)
+            async with self._session().post(url = self.url, data = body, headers = self._headers()) as rsp:
+                ok = rsp.ok
+                if not ok:
+                    print(f"[+ In {self.__class__.__name__}] remote answered {rsp.status} for {len(batch)} records")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"[+ In {self.__class__.__name__}] posting {len(batch)} records failed: {e!r}")
+        finally:
+            elapsed = round((time.monotonic() - started) * 1000, 3)
+            self._stats["lastPostMs"] = elapsed
+            self._stats["maxPostMs"] = max(self._stats["maxPostMs"], elapsed)
+            self._stats["batches"] += 1
+            if ok:
+                self._stats["shipped"] += len(batch)
+                self._stats["bytes"] += sum(len(x) for x in batch)
+                self._stats["wireBytes"] += len(body)
+            else:
+                self._stats["failures"] += 1
+        return ok
+
+    async def _post(self, batch: List[bytes]) -> bool:
+        ok = False
+        try:
+            ok = await self._send(batch)
+            if not ok:
+                self._lose(batch)
+        finally:
+            self._inflight -= 1
+            self._pump()
+            if not self._inflight and not self._pending and self._idle:
+                self._idle.set()
+        return ok
+
+    async def _drain(self) -> None:
+        """Replay the spool in order, then switch back to posting batches directly"""
+        loop = asyncio.get_event_loop()
+        delay = self.retry
+        while True:
+            seq = self._spool_seq
+            lines, position = await loop.run_in_executor(self._io, self.spool.read, self.batch_records)
+            if not lines:
+                if seq == self._spool_seq:
+                    # Nothing has been spooled since the read started
+                    self._spooling = False
+                    return None
+                continue
+            if not await self._send(lines):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry)
+                continue
+            delay = self.retry
+            self._stats["drained"] += len(lines)
+            await loop.run_in_executor(self._io, self.spool.commit, position)
+            await asyncio.sleep(len(lines) / self.drain_rate)
+
+    async def flush(self) -> None:
+        """Post the current batch and wait until nothing is left in flight"""
+        self._seal()
+        if not self._inflight and not self._pending:
+            return None
+        if self._idle is None:
+            self._idle = asyncio.Event()
+        await self._idle.wait()
+        return None
+
+    async def shutDown(self) -> bool:
+        await self.flush()
+        if self._drainer:
+            self._drainer.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.close()
+        return True
+
+    def close(self) -> bool:
+        """Stop shipping outside of the event loop. Buffered batches are written to the
+        spool if there is one, and shipped with a blocking request otherwise. Requests in
+        flight are abandoned.
+        """
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        if self._batch:
+            self._pending.append(self._batch)
+            self._batch, self._batch_size = [], 0
+        if self.spool:
+            self._io.shutdown(wait = True)
+            while self._pending:
+                batch = self._pending.popleft()
+                self.spool.append(batch)
+                self._stats["spooled"] += len(batch)
+            self.spool.close()
+            return True
+        while self._pending:
+            batch = self._pending.popleft()
+            try:
+                rsp = requests.post(self.url, data = self._body(batch), headers = self._headers(), timeout = self.timeout)
+                if rsp.ok:
+                    self._stats["shipped"] += len(batch)
+                    continue
+            except requests.RequestException as e:
+                print(f"[+ In {self.__class__.__name__}] posting {len(batch)} records failed: {e!r}")
+            self._stats["dropped"] += len(batch)
+        return True
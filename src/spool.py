@@ -0,0 +1,169 @@
+import os
+import re
+import json
+from typing import Dict, List, Tuple
+
+# Read position in the spool: (segment number, byte offset)
+Position = Tuple[int, int]
+
+class DiskSpool(object):
+    """Append-only on-disk queue of NDJSON records, used by `RemoteSink` while the remote
+    logging terminal is down or behind.
+
+    Records are appended to `spool-<n>.ndjson` segment files, a new segment is started once
+    the current one reaches `segment_bytes`. The read position is kept in `spool.offset`, so
+    a spool left by a previous run is replayed after restart. Segments are deleted once they
+    have been read and committed. When the spool exceeds `max_bytes`, the oldest segment is
+    dropped.
+
+    The spool is not thread-safe, all calls are expected from the same worker.
+    """
+
+    SEGMENT = re.compile(r"^spool-(?P<n>\d{10})\.ndjson$")
+    OFFSET_FILE = "spool.offset"
+
+    def __init__(self, dir_: str, segment_bytes: int = 64 << 20, max_bytes: int = 1 << 30) -> None:
+        """
+        Args:
+            dir_ (str): directory of the spool, created if needed
+            segment_bytes (int): size of a segment file
+            max_bytes (int): maximum disk usage of the spool
+        """
+        if not isinstance(dir_, str):
+            raise TypeError(f"dir_ should be type str, not {type(dir_)}")
+        for name, value in (("segment_bytes", segment_bytes), ("max_bytes", max_bytes)):
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"invalid {name}: {value}")
+        if max_bytes < segment_bytes:
+            raise ValueError(f"max_bytes ({max_bytes}) is smaller than segment_bytes ({segment_bytes})")
+        os.makedirs(dir_, exist_ok = True)
+        self.dir = dir_
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+
+        self.segments: List[int] = sorted(
+            int(m.group('n')) for m in map(self.SEGMENT.match, os.listdir(dir_)) if m
+        )
+        self.position: Position = self._loadPosition()
+        self._fd = None
+        self._sizes: Dict[int, int] = {n: os.path.getsize(self._path(n)) for n in self.segments}
+        self.dropped: int = 0
+        return None
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.dir, f"spool-{segment:010d}.ndjson")
+
+    def _loadPosition(self) -> Position:
+        head = self.segments[0] if self.segments else 0
+        try:
+            with open(os.path.join(self.dir, self.OFFSET_FILE)) as fd:
+                saved = json.load(fd)
+            segment, offset = int(saved['segment']), int(saved['offset'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return (head, 0)
+        # The saved segment may have been dropped by the size cap
+        return (segment, offset) if segment in self.segments else (head, 0)
+
+    @property
+    def size(self) -> int:
+        return sum(self._sizes.values())
+
+    @property
+    def empty(self) -> bool:
+        if not self.segments:
+            return True
+        segment, offset = self.position
+        return segment >= self.segments[-1] and offset >= self._sizes.get(self.segments[-1], 0)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "segments": len(self.segments),
+            "bytes": self.size,
+            "dropped": self.dropped
+        }
+
+    def append(self, lines: List[bytes]) -> None:
+        """Append NDJSON lines, each ending with a newline"""
+        if not lines:
+            return None
+        if not self.segments or self._sizes[self.segments[-1]] >= self.segment_bytes:
+            self._startSegment()
+        elif self._fd is None:
+            self._fd = open(self._path(self.segments[-1]), "ab")
+        data = b"".join(lines)
+        self._fd.write(data)
+        self._fd.flush()
+        self._sizes[self.segments[-1]] += len(data)
+        self._enforceCap()
+        return None
+
+    def _startSegment(self) -> None:
+        if self._fd:
+            self._fd.close()
+        n = self.segments[-1] + 1 if self.segments else self.position[0]
+        self.segments.append(n)
+        self._sizes[n] = 0
+        self._fd = open(self._path(n), "ab")
+        return None
+
+    def _enforceCap(self) -> None:
+        while self.size > self.max_bytes and len(self.segments) > 1:
+            n = self.segments.pop(0)
+            with open(self._path(n), "rb") as fd:
+                if self.position[0] == n:
+                    fd.seek(self.position[1])
+                self.dropped += sum(1 for _ in fd)
+            os.remove(self._path(n))
+            self._sizes.pop(n)
+            if self.position[0] <= n:
+                self.position = (self.segments[0], 0)
+                self._savePosition()
+            print(f"[+ In {self.__class__.__name__}] spool over {self.max_bytes} bytes, dropped segment {n}")
+        return None
+
+    def read(self, max_records: int) -> Tuple[List[bytes], Position]:
+        """Read up to `max_records` lines from the read position. The position is not
+        moved until `commit` is called with the returned position.
+        """
+        lines: List[bytes] = []
+        segment, offset = self.position
+        while len(lines) < max_records and segment in self._sizes:
+            with open(self._path(segment), "rb") as fd:
+                fd.seek(offset)
+                while len(lines) < max_records:
+                    line = fd.readline()
+                    if not line.endswith(b"\n"):
+                        # End of segment, or a line still being written
+                        break
+                    lines.append(line)
+                    offset += len(line)
+            if len(lines) >= max_records or segment == self.segments[-1]:
+                break
+            segment, offset = self.segments[self.segments.index(segment) + 1], 0
+        return lines, (segment, offset)
+
+    def commit(self, position: Position) -> None:
+        """Move the read position, deleting the segments entirely read"""
+        if position < self.position:
+            # Already moved past it, the segment has been dropped by the size cap
+            return None
+        self.position = position
+        self._savePosition()
+        while len(self.segments) > 1 and self.segments[0] < position[0]:
+            n = self.segments.pop(0)
+            self._sizes.pop(n)
+            os.remove(self._path(n))
+        return None
+
+    def _savePosition(self) -> None:
+        path = os.path.join(self.dir, self.OFFSET_FILE)
+        with open(path + ".tmp", "w") as fd:
+            json.dump({"segment": self.position[0], "offset": self.position[1]}, fd)
+        os.replace(path + ".tmp", path)
+        return None
+
+    def close(self) -> None:
+        if self._fd:
+            self._fd.close()
+            self._fd = None
+        return None
@@ -0,0 +1,211 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER,
+    ts TEXT NOT NULL,
+    event_number INTEGER,
+    event_name TEXT NOT NULL,
+    frame_uid TEXT,
+    script_hash TEXT,
+    script_domain TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_frame_uid ON events (frame_uid, ts);
+CREATE INDEX IF NOT EXISTS events_event_name ON events (event_name, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_script_hash ON events (script_hash);
+CREATE INDEX IF NOT EXISTS events_script_domain ON events (script_domain);
+"""
+
+# Keys of the event data holding the script of an event, by priority
+SCRIPT_KEYS = ("Script", "calleeScirpt", "callerScript", "script", "parentScriptInfo")
+
+Row = Tuple[Optional[int], str, int, str, Optional[str], Optional[str], Optional[str], str]
+
+class SqliteSink(object):
+    """SQLite sink of `Logger`, for querying a capture by frame, event, time or script:
+
+        SELECT ts, event_name, data FROM events WHERE frame_uid = ? ORDER BY ts;
+
+    Rows are inserted by a dedicated thread, `batch_records` rows per transaction, and at
+    least every `flush_interval_ms`. The database is in WAL mode, so that readers can query
+    the live capture without blocking the writer.
+    """
+
+    _INSERT, _FLUSH, _STOP = range(3)
+
+    def __init__(
+        self,
+        path: str,
+        queue_size: int = 65536,
+        batch_records: int = 2048,
+        flush_interval_ms: Union[int, float] = 1000,
+        synchronous: str = "NORMAL"
+    ) -> None:
+        """
+        Args:
+            path (str): path of the database, created if needed
+            queue_size (int): maximum number of queued rows. `offer` blocks when it is reached.
+            batch_records (int): maximum rows inserted in one transaction
+            flush_interval_ms (Union[int, float]): commit queued rows at least every T milliseconds
+            synchronous (str): `PRAGMA synchronous` of the database, `OFF`, `NORMAL` or `FULL`
+        """
+        for name, value in (("queue_size", queue_size), ("batch_records", batch_records)):
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"invalid {name}: {value}")
+        if not isinstance(flush_interval_ms, (int, float)) or flush_interval_ms <= 0:
+            raise ValueError(f"invalid flush_interval_ms: {flush_interval_ms}")
+        if synchronous not in ("OFF", "NORMAL", "FULL"):
+            raise ValueError(f"invalid synchronous: {synchronous}")
+        if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            raise NotADirectoryError(f"directory of {path} not found")
+
+        self.path = path
+        self.queue: "queue.Queue[Tuple[int, Any]]" = queue.Queue(maxsize = queue_size)
+        self.batch_records = batch_records
+        self.flush_interval: float = flush_interval_ms / 1000
+        self.synchronous = synchronous
+        self._stats: Dict[str, Union[int, float]] = {
+            "rows": 0,
+            "transactions": 0,
+            "lastCommitMs": 0.0,
+            "maxCommitMs": 0.0,
+            "stalls": 0,
+            "errors": 0
+        }
+        self._ready = threading.Event()
+        # Error opening the database, raised to the caller
+        self._error: Optional[BaseException] = None
+        self.thread = threading.Thread(target = self._run, name = "chromo-log-sqlite", daemon = True)
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self.thread.join()
+            raise self._error
+        return None
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        stats = dict(self._stats)
+        stats["queued"] = self.queue.qsize()
+        return stats
+
+    @staticmethod
+    def scriptOf(event_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        for key in SCRIPT_KEYS:
+            if isinstance((script := (event_data.get(key))), dict):
+                return script
+        return None
+
+    @classmethod
+    def row(cls, record: Dict[str, Any], data: str) -> Row:
+        """Index columns of a record, `data` is the json of its event data"""
+        event_data = record.get('eventData')
+        event_data = event_data if isinstance(event_data, dict) else {}
+        script = cls.scriptOf(event_data) or {}
+        return (
+            record.get('seq'),
+            record.get('timestamp'),
+            int(record.get('eventNumber') or 0),
+            record.get('eventName'),
+            event_data.get('frameUID') or event_data.get('frameNewUID'),
+            script.get('contentHash'),
+            script.get('domain'),
+            data
+        )
+
+    def offer(self, record: Dict[str, Any], data: str) -> None:
+        item = (self._INSERT, self.row(record, data))
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self._stats["stalls"] += 1
+            self.queue.put(item)
+        return None
+
+    def flush(self, wait: bool = False) -> None:
+        done = threading.Event()
+        self.queue.put((self._FLUSH, done))
+        if wait:
+            done.wait()
+        return None
+
+    def stop(self) -> bool:
+        done = threading.Event()
+        self.queue.put((self._STOP, done))
+        done.wait()
+        self.thread.join()
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level = None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _insert(self, conn: sqlite3.Connection, rows: Iterable[Row]) -> None:
+        rows = list(rows)
+        if not rows:
+            return None
+        started = time.monotonic()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO events (seq, ts, event_number, event_name, frame_uid, script_hash, script_domain, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        elapsed = round((time.monotonic() - started) * 1000, 3)
+        self._stats["rows"] += len(rows)
+        self._stats["transactions"] += 1
+        self._stats["lastCommitMs"] = elapsed
+        self._stats["maxCommitMs"] = max(self._stats["maxCommitMs"], elapsed)
+        return None
+
+    def _run(self) -> None:
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self._error = e
+            return None
+        finally:
+            self._ready.set()
+        rows = []
+        deadline: Optional[float] = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            try:
+                op, arg = self.queue.get(timeout = timeout)
+            except queue.Empty:
+                op, arg = self._FLUSH, None
+            if op == self._INSERT:
+                if not rows:
+                    deadline = time.monotonic() + self.flush_interval
+                rows.append(arg)
+                if len(rows) < self.batch_records:
+                    continue
+            try:
+                self._insert(conn, rows)
+            except Exception as e:
+                # The thread keeps draining the queue whatever fails, or `offer` would block
+                # the event loop once the queue is full
+                self._stats["errors"] += len(rows)
+                print(f"[+ In {self.__class__.__name__}] inserting {len(rows)} rows failed: {e!r}")
+            rows, deadline = [], None
+            if arg is not None and isinstance(arg, threading.Event):
+                arg.set()
+            if op == self._STOP:
+                conn.close()
+                return None
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules of src/ and visualization/ import each other as top-level modules
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for directory in ("src", "visualization", "test"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
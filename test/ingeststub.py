@@ -0,0 +1,139 @@
+"""Local stand-in of the logstash http input, for trying out the remote sink of `Logger`
+without an ELK stack. NDJSON bulk posts (optionally gzipped) are counted and discarded.
+Gzipped bodies are decompressed by aiohttp, `wireBytes` counts them as posted.
+
+    python test/ingeststub.py --port 8080 --latency-ms 20 --error-rate 0.05 --slow-kbps 512
+
+`GET /stats` returns the counters as JSON, `POST /reset` clears them.
+"""
+import asyncio
+import argparse
+import json
+import random
+import time
+from typing import Dict, List, Union
+
+from aiohttp import web
+
+class IngestStub(object):
+
+    def __init__(
+        self,
+        latency_ms: Union[int, float] = 0,
+        jitter_ms: Union[int, float] = 0,
+        error_rate: float = 0.0,
+        slow_kbps: int = 0,
+        down: bool = False
+    ) -> None:
+        """
+        Args:
+            latency_ms (Union[int, float]): delay before answering a post
+            jitter_ms (Union[int, float]): random extra delay up to this value
+            error_rate (float): ratio of posts answered with 503
+            slow_kbps (int): read request bodies at this rate, to simulate a slow consumer. 0 to disable.
+            down (bool): answer every post with 503 until `POST /up`
+        """
+        if not 0 <= error_rate <= 1:
+            raise ValueError(f"invalid error_rate: {error_rate}")
+        self.latency: float = latency_ms / 1000
+        self.jitter: float = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.slow_kbps = slow_kbps
+        self.down = down
+        self.reset()
+        return None
+
+    def reset(self) -> None:
+        self.stats: Dict[str, Union[int, float]] = {
+            "requests": 0,
+            "records": 0,
+            "bytes": 0,
+            "wireBytes": 0,
+            "errors": 0,
+            "malformed": 0,
+            "firstAt": 0.0,
+            "lastAt": 0.0
+        }
+        self.latencies: List[float] = []
+        return None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size = 0)
+        app.router.add_route("HEAD", "/", self._head)
+        app.router.add_post("/", self._ingest)
+        app.router.add_get("/stats", self._stats)
+        app.router.add_post("/reset", self._reset)
+        app.router.add_post("/down", self._switch)
+        app.router.add_post("/up", self._switch)
+        return app
+
+    async def _reset(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.Response()
+
+    async def _switch(self, request: web.Request) -> web.Response:
+        self.down = request.path == "/down"
+        return web.Response()
+
+    async def _head(self, request: web.Request) -> web.Response:
+        return web.Response(status = 503 if self.down else 200)
+
+    async def _read(self, request: web.Request) -> bytes:
+        if not self.slow_kbps:
+            return await request.read()
+        chunks = []
+        chunk_size = max(self.slow_kbps * 1024 // 10, 1)
+        while (chunk := (await request.content.read(chunk_size))):
+            chunks.append(chunk)
+            await asyncio.sleep(0.1)
+        return b"".join(chunks)
+
+    async def _ingest(self, request: web.Request) -> web.Response:
+        started = time.monotonic()
+        body = await self._read(request)
+        self.stats["requests"] += 1
+        self.stats["wireBytes"] += request.content_length or len(body)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.random() * self.jitter)
+        if self.down or random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status = 503)
+
+        for line in body.splitlines():
+            try:
+                json.loads(line)
+            except ValueError:
+                self.stats["malformed"] += 1
+                continue
+            self.stats["records"] += 1
+        self.stats["bytes"] += len(body)
+        now = time.time()
+        self.stats["firstAt"] = self.stats["firstAt"] or now
+        self.stats["lastAt"] = now
+        self.latencies.append(time.monotonic() - started)
+        return web.Response()
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        stats = dict(self.stats)
+        latencies = sorted(self.latencies)
+        stats["p99Ms"] = round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else 0
+        return web.json_response(stats)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Local logstash http input stand-in")
+    parser.add_argument("-H", "--host", type = str, default = "127.0.0.1", help = "Listening address")
+    parser.add_argument("-P", "--port", type = int, default = 8080, help = "Listening port")
+    parser.add_argument("--latency-ms", type = float, default = 0, help = "Delay before answering a post")
+    parser.add_argument("--jitter-ms", type = float, default = 0, help = "Random extra delay up to this value")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "Ratio of posts answered with 503")
+    parser.add_argument("--slow-kbps", type = int, default = 0, help = "Read request bodies at this rate")
+    parser.add_argument("--down", action = "store_true", help = "Start unavailable, until POST /up")
+    args = parser.parse_args()
+    stub = IngestStub(
+        latency_ms = args.latency_ms,
+        jitter_ms = args.jitter_ms,
+        error_rate = args.error_rate,
+        slow_kbps = args.slow_kbps,
+        down = args.down
+    )
+    web.run_app(stub.app(), host = args.host, port = args.port)
@@ -0,0 +1,157 @@
+"""Throughput benchmark of the `Logger` sinks. Synthetic `[Frame Execute Script]` records
+are logged at a fixed rate, and the achieved events/sec, the latency of `Logger.log` on the
+event loop and the number of records lost are reported.
+
+    python test/sinkbench.py --mode file --rate 5000 --duration 10
+    python test/sinkbench.py --mode strict --rate 20000
+    python test/sinkbench.py --mode remote --rate 5000 --latency-ms 50 --error-rate 0.1 --spool
+
+In remote mode, `ingeststub.py` is started in a child process as the remote terminal.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from core import Logger
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+def syntheticEvent(n: int) -> Dict[str, Any]:
+    return {
+        "frameUID": f"{n % 64:032x}",
+        "Script": {
+            "scriptId": str(n),
+            "url": f"https://cdn.example.com/static/js/chunk.{n % 512}.js",
+            "contentHash": f"{n % 4096:064x}",
+            "domainHash": f"{n % 16:032x}",
+            "executionContextId": n % 8
+        },
+        "frameInfo": {
+            "frameId": f"{n % 64:032X}",
+            "frameURL": "https://www.example.com/index.html",
+            "securityOrigin": "https://www.example.com",
+            "mimeType": "text/html"
+        }
+    }
+
+def startStub(args: argparse.Namespace) -> subprocess.Popen:
+    cmd = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingeststub.py"),
+        "--port", str(args.port),
+        "--latency-ms", str(args.latency_ms),
+        "--error-rate", str(args.error_rate),
+        "--slow-kbps", str(args.slow_kbps)
+    ]
+    stub = subprocess.Popen(cmd, stdout = subprocess.DEVNULL)
+    for _ in range(50):
+        try:
+            requests.get(f"http://127.0.0.1:{args.port}/stats", timeout = 1)
+            return stub
+        except requests.RequestException:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("ingest stub did not start")
+
+async def drive(logger: Logger, rate: int, duration: float, tick: float = 0.01) -> Dict[str, Any]:
+    latencies: List[float] = []
+    sent = 0
+    started = time.monotonic()
+    while (elapsed := (time.monotonic() - started)) < duration:
+        # Catch up with the schedule, so the offered rate holds even if a tick is late
+        due = int(elapsed * rate) - sent
+        for _ in range(due):
+            t0 = time.perf_counter()
+            logger.log(event_name = "[Frame Execute Script]", event_data = syntheticEvent(sent), event_number = 8)
+            latencies.append(time.perf_counter() - t0)
+            sent += 1
+        await asyncio.sleep(tick)
+    elapsed = time.monotonic() - started
+    return {
+        "offered": sent,
+        "eventsPerSec": round(sent / elapsed, 1),
+        "p50LogUs": round(percentile(latencies, 0.5) * 1e6, 1),
+        "p99LogUs": round(percentile(latencies, 0.99) * 1e6, 1),
+        "maxLogUs": round(max(latencies, default = 0) * 1e6, 1)
+    }
+
+async def bench(args: argparse.Namespace) -> Dict[str, Any]:
+    logdir = args.logdir or tempfile.mkdtemp(prefix = "chromo-bench-")
+    remote = {
+        "host": "127.0.0.1",
+        "port": args.port,
+        "shipping": {"batch_records": args.batch_records, "max_inflight": args.max_inflight},
+        "spool": {"enable": args.spool}
+    }
+    logger = Logger(
+        dir_ = logdir,
+        username = "bench",
+        tag = args.mode,
+        strict_form = args.mode != "file",
+        ifremote = args.mode == "remote",
+        **remote
+    )
+    result = await drive(logger, args.rate, args.duration)
+
+    started = time.monotonic()
+    await logger.shutDown()
+    result["drainSec"] = round(time.monotonic() - started, 3)
+    writer = logger.writer.stats()
+    result.update({
+        "written": writer["records"],
+        "writerStalls": writer["stalls"],
+        "writerMaxWriteMs": writer["maxWriteMs"]
+    })
+    lost = result["offered"] - writer["records"]
+    if logger.remote:
+        sink = logger.remote.stats()
+        received = requests.get(f"http://127.0.0.1:{args.port}/stats", timeout = 5).json()
+        result.update({
+            "received": received["records"],
+            "remoteRequests": received["requests"],
+            "remoteErrors": received["errors"],
+            "remoteP99Ms": received["p99Ms"],
+            "sinkDropped": sink["dropped"],
+            "sinkSpooled": sink["spooled"],
+            "sinkDrained": sink["drained"]
+        })
+        # Records left in the spool are not lost, they are replayed by the next run
+        result["leftInSpool"] = sink["spooled"] - sink["drained"]
+        lost = max(lost, result["offered"] - received["records"] - result["leftInSpool"])
+    result["dropped"] = lost
+    result["logdir"] = logdir
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Logger sink throughput benchmark")
+    parser.add_argument("-m", "--mode", choices = ["file", "strict", "remote"], default = "file", help = "Logger mode")
+    parser.add_argument("-r", "--rate", type = int, default = 5000, help = "Offered events per second")
+    parser.add_argument("-D", "--duration", type = float, default = 10, help = "Second of the run")
+    parser.add_argument("-d", "--logdir", type = str, help = "Log directory, a temporary one if not set")
+    parser.add_argument("-P", "--port", type = int, default = 18080, help = "Port of the ingest stub")
+    parser.add_argument("--latency-ms", type = float, default = 0, help = "Ingest stub answer delay")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "Ingest stub error ratio")
+    parser.add_argument("--slow-kbps", type = int, default = 0, help = "Ingest stub read rate")
+    parser.add_argument("--batch-records", type = int, default = 500, help = "Records per remote post")
+    parser.add_argument("--max-inflight", type = int, default = 4, help = "Concurrent remote posts")
+    parser.add_argument("--spool", action = "store_true", help = "Spool failed remote batches to disk")
+    args = parser.parse_args()
+
+    stub = startStub(args) if args.mode == "remote" else None
+    try:
+        print(json.dumps(asyncio.run(bench(args)), indent = 4))
+    finally:
+        if stub:
+            stub.terminate()
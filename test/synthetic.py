@@ -0,0 +1,46 @@
+"""Synthetic captures written through `Logger`, shared by the tests"""
+import glob
+import os
+import random
+from typing import Any, List
+
+from core import Logger
+
+DOMAINS = [f"d{i}.com" for i in range(40)]
+
+def writeCapture(logdir: str, records: int, seed: int = 0, tag: str = "default", **options: Any) -> List[str]:
+    """Log `records` frame and script events into `logdir`, returns the log files written.
+    `options` are passed to `Logger`.
+    """
+    os.makedirs(logdir, exist_ok = True)
+    rng = random.Random(seed)
+    options.setdefault("rotate_options", {"compress": False})
+    logger = Logger(dir_ = logdir, strict_form = True, tag = tag, **options)
+    serial = iter(range(1, records + 2))
+    uid = lambda: f"{tag}-U{next(serial)}"
+    main = uid()
+    frames = [main]
+    logger.log("[Main Frame Created]", {"frameUID": main, "frameInfo": {"UID": main, "mainFrame": True, "title": "Home", "url": {"netloc": "site.com"}}}, 1)
+    for _ in range(records):
+        draw, frame = rng.random(), rng.choice(frames)
+        domain, content = rng.choice(DOMAINS), f"h{rng.randrange(200)}"
+        if draw < 0.5:
+            logger.log("[Frame Execute Script]", {"frameUID": frame, "Script": {"domain": domain, "contentHash": content, "domainHash": f"{domain}/{content}"}}, 2)
+        elif draw < 0.6:
+            child = uid()
+            frames.append(child)
+            logger.log("[Sub-Frame Created]", {"frameUID": child, "parentFrameUID": frame, "frameInfo": {"UID": child, "mainFrame": False, "url": {"netloc": domain}}}, 3)
+        elif draw < 0.75:
+            new = uid()
+            frames[frames.index(frame)] = new
+            logger.log("[Frame Info Update to]", {"frameOriginUID": frame, "frameNewUID": new, "frameInfo": {"UID": new, "mainFrame": frame == main, "url": {"netloc": domain}}}, 4)
+            main = new if frame == main else main
+        elif draw < 0.85:
+            event = rng.choice(["[Frame Navigate by Script]", "[Frame Navigate by HTML]", "[Frame Navigate by User]"])
+            logger.log(event, {"originFrameUID": rng.choice(frames), "frameUID": frame, "frameInfo": {"UID": frame, "title": "t", "url": {"netloc": domain}}}, 5)
+        elif draw < 0.92:
+            logger.log("[Script Initiate Remote Script]", {"parentScript": {"domainHash": f"{domain}/{content}", "scriptId": "1"}, "childScript": {"domain": domain, "domainHash": f"{domain}/h{rng.randrange(200)}"}}, 6)
+        else:
+            logger.log("[Frame Attach to Frame]", {"frameUID": frame, "parentFrameUID": rng.choice(frames), "frameInfo": {"UID": frame, "url": "u"}}, 7)
+    logger.close()
+    return sorted(x for x in glob.glob(os.path.join(logdir, "*")) if not x.endswith((".idx", ".sqlite", "-wal", "-shm")))
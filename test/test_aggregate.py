@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from aggregate import EventAggregator
+
+EXECUTE = "[Frame Execute Script]"
+CALL = "[Script Call Script]"
+
+def execute(frame, content):
+    return {"frameUID": frame, "Script": {"contentHash": content}}
+
+def aggregator(**options):
+    emitted = []
+    return EventAggregator(lambda origin, record: emitted.append((origin, record)), **options), emitted
+
+def test_identical_events_merge_in_a_window():
+    merger, emitted = aggregator(window = 10)
+    assert all(merger.offer(EXECUTE, execute("F", "a")) for _ in range(5))
+    assert merger.offer(EXECUTE, execute("F", "b"))
+    assert merger.offer(EXECUTE, execute("G", "a"))
+    assert not emitted
+    merger.flush()
+    counts = {(r["frameUID"], r["Script"]["contentHash"]): r["aggregate"]["count"] for _, r in emitted}
+    assert counts == {("F", "a"): 5, ("F", "b"): 1, ("G", "a"): 1}
+    assert merger.merged == 4
+
+def test_windows_close_once_expired():
+    merger, emitted = aggregator(window = 10)
+    merger.offer(EXECUTE, execute("F", "a"))
+    assert merger.expire(datetime.now() + timedelta(seconds = 5)) == 0
+    assert merger.expire(datetime.now() + timedelta(seconds = 11)) == 1
+    assert emitted[0][0] == EXECUTE
+    aggregate = emitted[0][1]["aggregate"]
+    assert aggregate["count"] == 1 and aggregate["firstSeen"] == aggregate["lastSeen"]
+    # A new window opens for the same key
+    merger.offer(EXECUTE, execute("F", "a"))
+    merger.flush()
+    assert len(emitted) == 2
+
+def test_oldest_window_closes_at_max_open():
+    merger, emitted = aggregator(max_open = 2)
+    for content in ("a", "b", "c"):
+        merger.offer(EXECUTE, execute("F", content))
+    assert [r["Script"]["contentHash"] for _, r in emitted] == ["a"]
+
+def test_other_events_pass_through():
+    merger, emitted = aggregator(events = [CALL])
+    assert not merger.offer(EXECUTE, execute("F", "a"))
+    assert merger.offer(CALL, {"frameUID": "F", "callerScript": {"contentHash": "a"}, "calleeScirpt": {"contentHash": "b"}})
+
+def test_records_are_snapshot_when_the_window_opens():
+    merger, emitted = aggregator()
+    caller = {"contentHash": "a", "callScriptHistory": set()}
+    merger.offer(CALL, {"frameUID": "F", "callerScript": caller, "calleeScirpt": {"contentHash": "b"}})
+    caller["callScriptHistory"].add("b")
+    merger.flush()
+    assert emitted[0][1]["callerScript"]["callScriptHistory"] == set()
@@ -0,0 +1,45 @@
+import gzip
+import json
+import asyncio
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+from ingeststub import IngestStub
+from remotesink import RemoteSink
+
+def lines(n):
+    return [json.dumps({"eventNumber": str(i), "eventName": "[Frame Execute Script]", "eventData": {"n": i}}) for i in range(n)]
+
+async def _post(stub, body, headers):
+    async with TestServer(stub.app()) as server:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(server.make_url("/"), data = body, headers = headers) as rsp:
+                return rsp.status
+
+def test_gzipped_post_is_ingested():
+    stub = IngestStub()
+    body = "\n".join(lines(100)).encode()
+    compressed = gzip.compress(body)
+    status = asyncio.run(_post(stub, compressed, {"Content-Encoding": "gzip"}))
+    assert status == 200
+    assert stub.stats["records"] == 100
+    assert stub.stats["malformed"] == 0
+    assert stub.stats["bytes"] == len(body)
+    assert stub.stats["wireBytes"] == len(compressed)
+
+def test_remote_sink_ships_through_stub():
+    async def run(compress):
+        stub = IngestStub()
+        async with TestServer(stub.app()) as server:
+            sink = RemoteSink(str(server.make_url("/")), batch_records = 100, compress = compress)
+            for line in lines(1000):
+                sink.offer(line)
+            await sink.shutDown()
+        return stub.stats, sink.stats()
+
+    for compress in (True, False):
+        received, shipped = asyncio.run(run(compress))
+        assert received["records"] == 1000
+        assert shipped["shipped"] == 1000 and shipped["dropped"] == 0
+        assert received["wireBytes"] == shipped["wireBytes"]
@@ -0,0 +1,43 @@
+import gzip
+import os
+
+from logblock import BlockReader, blockSize, compressBlock, decompressBlock, decompressedSize, isBlockFile, HEADER_SIZE
+from logformat import readRecords
+from synthetic import writeCapture
+
+def test_block_round_trip():
+    data = os.urandom(1000) + b"x" * 5000
+    block = compressBlock(data)
+    assert blockSize(block[:HEADER_SIZE]) == len(block)
+    assert decompressBlock(block) == data
+    assert gzip.decompress(block) == data
+
+def test_blocks_are_readable_on_their_own(tmp_path):
+    chunks = [f"{i}\n".encode() * (i + 1) for i in range(20)]
+    path = tmp_path / "b.log.gz"
+    path.write_bytes(b"".join(compressBlock(x) for x in chunks))
+    assert isBlockFile(str(path))
+    assert decompressedSize(str(path)) == sum(len(x) for x in chunks)
+    # The file as a whole is a valid gzip stream
+    assert gzip.decompress(path.read_bytes()) == b"".join(chunks)
+    with open(path, "rb") as fd:
+        reader = BlockReader(fd)
+        blocks = list(reader.blocks())
+        assert len(blocks) == len(chunks)
+        assert [reader.read(offset) for offset, _ in blocks] == chunks
+        assert reader.reader(start = blocks[5][0], end = blocks[8][0]).read() == b"".join(chunks[5:8])
+
+def test_block_being_written_is_not_reported(tmp_path):
+    path = tmp_path / "b.log.gz"
+    complete, partial = compressBlock(b"a\n" * 100), compressBlock(b"b\n" * 100)
+    path.write_bytes(complete + partial[:-5])
+    with open(path, "rb") as fd:
+        assert list(BlockReader(fd).blocks()) == [(0, len(complete))]
+        assert b"".join(BlockReader(fd).stream()) == b"a\n" * 100
+
+def test_logger_writes_block_files(tmp_path):
+    [plain] = writeCapture(str(tmp_path / "plain"), 1000)
+    [block] = writeCapture(str(tmp_path / "block"), 1000, writer_options = {"block_records": 50})
+    assert block.endswith(".gz") and isBlockFile(block)
+    strip = lambda records: [(x["eventName"], x["eventData"]) for x in records]
+    assert strip(readRecords(block)) == strip(readRecords(plain))
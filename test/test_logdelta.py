@@ -0,0 +1,49 @@
+import pytest
+
+from logdelta import FrameDeltaDecoder, FrameDeltaEncoder, rebuild
+from logformat import readRecords
+from synthetic import writeCapture
+
+def events(n):
+    for i in range(n):
+        info = {"UID": f"U{i % 3}", "url": {"netloc": f"d{i % 5}.com"}, "title": f"t{i // 4}"}
+        if i % 7 == 0:
+            info["opener"] = "O"
+        yield {"frameId": f"F{i % 3}", "frameInfo": info, "n": i}
+
+def test_round_trip():
+    encoder, decoder = FrameDeltaEncoder(keyframe_interval = 4), FrameDeltaDecoder()
+    original = list(events(100))
+    encoded = [encoder.encode(x) for x in original]
+    assert sum("frameInfoDelta" in x for x in encoded) > 50
+    assert [decoder.decode(x) for x in encoded] == original
+
+def test_keyframes():
+    encoder = FrameDeltaEncoder(keyframe_interval = 4)
+    encoded = [encoder.encode(x) for x in events(30)]
+    per_frame = [[x for x in encoded if x.get("frameId") == f"F{i}"] for i in range(3)]
+    for frame in per_frame:
+        assert ["frameInfo" in x for x in frame[:8]] == [True, False, False, False, True, False, False, False]
+    encoder.reset()
+    assert "frameInfo" in encoder.encode(next(events(1)))
+
+def test_input_is_not_modified():
+    encoder = FrameDeltaEncoder()
+    first, second = list(events(4))[::3]
+    second = dict(second, frameId = first["frameId"])
+    encoder.encode(first)
+    snapshot = dict(second)
+    assert "frameInfoDelta" in encoder.encode(second)
+    assert second == snapshot
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        FrameDeltaEncoder(keyframe_interval = 0)
+
+def test_logger_writes_rebuildable_files(tmp_path):
+    [plain] = writeCapture(str(tmp_path / "plain"), 2000)
+    [delta] = writeCapture(str(tmp_path / "delta"), 2000, delta_options = {"enable": True, "keyframe_interval": 8})
+    raw = list(readRecords(delta, rebuild = False))
+    assert any("frameInfoDelta" in x["eventData"] for x in raw)
+    strip = lambda records: [(x["eventName"], x["eventData"]) for x in records]
+    assert strip(rebuild(raw)) == strip(readRecords(plain))
@@ -0,0 +1,52 @@
+import gzip
+import io
+
+import pytest
+
+from logformat import MsgpackFormat, TextFormat, convert, detectFormat, getFormat, readRecords
+
+RECORDS = [
+    {"eventNumber": "2", "eventName": "[Frame Execute Script]", "eventData": {"frameUID": "F1", "Script": {"url": "https://a.com/x - y.js", "contentHash": "h"}}, "timestamp": "2021-06-01T10:00:00.000001"},
+    {"eventNumber": "3", "eventName": "[Sub-Frame Created]", "eventData": {"frameUID": "F2", "frameInfo": {"title": "é   \"q\""}}, "timestamp": "2021-06-01T10:00:01.000002"},
+    {"eventNumber": "8", "eventName": "[Frame Info Update to]", "eventData": {"n": [1, 2.5, None, True]}, "timestamp": "2021-06-01T10:00:02.000003"}
+]
+
+def write(path, fmt, records = RECORDS, compress = False):
+    data = fmt.magic + b"".join(fmt.encode(x) for x in records)
+    with (gzip.open if compress else open)(path, "wb") as fd:
+        fd.write(data)
+    return str(path)
+
+@pytest.mark.parametrize("name", ["text", "msgpack"])
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, name, compress):
+    fmt = getFormat(name)
+    path = write(tmp_path / ("log" + fmt.suffix + (".gz" if compress else "")), fmt, compress = compress)
+    assert detectFormat(path) == name
+    assert list(readRecords(path)) == RECORDS
+
+def test_legacy_text_lines():
+    fmt = TextFormat(strict = False)
+    records = [fmt.decode(fmt.encode(x)) for x in RECORDS]
+    assert records == RECORDS
+    assert TextFormat.decode(b"==== appended ====\n") is None
+
+def test_msgpack_skips_magics_and_truncated_records():
+    fmt = MsgpackFormat()
+    data = fmt.magic + fmt.encode(RECORDS[0]) + fmt.magic + fmt.encode(RECORDS[1]) + fmt.encode(RECORDS[2])[:-3]
+    assert list(fmt.iterate(io.BytesIO(data))) == RECORDS[:2]
+
+def test_scan_offsets():
+    fmt = MsgpackFormat()
+    data = fmt.magic + b"".join(fmt.encode(x) for x in RECORDS)
+    scanned = list(fmt.scan(io.BytesIO(data)))
+    assert [x[2] for x in scanned] == RECORDS
+    for offset, size, record in scanned:
+        assert data[offset:offset + size] == fmt.encode(record)
+
+@pytest.mark.parametrize("to", ["text", "msgpack"])
+def test_convert(tmp_path, to):
+    src = write(tmp_path / "src.log", TextFormat())
+    dst = str(tmp_path / ("dst" + getFormat(to).suffix))
+    assert convert(src, dst, to) == len(RECORDS)
+    assert list(readRecords(dst)) == RECORDS
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from logindex import indexPath, lookup
+from logreader import readLog
+from synthetic import writeCapture
+
+FORMATS = {
+    "text": {},
+    "msgpack": {"format_": "msgpack"},
+    "block": {"writer_options": {"block_records": 64}}
+}
+
+def content(records):
+    """Records without their timestamps, which differ between captures"""
+    return [(r.get("eventName"), r.get("eventData")) for r in records]
+
+@pytest.fixture(scope = "module", params = list(FORMATS))
+def logs(request, tmp_path_factory):
+    """(plain log, delta encoded and indexed log) of the same capture"""
+    [plain] = writeCapture(str(tmp_path_factory.mktemp("plain")), 3000, **FORMATS[request.param])
+    [delta] = writeCapture(
+        str(tmp_path_factory.mktemp("delta")), 3000,
+        delta_options = {"enable": True, "keyframe_interval": 8},
+        index_options = {"enable": True, "segment_records": 100},
+        **FORMATS[request.param]
+    )
+    return plain, delta
+
+def queries(path):
+    records = list(readLog(path))
+    frames = [r["eventData"]["frameUID"] for r in records if r["eventName"] == "[Frame Attach to Frame]"]
+    return [
+        {},
+        {"event": "[Frame Info Update to]"},
+        {"event": "[Frame Navigate by User]"},
+        {"start": records[1000]["timestamp"], "end": records[1500]["timestamp"]}
+    ] + [{"frame": x} for x in frames[:5]]
+
+def test_lookup_rebuilds_frame_info(logs):
+    plain, delta = logs
+    assert os.path.exists(indexPath(delta))
+    for query in queries(delta):
+        found = list(lookup(delta, **query))
+        assert found
+        assert not any("frameInfoDelta" in r["eventData"] for r in found)
+        if "start" not in query:
+            assert content(found) == content(lookup(plain, **query))
+
+def test_lookup_with_and_without_index_agree(logs):
+    _, delta = logs
+    selected = queries(delta)
+    indexed = [list(lookup(delta, **x)) for x in selected]
+    os.rename(indexPath(delta), indexPath(delta) + ".off")
+    try:
+        scanned = [list(lookup(delta, **x)) for x in selected]
+    finally:
+        os.rename(indexPath(delta) + ".off", indexPath(delta))
+    assert scanned == indexed
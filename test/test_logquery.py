@@ -0,0 +1,51 @@
+import pytest
+
+from logquery import Query, search
+from logreader import readLog
+from synthetic import writeCapture
+
+LAYOUTS = {
+    "plain": {},
+    "index": {"index_options": {"enable": True, "segment_records": 200}},
+    "sqlite": {"sqlite_options": {"enable": True}},
+    "split": {"split_options": {"enable": True}, "index_options": {"enable": True, "segment_records": 200}},
+    "delta": {"delta_options": {"enable": True, "keyframe_interval": 8}, "index_options": {"enable": True, "segment_records": 200}}
+}
+
+@pytest.fixture(scope = "module", params = list(LAYOUTS))
+def capture(request, tmp_path_factory):
+    logdir = tmp_path_factory.mktemp(request.param)
+    writeCapture(str(logdir), 4000, **LAYOUTS[request.param])
+    return str(logdir)
+
+def queries(logdir):
+    records = list(search([logdir], Query(), use_indexes = False))
+    frames = [r["eventData"]["frameUID"] for r in records if r["eventName"] == "[Frame Attach to Frame]"]
+    origins = [r["eventData"]["frameOriginUID"] for r in records if r["eventName"] == "[Frame Info Update to]"]
+    children = [r["eventData"]["childScript"]["domainHash"].split("/")[1] for r in records if r["eventName"] == "[Script Initiate Remote Script]"]
+    return [
+        Query(event = "[Frame Execute Script]", domain = "d3.com"),
+        Query(content_hash = "h17"),
+        Query(content_hash = children[0]),
+        Query(domain = "d5.com"),
+        Query(domain = "D7.COM", event = "[Frame Info Update to]"),
+        Query(event = "[Sub-Frame Created]"),
+        Query(frame = frames[3]),
+        Query(frame = origins[5]),
+        Query(since = records[1000]["timestamp"], until = records[2000]["timestamp"][:22]),
+        Query(frame = frames[-1], since = records[500]["timestamp"])
+    ]
+
+def test_indexed_search_matches_scan(capture):
+    for query in queries(capture):
+        scanned = list(search([capture], query, use_indexes = False))
+        assert scanned
+        assert list(search([capture], query)) == scanned
+        assert list(search([capture], query, jobs = 3, chunk_size = 1 << 16)) == scanned
+
+def test_scan_matches_brute_force(capture):
+    records = list(search([capture], Query(), use_indexes = False))
+    assert len(records) == 4001
+    assert not any("frameInfoDelta" in r["eventData"] for r in records)
+    for query in queries(capture):
+        assert list(search([capture], query, use_indexes = False)) == [r for r in records if query.matches(r)]
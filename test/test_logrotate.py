@@ -0,0 +1,75 @@
+import gzip
+import os
+from datetime import date, datetime
+
+import pytest
+
+from logrotate import LogRotator
+from synthetic import writeCapture
+
+DAY = date(2021, 6, 1)
+
+def touch(path, content = b"x\n", mtime = None):
+    with open(path, "wb") as fd:
+        fd.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+def test_due_by_day_and_size():
+    rotator = LogRotator(max_bytes = 100)
+    assert not rotator.due(DAY, datetime(2021, 6, 1, 23, 59), 99)
+    assert rotator.due(DAY, datetime(2021, 6, 1, 23, 59), 100)
+    assert rotator.due(DAY, datetime(2021, 6, 2), 0)
+    assert not LogRotator(daily = False).due(DAY, datetime(2021, 6, 2), 1 << 30)
+
+def test_next_path_skips_taken_files(tmp_path):
+    rotator = LogRotator()
+    touch(tmp_path / "u-t-2021-06-01.log")
+    touch(tmp_path / "u-t-2021-06-01.1.log.gz")
+    assert rotator.nextPath(str(tmp_path), "u-t", ".log", DAY) == str(tmp_path / "u-t-2021-06-01.2.log")
+    # Indexes only move forward
+    assert rotator.nextPath(str(tmp_path), "u-t", ".log", DAY) == str(tmp_path / "u-t-2021-06-01.3.log")
+
+def test_resume_path(tmp_path):
+    touch(tmp_path / "u-t-2021-06-01.log.gz")
+    touch(tmp_path / "u-t-2021-06-01.1.log", b"x" * 10)
+    assert LogRotator(max_bytes = 100).resumePath(str(tmp_path), "u-t", ".log", DAY) == str(tmp_path / "u-t-2021-06-01.1.log")
+    assert LogRotator(max_bytes = 10).resumePath(str(tmp_path), "u-t", ".log", DAY) == str(tmp_path / "u-t-2021-06-01.2.log")
+
+def test_retire_compresses(tmp_path):
+    rotator = LogRotator()
+    path = touch(tmp_path / "u-t-2021-06-01.log", b"record\n" * 100)
+    rotator.retire(path)
+    rotator.shutDown()
+    assert not os.path.exists(path)
+    with gzip.open(path + ".gz") as fd:
+        assert fd.read() == b"record\n" * 100
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_retention_keeps_the_newest_files(tmp_path, compress):
+    rotator = LogRotator(compress = compress, max_files = 2)
+    suffix = ".log.gz" if compress else ".log"
+    old = [touch(tmp_path / f"u-t-2021-06-0{i}{suffix}", mtime = 1600000000 + i) for i in range(1, 5)]
+    current = touch(tmp_path / "u-t-2021-06-05.log")
+    rotator.active.add(current)
+    rotator.retireLeftovers(current)
+    rotator.shutDown()
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(x) for x in old[2:] + [current])
+
+def test_retention_by_total_bytes(tmp_path):
+    rotator = LogRotator(max_total_bytes = 250)
+    for i in range(1, 5):
+        touch(tmp_path / f"u-t-2021-06-0{i}.log", os.urandom(100), mtime = 1600000000 + i)
+    current = touch(tmp_path / "u-t-2021-06-05.log")
+    rotator.active.add(current)
+    assert rotator.retireLeftovers(current) == 4
+    rotator.shutDown()
+    kept = [x for x in os.listdir(tmp_path) if x.endswith(".gz")]
+    assert 0 < len(kept) < 4
+    assert sum(os.path.getsize(tmp_path / x) for x in kept) <= 250
+
+def test_logger_rotates_by_size(tmp_path):
+    paths = writeCapture(str(tmp_path), 2000, rotate_options = {"compress": False, "max_bytes": 1 << 16})
+    assert len(paths) > 2
+    assert all(os.path.getsize(x) < (1 << 16) + 4096 for x in paths)
@@ -0,0 +1,27 @@
+import pytest
+
+from logformat import readRecords
+from logstream import OTHER, FamilyRouter, captureFiles, mergeRecords, readStream
+from synthetic import writeCapture
+
+def test_events_are_routed_to_their_family():
+    router = FamilyRouter()
+    assert router.family("[Frame Navigate by User]") == "navigation"
+    assert router.family("[Frame Execute Script]") == "script"
+    assert router.family("[Events Dropped]") == OTHER
+    assert router.family("[Script Call Script]") == "script"
+
+# Events of the Network handlers
+@pytest.mark.parametrize("event", ["[Frame Request to Host]", "[Host Redirect to Host]", "[Script Request to Host]", "[Script Initiate Remote Script]"])
+def test_network_events_go_to_the_network_stream(event):
+    assert FamilyRouter().family(event) == "network"
+
+def test_split_streams_merge_back_in_writing_order(tmp_path):
+    [single] = writeCapture(str(tmp_path / "single"), 2000)
+    split = writeCapture(str(tmp_path / "split"), 2000, split_options = {"enable": True})
+    assert len(split) > 3
+    [streams] = captureFiles([str(tmp_path / "split")]).values()
+    merged = list(mergeRecords(readStream(x) for x in streams.values()))
+    assert [x["seq"] for x in merged] == list(range(1, len(merged) + 1))
+    strip = lambda records: [(x["eventName"], x["eventData"]) for x in records]
+    assert strip(merged) == strip(readRecords(single))
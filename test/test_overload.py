@@ -0,0 +1,63 @@
+import pytest
+
+from overload import DROP_NETWORK, SAMPLE_SCRIPT, SKIP_STACKTRACE, LoadShedder
+
+def load(shedder, pending):
+    """Admit messages until `pending` are unfinished"""
+    while shedder.pending < pending:
+        assert shedder.admit({"method": "Page.frameNavigated"})
+
+def test_levels_rise_with_pending():
+    shedder = LoadShedder(steps = [{"pending": 10}, {"pending": 20}, {"pending": 30}])
+    for pending, level in ((9, 0), (11, SAMPLE_SCRIPT), (21, SKIP_STACKTRACE), (31, DROP_NETWORK)):
+        load(shedder, pending)
+        shedder.admit({"id": 1})
+        assert shedder.level == level
+
+def test_levels_follow_latency():
+    shedder = LoadShedder(steps = [{"latency_ms": 50}], smoothing = 1)
+    shedder.done(0.1)
+    shedder.admit({"id": 1})
+    assert shedder.level == SAMPLE_SCRIPT
+    shedder.done(0.01)
+    shedder.admit({"id": 1})
+    assert shedder.level == 0
+
+def test_steps_down_one_level_well_below_limits():
+    shedder = LoadShedder(steps = [{"pending": 10}, {"pending": 20}])
+    load(shedder, 25)
+    shedder.admit({"id": 1})
+    assert shedder.level == SKIP_STACKTRACE
+    for _ in range(shedder.pending - 15):
+        shedder.done(0)
+    shedder.admit({"id": 1})
+    # Below the second limit, not yet below half of it
+    assert shedder.level == SKIP_STACKTRACE
+    for _ in range(shedder.pending - 5):
+        shedder.done(0)
+    shedder.admit({"id": 1})
+    assert shedder.level == SAMPLE_SCRIPT
+    for _ in range(shedder.pending):
+        shedder.done(0)
+    shedder.admit({"id": 1})
+    assert shedder.level == 0
+
+def test_shedding_is_counted():
+    shedder = LoadShedder(steps = [{"pending": 1}, {"pending": 2}, {"pending": 3}], sample_rate = 4)
+    load(shedder, 3)
+    assert not shedder.admit({"method": "Network.requestWillBeSent"})
+    assert shedder.admit({"id": 7})
+    kept = sum(shedder.keepEvent("[Frame Execute Script]") for _ in range(8))
+    assert kept == 2
+    assert shedder.keepEvent("[Frame Navigate by User]")
+    assert shedder.skipStackTrace()
+    summary = shedder.summary()
+    assert summary["peakLevel"] == DROP_NETWORK
+    assert summary["dropped"] == {"Network.requestWillBeSent": 1, "[Frame Execute Script]": 6, "[Script Call Script]": 1}
+    assert shedder.summary()["dropped"] == {}
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        LoadShedder(steps = [{"pending": 1}] * 4)
+    with pytest.raises(ValueError):
+        LoadShedder(sample_rate = 0)
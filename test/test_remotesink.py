@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import TestServer
+
+from ingeststub import IngestStub
+from remotesink import RemoteSink
+from spool import DiskSpool
+
+def lines(start, stop):
+    return [json.dumps({"eventName": "[Frame Execute Script]", "eventData": {"n": i}}) for i in range(start, stop)]
+
+def test_failed_posts_are_not_counted_as_shipped():
+    async def run():
+        stub = IngestStub(down = True)
+        async with TestServer(stub.app()) as server:
+            sink = RemoteSink(str(server.make_url("/")), batch_records = 10, compress = False)
+            for line in lines(0, 50):
+                sink.offer(line)
+            await sink.flush()
+            down = sink.stats()
+            stub.down = False
+            for line in lines(50, 100):
+                sink.offer(line)
+            await sink.shutDown()
+        return down, sink.stats(), stub.stats
+
+    down, shipped, received = asyncio.run(run())
+    assert down["failures"] == 5 and down["dropped"] == 50
+    assert down["wireBytes"] == down["bytes"] == 0
+    assert shipped["shipped"] == received["records"] == 50
+    assert shipped["wireBytes"] == shipped["bytes"] == received["bytes"]
+    assert not shipped["inflight"]
+
+def test_outage_is_replayed_from_the_spool(tmp_path):
+    async def run():
+        stub = IngestStub(down = True)
+        async with TestServer(stub.app()) as server:
+            sink = RemoteSink(
+                str(server.make_url("/")), batch_records = 10, max_age_ms = 10,
+                spool = DiskSpool(str(tmp_path)), drain_rate = 100000, retry_ms = 10
+            )
+            for line in lines(0, 100):
+                sink.offer(line)
+            await sink.flush()
+            stub.down = False
+            for _ in range(500):
+                if sink.stats()["drained"] >= 100:
+                    break
+                await asyncio.sleep(0.01)
+            for line in lines(100, 120):
+                sink.offer(line)
+            await sink.shutDown()
+        return sink.stats(), stub.stats
+
+    shipped, received = asyncio.run(run())
+    assert shipped["spooled"] >= 100
+    assert shipped["dropped"] == 0
+    # Batches still spooled at shutdown are left for the next run
+    spool = DiskSpool(str(tmp_path))
+    left = len(spool.read(1000)[0])
+    assert received["records"] >= 100
+    assert received["records"] + left == 120
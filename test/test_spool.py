@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from spool import DiskSpool
+
+def lines(start, stop):
+    return [b'{"n": %d}\n' % i for i in range(start, stop)]
+
+def drain(spool, batch = 7):
+    read = []
+    while (batch_lines := (spool.read(batch)))[0]:
+        read.extend(batch_lines[0])
+        spool.commit(batch_lines[1])
+    return read
+
+def test_append_read_commit(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes = 64, max_bytes = 1 << 20)
+    assert spool.empty
+    spool.append(lines(0, 50))
+    spool.append(lines(50, 100))
+    assert not spool.empty and len(spool.segments) > 1
+    # Reading does not move the position
+    assert spool.read(10)[0] == spool.read(10)[0] == lines(0, 10)
+    assert drain(spool) == lines(0, 100)
+    assert spool.empty
+    # Segments entirely read are deleted
+    assert len(spool.segments) == 1
+
+def test_position_survives_restart(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes = 64)
+    spool.append(lines(0, 30))
+    read, position = spool.read(12)
+    spool.commit(position)
+    spool.close()
+    spool = DiskSpool(str(tmp_path), segment_bytes = 64)
+    assert not spool.empty
+    assert drain(spool) == lines(12, 30)
+
+def test_cap_drops_the_oldest_segment(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes = 100, max_bytes = 300)
+    for i in range(0, 100, 5):
+        spool.append(lines(i, i + 5))
+    assert spool.size <= 300
+    assert spool.dropped > 0
+    read = drain(spool)
+    assert spool.dropped + len(read) == 100
+    # What is left is the newest records, in order
+    assert read == lines(100 - len(read), 100)
+
+def test_commit_after_a_drop_is_ignored(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes = 100, max_bytes = 300)
+    spool.append(lines(0, 10))
+    _, position = spool.read(3)
+    for i in range(10, 100, 5):
+        spool.append(lines(i, i + 5))
+    spool.commit(position)
+    assert spool.position >= (spool.segments[0], 0)
+    assert drain(spool)[-1] == lines(99, 100)[0]
+
+def test_invalid_options(tmp_path):
+    with pytest.raises(ValueError):
+        DiskSpool(str(tmp_path), segment_bytes = 100, max_bytes = 10)
+    with pytest.raises(TypeError):
+        DiskSpool(os.fsencode(str(tmp_path)))
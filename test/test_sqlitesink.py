@@ -0,0 +1,36 @@
+import sqlite3
+
+import pytest
+
+from sqlitesink import SqliteSink
+
+def record(n, **fields):
+    return dict({"eventNumber": "2", "eventName": "[Frame Execute Script]", "timestamp": f"2021-06-01T10:00:{n % 60:02d}", "eventData": {"frameUID": f"F{n}"}}, **fields)
+
+def test_rows_are_inserted_and_indexed(tmp_path):
+    sink = SqliteSink(str(tmp_path / "c.sqlite"), batch_records = 16)
+    for n in range(100):
+        sink.offer(record(n), '{"frameUID": "F%d"}' % n)
+    sink.stop()
+    assert sink.stats()["rows"] == 100
+    conn = sqlite3.connect(str(tmp_path / "c.sqlite"))
+    assert conn.execute("SELECT count(*) FROM events WHERE frame_uid = 'F7'").fetchone() == (1, )
+
+def test_writer_survives_failing_batches(tmp_path):
+    sink = SqliteSink(str(tmp_path / "c.sqlite"), queue_size = 8, batch_records = 4)
+    # Integers beyond 64 bits raise OverflowError, not an sqlite3.Error
+    for n in range(4):
+        sink.offer(record(n, seq = 1 << 70), "{}")
+    # The queue is drained further, so offering more rows than it holds does not block
+    for n in range(64):
+        sink.offer(record(n), "{}")
+    sink.stop()
+    stats = sink.stats()
+    assert stats["errors"] == 4
+    assert stats["rows"] == 64
+
+def test_bad_database_raises(tmp_path):
+    path = tmp_path / "bad.sqlite"
+    path.write_bytes(b"not a database" * 128)
+    with pytest.raises(sqlite3.DatabaseError):
+        SqliteSink(str(path))
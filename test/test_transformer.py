@@ -0,0 +1,24 @@
+import pytest
+
+from graphwriters import WRITERS, getWriter
+from synthetic import writeCapture
+from transformer import transform
+
+@pytest.fixture(scope = "module")
+def logdir(tmp_path_factory):
+    logdir = tmp_path_factory.mktemp("captures")
+    writeCapture(str(logdir), 1500, seed = 1, tag = "a", rotate_options = {"compress": False, "max_bytes": 1 << 15})
+    writeCapture(str(logdir), 1500, seed = 2, tag = "b")
+    writeCapture(str(logdir), 1500, seed = 3, tag = "c", split_options = {"enable": True})
+    return str(logdir)
+
+@pytest.mark.parametrize("name", list(WRITERS))
+def test_jobs_do_not_change_the_graph(logdir, tmp_path, name):
+    outputs = []
+    for jobs in (1, 3):
+        out = tmp_path / str(jobs)
+        out.mkdir()
+        transform([logdir], getWriter(str(out / f"graph{WRITERS[name].suffix}"), name), jobs = jobs)
+        outputs.append({x.name: x.read_bytes() for x in sorted(out.iterdir())})
+    assert outputs[0] and all(outputs[0].values())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,226 @@
+"""Structural diff of the provenance graphs of two captures.
+
+    python visualization/graphdiff.py <baseline log or directory> <log or directory> [--json]
+
+Frame UIDs are random, so both graphs are first canonicalized into trees of labels:
+    frame:    `frame <main|sub> <host>`, under the frame that created or attached it. The UIDs
+              of a frame are collapsed as in `graphsummary`.
+    script:   `script <domain> <contentHash>`, under the frames executing it, with the scripts
+              it initiates
+    navigate: `navigate <reason> from <host of the origin frame>`, under the navigated frame
+    target:   `target <type> <host>`, the targets of the `[... Target ...]` records
+Each subtree is hashed from its label and the hashes of its children. The children of two
+matching nodes are paired by hash first, and identical subtrees are skipped; the others are
+paired by label and compared in turn, or reported as added or removed. The exit status is 1
+when the captures differ, as for `diff`.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from transformer import GraphBuilder, expandLogs, records
+from graphwriters import Edge, Node
+from graphsummary import GraphSummary, frameHost, refold
+
+TARGET_CREATED = "[New Target Created]"
+TARGET_UPDATE = "[Target Update to]"
+# Edges from a parent frame to a child frame, or from a child to its parent
+CHILD_EDGES = ("[Main Frame Created]", "[Sub-Frame Created]")
+PARENT_EDGES = ("[Frame Attach to Frame]", )
+
+class Tree(object):
+    __slots__ = ("label", "children", "digest", "size")
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.children: List["Tree"] = []
+        self.digest: bytes = b""
+        self.size: int = 1
+        return None
+
+def seal(root: Tree) -> Tree:
+    """Hash the subtrees of `root`, children before parents"""
+    stack: List[Tuple[Tree, bool]] = [(root, False)]
+    while stack:
+        tree, done = stack.pop()
+        if not done:
+            stack.append((tree, True))
+            stack.extend((x, False) for x in tree.children)
+            continue
+        digest = hashlib.blake2b(tree.label.encode("utf-8"), digest_size = 16)
+        for x in sorted(x.digest for x in tree.children):
+            digest.update(x)
+        tree.digest = digest.digest()
+        tree.size = 1 + sum(x.size for x in tree.children)
+    return root
+
+class _Graph(object):
+    """Writer keeping the graph in memory"""
+
+    def __init__(self) -> None:
+        self.summary = GraphSummary()
+        self.nodes: List[Node] = []
+        return None
+
+    def edge(self, edge: Edge) -> None:
+        self.summary.add(edge)
+        return None
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        self.nodes = list(nodes)
+        return None
+
+def _host(host: Optional[str]) -> str:
+    return host.rsplit("@", 1)[-1].split(":", 1)[0].lower() if host else "?"
+
+def frameLabel(node: Optional[Node]) -> str:
+    if node is None:
+        return "frame ? ?"
+    main = "main" if (node.get("properties") or {}).get("mainFrame") else "sub"
+    return f"frame {main} {_host(frameHost(node))}"
+
+def scriptLabel(node: Optional[Node], id_: Union[str, int]) -> str:
+    properties = (node or {}).get("properties") or {}
+    if id_ == "Null/Null":
+        return "script Null"
+    return f"script {properties.get('domain') or '?'} {properties.get('contentHash') or id_}"
+
+def canonicalize(paths: Iterable[str]) -> Tree:
+    """Canonical tree of the captures of the log files"""
+    graph = _Graph()
+    builder = GraphBuilder(graph)
+    # Target id: (type, url)
+    targets: Dict[str, Tuple[str, str]] = {}
+    for record in records(paths):
+        name, data = record.get("eventName"), record.get("eventData")
+        if name in (TARGET_CREATED, TARGET_UPDATE) and isinstance(data, dict):
+            info = data.get("targetInfo", data) if name == TARGET_UPDATE else data
+            type_, url = targets.get(data.get("targetId"), ("?", ""))
+            targets[data.get("targetId")] = (info.get("type") or type_, info.get("url") or url)
+            continue
+        builder.feed(record)
+    builder.close()
+
+    nodes, mapping = graph.summary.collapse(graph.nodes)
+    nodes = {x.get("id"): x for x in nodes}
+    edges = refold(graph.summary.edges.values(), mapping).values()
+
+    frames: Dict[Union[str, int], Tree] = {}
+    parents: Dict[Union[str, int], Union[str, int]] = {}
+    scripts: Dict[Union[str, int], str] = {}
+    initiated: Dict[Union[str, int], List[str]] = defaultdict(list)
+
+    def frame(id_: Union[str, int]) -> Tree:
+        if id_ not in frames:
+            frames[id_] = Tree(frameLabel(nodes.get(id_)))
+        return frames[id_]
+
+    def script(id_: Union[str, int]) -> str:
+        if id_ not in scripts:
+            scripts[id_] = scriptLabel(nodes.get(id_), id_)
+        return scripts[id_]
+
+    def adopt(parent: Union[str, int], child: Union[str, int]) -> None:
+        # The first parent is kept, and cycles are broken
+        if child in parents or parent == child:
+            return None
+        ancestor = parent
+        while ancestor in parents:
+            if (ancestor := (parents[ancestor])) == child:
+                return None
+        parents[child] = parent
+        return None
+
+    for node in nodes.values():
+        if node.get("_node_class") == "Frame":
+            frame(node.get("id"))
+    executed: List[Tuple[Union[str, int], Union[str, int]]] = []
+    for edge in edges:
+        type_, source, target = edge.get("type"), edge.get("source"), edge.get("target")
+        if type_ in CHILD_EDGES:
+            adopt(source, target)
+        elif type_ in PARENT_EDGES:
+            adopt(target, source)
+        elif type_ == "[Frame Execute Script]":
+            executed.append((source, target))
+        elif type_ == "[Script Initiate Remote Script]":
+            initiated[source].append(script(target))
+        elif type_ == "[Script Create Sub-Frame]":
+            frame(target).children.append(Tree(f"created by {script(source)}"))
+        elif type_.startswith("[Frame Navigate by "):
+            reason = type_[len("[Frame Navigate by "):-1]
+            frame(target).children.append(Tree(f"navigate {reason} from {frameLabel(nodes.get(source)).split(' ', 2)[2]}"))
+    for source, target in executed:
+        tree = Tree(script(target))
+        tree.children.extend(Tree(f"initiates {x}") for x in initiated.get(target, []))
+        frame(source).children.append(tree)
+
+    for id_ in list(parents.values()):
+        frame(id_)
+    root = Tree("capture")
+    for id_, tree in list(frames.items()):
+        (frame(parents[id_]) if id_ in parents else root).children.append(tree)
+    for type_, url in targets.values():
+        root.children.append(Tree(f"target {type_} {_host(url.split('//', 1)[1].split('/', 1)[0] if '//' in url else '')}"))
+    return seal(root)
+
+def diff(base: Tree, other: Tree, path: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """Changes from `base` to `other`, and the number of identical subtrees skipped"""
+    changes: List[Dict[str, Any]] = []
+    skipped = 0
+    stack: List[Tuple[Tree, Tree, List[str]]] = [(base, other, path or [])]
+    while stack:
+        a, b, path = stack.pop()
+        by_digest: Dict[bytes, List[Tree]] = defaultdict(list)
+        for x in a.children:
+            by_digest[x.digest].append(x)
+        added: List[Tree] = []
+        for x in b.children:
+            if by_digest.get(x.digest):
+                by_digest[x.digest].pop()
+                skipped += 1
+            else:
+                added.append(x)
+        by_label: Dict[str, List[Tree]] = defaultdict(list)
+        for same in by_digest.values():
+            for x in same:
+                by_label[x.label].append(x)
+        for x in added:
+            if by_label.get(x.label):
+                stack.append((by_label[x.label].pop(0), x, path + [x.label]))
+            else:
+                changes.append({"change": "added", "kind": x.label.split(" ", 1)[0], "key": x.label, "path": path, "nodes": x.size})
+        for same in by_label.values():
+            for x in same:
+                changes.append({"change": "removed", "kind": x.label.split(" ", 1)[0], "key": x.label, "path": path, "nodes": x.size})
+    return changes, skipped
+
+def main():
+    parser = argparse.ArgumentParser(description = "Structural diff of the provenance graphs of two captures")
+    parser.add_argument("base", type = str, help = "Baseline log file, or directory of log files")
+    parser.add_argument("other", type = str, help = "Log file, or directory of log files, compared to the baseline")
+    parser.add_argument("--json", action = "store_true", help = "Print the changes as json lines")
+    args = parser.parse_args()
+
+    trees = []
+    for path in (args.base, args.other):
+        if not os.path.exists(path):
+            parser.error(f"log file not found: {path}")
+        trees.append(canonicalize(expandLogs([path])))
+    changes, skipped = diff(*trees)
+    for change in changes:
+        if args.json:
+            print(json.dumps(change))
+        else:
+            print(f"{'+' if change['change'] == 'added' else '-'} {' > '.join(change['path'] + [change['key']])} ({change['nodes']} nodes)")
+    if not args.json:
+        print(f"[+ {sum(x['change'] == 'added' for x in changes)} added, {sum(x['change'] == 'removed' for x in changes)} removed, {skipped} identical subtrees]")
+    sys.exit(1 if changes else 0)
+
+if __name__ == "__main__":
+    main()
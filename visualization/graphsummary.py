@@ -0,0 +1,262 @@
+"""Summaries of the provenance graph, for graphs too large to be rendered. Each level of detail
+is built on the previous one:
+
+    0: the graph as built by the transformer
+    1: frames collapsed along their `[Frame Info Update to]` chains into one node, holding the
+       UIDs of the frame as a `timeline`. Repeated edges are folded into one edge, with the
+       number of edges as `weight` and the first and last timestamps.
+    2: third-party frames, of another registrable domain than the main frames, grouped by domain
+    3: scripts grouped by registrable domain
+
+Levels are written next to the graph as `<out>.lod<level>.<suffix>`, and listed with their
+files and sizes in `<out>.levels.json`, so that a viewer can load the level it can render.
+"""
+import os
+import json
+from urllib.parse import urlparse
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from graphwriters import Edge, Node, Writer, getWriter
+
+UPDATE = "[Frame Info Update to]"
+LEVELS = 3
+# Second-level labels under which a country code TLD registers domains, e.g. `udn.com.tw`,
+# an approximation of the public suffix list
+SECOND_LEVELS = {"ac", "co", "com", "edu", "gob", "go", "gov", "idv", "mil", "ne", "net", "or", "org"}
+
+NodeId = Union[str, int]
+EdgeKey = Tuple[NodeId, NodeId, str]
+
+def registrableDomain(host: Optional[str]) -> Optional[str]:
+    """`udn.com` of `www.udn.com:443`, `udn.com.tw` of `video.udn.com.tw`"""
+    if not host:
+        return None
+    host = host.rsplit("@", 1)[-1].lower()
+    if host.startswith("["):
+        return host[:host.find("]") + 1]
+    host = host.split(":", 1)[0].strip(".")
+    labels = host.split(".")
+    if len(labels) <= 2 or labels[-1].isdigit():
+        return host or None
+    if len(labels[-1]) == 2 and labels[-2] in SECOND_LEVELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def frameHost(node: Node) -> Optional[str]:
+    url = (node.get("properties") or {}).get("url")
+    if isinstance(url, dict):
+        return url.get("netloc")
+    if isinstance(url, str) and "//" in url:
+        return urlparse(url).netloc
+    return None
+
+def _time(value: Optional[str], other: Optional[str], pick: Callable[..., str]) -> Optional[str]:
+    if value is None or other is None:
+        return value if other is None else other
+    return pick(value, other)
+
+def fold(folded: Dict[EdgeKey, Edge], edge: Edge, source: NodeId, target: NodeId) -> None:
+    """Fold `edge`, as an edge from `source` to `target`, into the edge of the same type"""
+    properties = edge.get("properties") or {}
+    first = properties.get("timestamp")
+    last = properties.get("lastTimestamp", first)
+    weight = properties.get("weight", 1)
+    key = (source, target, edge.get("type"))
+    current = folded.get(key)
+    if current is None:
+        folded[key] = {
+            "id": len(folded) + 1,
+            "type": edge.get("type"),
+            "properties": {"timestamp": first, "lastTimestamp": last, "weight": weight},
+            "source": source,
+            "target": target,
+            "_display": edge.get("type")
+        }
+        return None
+    current = current["properties"]
+    current["timestamp"] = _time(current["timestamp"], first, min)
+    current["lastTimestamp"] = _time(current["lastTimestamp"], last, max)
+    current["weight"] += weight
+    return None
+
+def refold(edges: Iterable[Edge], mapping: Dict[NodeId, NodeId]) -> Dict[EdgeKey, Edge]:
+    """Edges with the ends of `mapping` replaced, and folded. Edges that become loops once
+    their ends are replaced are dropped.
+    """
+    folded: Dict[EdgeKey, Edge] = {}
+    for edge in edges:
+        source, target = edge.get("source"), edge.get("target")
+        mapped_source, mapped_target = mapping.get(source, source), mapping.get(target, target)
+        if mapped_source == mapped_target and source != target:
+            continue
+        fold(folded, edge, mapped_source, mapped_target)
+    return folded
+
+def group(
+    nodes: Iterable[Node],
+    key: Callable[[Node], Optional[str]],
+    node_type: str,
+    color: str
+) -> Tuple[List[Node], Dict[NodeId, NodeId]]:
+    """Replace the nodes of the same `key` by one node `<node_type>/<key>`, in place of the
+    first of them. Returns the nodes and the mapping of the grouped ids.
+    """
+    grouped: List[Node] = []
+    groups: Dict[str, Node] = {}
+    mapping: Dict[NodeId, NodeId] = {}
+    for node in nodes:
+        name = key(node)
+        if name is None:
+            grouped.append(node)
+            continue
+        if (current := (groups.get(name))) is None:
+            current = groups[name] = {
+                "id": f"{node_type}/{name}",
+                "properties": {"domain": name, "members": []},
+                "_display": name,
+                "_node_type": node_type,
+                "_node_class": node.get("_node_class"),
+                "_color": color
+            }
+            grouped.append(current)
+        current["properties"]["members"].append(node.get("id"))
+        mapping[node.get("id")] = current["id"]
+    for current in groups.values():
+        current["_display"] = f"{current['properties']['domain']} ({len(current['properties']['members'])})"
+    return grouped, mapping
+
+class GraphSummary(object):
+    """Summaries of a graph whose edges are added one by one. Only the edges folded by ends
+    and type are kept, with the `[Frame Info Update to]` edges that chain the frame UIDs.
+    """
+
+    def __init__(self) -> None:
+        self.edges: Dict[EdgeKey, Edge] = {}
+        self.count: int = 0
+        # New UID of a frame: (previous UID, timestamp of the update)
+        self.updates: Dict[NodeId, Tuple[NodeId, Optional[str]]] = {}
+        return None
+
+    def add(self, edge: Edge) -> None:
+        self.count += 1
+        if edge.get("type") == UPDATE:
+            self.updates[edge.get("target")] = (edge.get("source"), (edge.get("properties") or {}).get("timestamp"))
+        fold(self.edges, edge, edge.get("source"), edge.get("target"))
+        return None
+
+    def root(self, id_: NodeId, roots: Dict[NodeId, NodeId]) -> NodeId:
+        """First UID of the frame of UID `id_`"""
+        chain = []
+        while id_ in self.updates and id_ not in roots and id_ not in chain:
+            chain.append(id_)
+            id_ = self.updates[id_][0]
+        id_ = roots.get(id_, id_)
+        for x in chain:
+            roots[x] = id_
+        return id_
+
+    def collapse(self, nodes: Iterable[Node]) -> Tuple[List[Node], Dict[NodeId, NodeId]]:
+        """Level 1 nodes, and the mapping of each frame UID to the first UID of its frame"""
+        roots: Dict[NodeId, NodeId] = {}
+        chains: Dict[NodeId, List[Node]] = {}
+        order: List[Union[Node, NodeId]] = []
+        for node in nodes:
+            if node.get("_node_class") != "Frame":
+                order.append(node)
+                continue
+            root = self.root(node.get("id"), roots)
+            if root not in chains:
+                chains[root] = []
+                order.append(root)
+            chains[root].append(node)
+        for id_ in self.updates:
+            self.root(id_, roots)
+
+        collapsed: List[Node] = []
+        for item in order:
+            if isinstance(item, dict):
+                collapsed.append(item)
+                continue
+            chain = chains[item]
+            if len(chain) == 1 and chain[0].get("id") == item:
+                collapsed.append(chain[0])
+                continue
+            # The root first, then the UIDs in update order
+            chain.sort(key = lambda x: (x.get("id") != item, self.updates.get(x.get("id"), (None, None))[1] or ""))
+            last = chain[-1]
+            properties = dict(last.get("properties") or {})
+            properties["timeline"] = [
+                {"UID": x.get("id"), "timestamp": self.updates.get(x.get("id"), (None, None))[1], "display": x.get("_display")}
+                for x in chain
+            ]
+            collapsed.append(dict(last, id = item, properties = properties))
+        return collapsed, {k: v for k, v in roots.items() if k != v}
+
+    def levels(self, nodes: Iterable[Node], levels: int = LEVELS) -> List[Tuple[List[Node], List[Edge]]]:
+        """`(nodes, edges)` of the levels 1 to `levels`"""
+        graphs: List[Tuple[List[Node], List[Edge]]] = []
+        nodes, mapping = self.collapse(nodes)
+        edges = list(refold(self.edges.values(), mapping).values())
+        graphs.append((nodes, edges))
+        if levels >= 2:
+            first = {registrableDomain(frameHost(x)) for x in nodes if x.get("_node_class") == "Frame" and (x.get("properties") or {}).get("mainFrame")}
+            nodes, mapping = group(
+                nodes,
+                lambda x: (d if (d := (registrableDomain(frameHost(x)))) not in first else None) if x.get("_node_class") == "Frame" else None,
+                "Third-Party",
+                "#C7C7C7"
+            )
+            edges = list(refold(edges, mapping).values())
+            graphs.append((nodes, edges))
+        if levels >= 3:
+            nodes, mapping = group(
+                nodes,
+                lambda x: registrableDomain((x.get("properties") or {}).get("domain")) if x.get("_node_type") == "JavaScript" else None,
+                "Scripts",
+                "#FF7F0E"
+            )
+            edges = list(refold(edges, mapping).values())
+            graphs.append((nodes, edges))
+        for _, edges in graphs:
+            for i, edge in enumerate(edges, 1):
+                edge["id"] = i
+                if (weight := (edge["properties"]["weight"])) > 1:
+                    edge["_display"] = f"{edge['type']} x{weight}"
+        return graphs
+
+def levelPath(path: str, level: int) -> str:
+    base, suffix = os.path.splitext(path)
+    return f"{base}.lod{level}{suffix}"
+
+class SummaryWriter(object):
+    """Writer passing the graph to `writer`, and writing its levels of detail next to `path`
+    once complete.
+    """
+
+    def __init__(self, writer: Writer, path: str, levels: int = LEVELS) -> None:
+        self.writer = writer
+        self.name = writer.name
+        self.path = path
+        self.max_level = levels
+        self.summary = GraphSummary()
+        return None
+
+    def edge(self, edge: Edge) -> None:
+        self.writer.edge(edge)
+        self.summary.add(edge)
+        return None
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        nodes = list(nodes)
+        self.writer.close(nodes)
+        manifest = [{"level": 0, "paths": [os.path.basename(x) for x in self.writer.paths], "nodes": len(nodes), "edges": self.summary.count}]
+        for level, (level_nodes, edges) in enumerate(self.summary.levels(nodes, self.max_level), 1):
+            path = levelPath(self.path, level)
+            writer = getWriter(path, self.name)
+            for edge in edges:
+                writer.edge(edge)
+            writer.close(level_nodes)
+            manifest.append({"level": level, "paths": [os.path.basename(x) for x in writer.paths], "nodes": len(level_nodes), "edges": len(edges)})
+        with open(os.path.splitext(self.path)[0] + ".levels.json", "w", encoding = "utf-8") as fd:
+            json.dump({"levels": manifest}, fd, indent = 2)
+        return None
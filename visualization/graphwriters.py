@@ -0,0 +1,168 @@
+"""Streaming writers of the provenance graph. A writer gets each edge as soon as it is built,
+and the nodes once the graph is complete, so that no writer holds the edges in memory.
+
+    cytoscape: `{"directed": true, "multigraph": true, "edges": [{"data": <edge>}, ...], "nodes": [...]}`
+    graphml:   GraphML, node and edge fields as `<data>`, properties as a json string
+    csv:       `<out>.nodes.csv` and `<out>.edges.csv`, with the headers of `neo4j-admin import`
+"""
+import os
+import csv
+import json
+from xml.sax.saxutils import escape, quoteattr
+from typing import Any, Dict, Iterable, Optional, TypedDict, Union
+
+Node = TypedDict(
+    "Node",
+    {
+        "properties": Dict[str, Any],
+        "_node_type": str,
+        "_node_class": str,
+        "_display": str,
+        "_color": str,
+        "id": Union[str, int]
+    }
+)
+
+Edge = TypedDict(
+    "Edge",
+    {
+        "id": Union[str, int],
+        "type": str,
+        "properties": Dict[str, Any],
+        "source": Union[str, int],
+        "target": Union[str, int],
+        "_display": str,
+        "eid": Optional[int]
+    }
+)
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value)
+
+class CytoscapeWriter(object):
+    name = "cytoscape"
+    suffix = ".json"
+
+    def __init__(self, path: str) -> None:
+        self.paths = (path, )
+        self.fd = open(path, "w", encoding = "utf-8", buffering = 1 << 20)
+        self.fd.write('{"directed": true, "multigraph": true, "edges": [')
+        self._sep = ""
+        return None
+
+    def edge(self, edge: Edge) -> None:
+        self.fd.write(self._sep + json.dumps({"data": edge}))
+        self._sep = ", "
+        return None
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        self.fd.write('], "nodes": [')
+        self._sep = ""
+        for node in nodes:
+            self.fd.write(self._sep + json.dumps({"data": node}))
+            self._sep = ", "
+        self.fd.write("]}")
+        self.fd.close()
+        return None
+
+class GraphMLWriter(object):
+    name = "graphml"
+    suffix = ".graphml"
+    # (key id, for, field of the node or edge)
+    KEYS = (
+        ("display", "node", "_display"),
+        ("nodeType", "node", "_node_type"),
+        ("nodeClass", "node", "_node_class"),
+        ("color", "node", "_color"),
+        ("properties", "node", "properties"),
+        ("type", "edge", "type"),
+        ("display", "edge", "_display"),
+        ("properties", "edge", "properties")
+    )
+
+    def __init__(self, path: str) -> None:
+        self.paths = (path, )
+        self.fd = open(path, "w", encoding = "utf-8", buffering = 1 << 20)
+        self.fd.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.fd.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for key, for_, _ in self.KEYS:
+            self.fd.write(f'  <key id="{for_}-{key}" for="{for_}" attr.name="{key}" attr.type="string"/>\n')
+        self.fd.write('  <graph edgedefault="directed">\n')
+        return None
+
+    def _data(self, for_: str, item: Dict[str, Any]) -> str:
+        return "".join(
+            f'<data key="{for_}-{key}">{escape(_text(item.get(field)))}</data>'
+            for key, f, field in self.KEYS if f == for_ and item.get(field) is not None
+        )
+
+    def edge(self, edge: Edge) -> None:
+        self.fd.write(
+            f'    <edge id={quoteattr(str(edge.get("id")))} source={quoteattr(_text(edge.get("source")))} '
+            f'target={quoteattr(_text(edge.get("target")))}>{self._data("edge", edge)}</edge>\n'
+        )
+        return None
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        for node in nodes:
+            self.fd.write(f'    <node id={quoteattr(_text(node.get("id")))}>{self._data("node", node)}</node>\n')
+        self.fd.write("  </graph>\n</graphml>\n")
+        self.fd.close()
+        return None
+
+class CsvWriter(object):
+    name = "csv"
+    suffix = ".csv"
+    NODE_HEADER = ["id:ID", ":LABEL", "type", "display", "color", "properties"]
+    EDGE_HEADER = [":START_ID", ":END_ID", ":TYPE", "id", "timestamp", "properties"]
+
+    def __init__(self, path: str) -> None:
+        base = path[:-len(self.suffix)] if path.endswith(self.suffix) else path
+        self.paths = (base + ".nodes.csv", base + ".edges.csv")
+        self.edge_fd = open(self.paths[1], "w", encoding = "utf-8", newline = "", buffering = 1 << 20)
+        self.edges = csv.writer(self.edge_fd)
+        self.edges.writerow(self.EDGE_HEADER)
+        return None
+
+    def edge(self, edge: Edge) -> None:
+        properties = edge.get("properties") or {}
+        self.edges.writerow([
+            _text(edge.get("source")),
+            _text(edge.get("target")),
+            edge.get("type"),
+            edge.get("id"),
+            properties.get("timestamp"),
+            _text(properties)
+        ])
+        return None
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        self.edge_fd.close()
+        with open(self.paths[0], "w", encoding = "utf-8", newline = "", buffering = 1 << 20) as fd:
+            writer = csv.writer(fd)
+            writer.writerow(self.NODE_HEADER)
+            for node in nodes:
+                writer.writerow([
+                    _text(node.get("id")),
+                    node.get("_node_class"),
+                    node.get("_node_type"),
+                    _text(node.get("_display")),
+                    node.get("_color"),
+                    _text(node.get("properties"))
+                ])
+        return None
+
+Writer = Union[CytoscapeWriter, GraphMLWriter, CsvWriter]
+WRITERS = {x.name: x for x in (CytoscapeWriter, GraphMLWriter, CsvWriter)}
+
+def getWriter(path: str, name: Optional[str] = None) -> Writer:
+    """Writer of `name`, guessed from the suffix of `path` if not set"""
+    if not name:
+        name = next((x.name for x in WRITERS.values() if path.endswith(x.suffix)), CytoscapeWriter.name)
+    if name not in WRITERS:
+        raise ValueError(f"unknown graph format: {name}, should be one of {list(WRITERS.keys())}")
+    if os.path.dirname(path) and not os.path.isdir(os.path.dirname(path)):
+        raise NotADirectoryError(f"directory of {path} not found")
+    return WRITERS[name](path)
@@ -1,288 +1,468 @@
-import json
+"""Build the provenance graph of Chromo logs.
+
+    python visualization/transformer.py <log or directory> [...] -o <out> [--format cytoscape|graphml|csv]
+        [--since <iso timestamp>] [--until <iso timestamp>] [--events "Frame Execute Script,..."] [--jobs N]
+        [--levels N]
+    python visualization/transformer.py <log> --follow -o <deltas.ndjson> [--snapshot <out>] [--format ...]
+"""
 import os
-from typing import Any, Dict, TypedDict, Union, Optional, List, Tuple
-from dataclasses import dataclass
-
-IN_FILE = os.path.join(os.path.split(os.getcwd())[0], "logs", "lien-complete-facebook.04.27-1123.log")
-OUT_DIR = os.path.join(".", "output", "tst.json")
-Node = TypedDict(
-    "Node",
-    {
-        "properties": Dict[str, Any],
-        "_node_type": str,
-        "_node_class": str,
-        "_display": str,
-        "_color": str,
-        "id": Union[str, int]
-    }
-)
-
-Edge = TypedDict(
-    "Edge",
-    {
-        "id": Union[str, int],
-        "type": str,
-        "properties": Dict[str, Any],
-        "source": Union[str, int],
-        "target": Union[str, int],
-        "_display": str,
-        "eid": Optional[int]
-    }
-)
-
-assert os.path.exists(IN_FILE)
-
-nodeSet = set()
-nodes: List[TypedDict("node", {"data": Node})] = []
-edges: List[TypedDict("edge", {"data": Edge})] = []
-
-def frameCreated(timestamp: str, event_name: str, eventData: dict) -> None:
-    # [Main Frame Created]
-    # [Sub-Frame Created]
-    frameUID = eventData.get("frameUID")
-    assert type(frameUID) == str, f"eventData: {eventData}, newFrameUID: {frameUID}"
-
-    data = eventData.get("frameInfo")
-    node = {
-        "id": frameUID,
-        "properties": data,
-        "_display": data.get("title") if data.get("title") else data.get("url", {}).get("netloc"),
-        "_node_type": "Main-Frame" if data.get("mainFrame") else "Sub-Frame",
-        "_node_class": "Frame",
-        "_color": "#1F77B4" if data.get("mainFrame") else "#AEC7E8"
-    }
-    if not frameUID in nodeSet:
-        nodeSet.add(frameUID)
-        nodes.append({"data": node})
-    
-    if data.get("parentFrameUID"):
-        edge = {
-            "id": max((x.get("data").get("id") for x in edges)) + 1,
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from itertools import chain, count
+from tempfile import TemporaryDirectory
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Set, Union, Optional, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from logreader import LogReader
+from logfollow import CaptureFollower
+from logrotate import LOG_NAME
+from logstream import captureFiles, mergeRecords, streamFiles
+from graphwriters import Edge, Node, Writer, WRITERS, getWriter
+from graphsummary import LEVELS, SummaryWriter
+
+class GraphBuilder(object):
+    """Build the provenance graph of a log in one pass. Edge ids come from a counter, and
+    nodes are indexed by id, so that each record is handled in constant time. Edges are
+    handed to `writer` as soon as they are built, only the nodes are kept until `close`.
+    """
+
+    def __init__(self, writer: Writer, namespace: Optional[str] = None) -> None:
+        """
+        Args:
+            writer (Writer): writer of the graph, see `graphwriters`
+            namespace (Optional[str]): prefix of the ids local to a capture, such as frame UIDs,
+                when the graphs of several captures are combined
+        """
+        self.writer = writer
+        self.namespace = namespace
+        self.nodes: Dict[Union[str, int], Node] = {}
+        self._edge_ids = count(1)
+        self.edges: int = 0
+        # Ids of the nodes added or updated, tracked when set
+        self.touched: Optional[Set[Union[str, int]]] = None
+        self.mapping: Dict[str, Callable[[str, str, dict], None]] = {
+            "[Frame Execute Script]": self.frameExecuteScript,
+            "[Frame Navigate by User]": self.frameNavigated,
+            "[Frame Navigate by Script]": self.frameNavigated,
+            "[Frame Navigate by Other]": self.frameNavigated,
+            "[Frame Navigate by HTTP]": self.frameNavigated,
+            "[Frame Navigate by HTML]": self.frameNavigated,
+            "[Main Frame Created]": self.frameCreated,
+            "[Sub-Frame Created]": self.frameCreated,
+            "[Frame Attach to Frame]": self.frameAttachToFrame,
+            "[Script Create Sub-Frame]": self.scriptCreateSubFrame,
+            "[Script Initiate Remote Script]": self.scriptInitiateRemoteScript,
+            "[Frame Info Update to]": self.frameInfoUpdate
+        }
+        return None
+
+    def feed(self, record: Dict[str, Any]) -> None:
+        handler = self.mapping.get(record.get("eventName"))
+        if handler:
+            handler(record.get("timestamp"), record.get("eventName"), record.get("eventData"))
+        return None
+
+    def close(self) -> None:
+        self.writer.close(self.nodes.values())
+        return None
+
+    def scoped(self, id_: Optional[Union[str, int]]) -> Optional[Union[str, int]]:
+        return f"{self.namespace}/{id_}" if self.namespace and id_ is not None else id_
+
+    def addNode(self, node: Node, merge: bool = True) -> None:
+        """Add a node, or merge it into the node of the same id: properties are updated, and
+        the other fields are replaced when set.
+        """
+        current = self.nodes.get(node.get("id"))
+        if current is None or merge:
+            if self.touched is not None:
+                self.touched.add(node.get("id"))
+        if current is None:
+            self.nodes[node.get("id")] = node
+        elif merge:
+            properties = dict(current.get("properties") or {})
+            properties.update(node.get("properties") or {})
+            current.update({k: v for k, v in node.items() if v})
+            current["properties"] = properties
+        return None
+
+    def merge(self, nodes: Iterable[Node], edges: Iterable[Edge]) -> None:
+        """Merge a partial graph. Frame nodes are merged, the first of other nodes is kept,
+        and edges are renumbered.
+        """
+        for node in nodes:
+            self.addNode(node, merge = node.get("_node_class") == "Frame")
+        for edge in edges:
+            self.edges += 1
+            self.writer.edge(dict(edge, id = next(self._edge_ids)))
+        return None
+
+    def addEdge(self, timestamp: str, event_name: str, source: Union[str, int], target: Union[str, int]) -> None:
+        self.edges += 1
+        self.writer.edge({
+            "id": next(self._edge_ids),
             "type": event_name,
             "properties": {"timestamp": timestamp},
-            "source": data.get("parentFrameUID"),
-            "target": frameUID,
+            "source": source,
+            "target": target,
             "_display": event_name
+        })
+        return None
+
+    @staticmethod
+    def frameNode(frameUID: str, data: dict, display: Optional[str]) -> Node:
+        return {
+            "id": frameUID,
+            "properties": data,
+            "_display": display,
+            "_node_type": "Main-Frame" if data.get("mainFrame") else "Sub-Frame",
+            "_node_class": "Frame",
+            "_color": "#1F77B4" if data.get("mainFrame") else "#AEC7E8"
         }
-        edges.append({"data": edge})
-    return None
- 
-def frameExecuteScript(timestamp: str, event_name: str, eventData: dict) -> None:
-    # [Frame Execute Script]
-    script = eventData.get("Script")
-    node = {
-        "id": script.get("domainHash"),
-        "_node_type": "JavaScript",
-        "_node_class": "Script",
-        "_display": script.get("domain"),
-        "_color": "#FFBB78",
-        "properties": script
-    }
-    if node.get("id") not in nodeSet:
-        nodeSet.add(node.get("id"))
-        nodes.append({"data": node})
-    
-    edge = {
-        "id":  max((x.get("data").get("id") for x in edges), default = 0) + 1,
-        "type": event_name,
-        "properties": {"timestamp": timestamp},
-        "source": eventData.get('frameUID'),
-        "target": node.get("id"),
-        "_display": event_name
-    }
-    edges.append({"data": edge})
-    return None
 
-def frameNavigated(timestamp: str, event_name: str, eventData:dict) -> None:
-    # [Frame Navigate by User]
-    # [Frame Navigate by Script]
-    # [Frame Navigate by Other]
-    # [Frame Navigate by HTML]
-    # [Frame Navigate by HTTP]
-
-    newFrameId = eventData.get('frameUID')
-    if type(newFrameId) != str:
-        print(f"Invalid: {eventData}")
-    data = eventData.get('frameInfo')
-    title = data.get("title").encode('utf-8').decode() if data.get("title") else None
-    node = {
-        "id": newFrameId,
-        "properties": data,
-        "_display": title if title else data.get("url", {}).get("netloc"),
-        "_node_type": "Main-Frame" if data.get("mainFrame") else "Sub-Frame",
-        "_node_class": "Frame",
-        "_color": "#1F77B4" if data.get("mainFrame") else "#AEC7E8"
-    }
-    nodes.append({"data": node})
-    edge = {
-        "id": max((x.get("data").get("id") for x in edges)) + 1,
-        "type": event_name,
-        "properties": {"timestamp": timestamp},
-        "source": eventData.get("originFrameUID"),
-        "target": newFrameId,
-        "_display": event_name
-    }
-    edges.append({"data": edge})
-    pass
-
-def frameAttachToFrame(timestamp: str, event_name: str, eventData: dict) -> None:
-    # [Frame Attach to Frame]
-    frameUID = eventData.get('frameUID')
-    data = eventData.get('frameInfo')
-    title = data.get("title").encode('utf-8').decode() if data.get("title") else None
-    node = {
-        "id": frameUID,
-        "properties": data,
-        "_display": title if title else data.get("url") if data.get("url") else "Empty",
-        "_node_type": "Main-Frame" if data.get("mainFrame") else "Sub-Frame",
-        "_node_class": "Frame",
-        "_color": "#1F77B4" if data.get("mainFrame") else "#AEC7E8"
-    }
-    nodes.append({"data": node})
-    edge = {
-        "id": max((x.get("data").get("id") for x in edges)) + 1,
-        "type": event_name,
-        "properties": {"timestamp": timestamp},
-        "source": frameUID,
-        "target": eventData.get('parentFrameUID'),
-        "_display": event_name
-    }
-    edges.append({"data": edge})
-    pass
-
-def scriptCreateSubFrame(timestamp: str, event_name: str, eventData: dict) -> None:
-    # [Script Create Sub-Frame]
-    scriptId = eventData.get('scriptDomainHash')
-    frameUID = eventData.get('frameUID')
-    if isinstance(scriptId, dict):
-        node = {
-            "id": scriptId.get("url") if scriptId.get("url") else scriptId.get("scriptId"),
-            "properties": scriptId,
-            "_display": scriptId.get('scriptId'),
+    @staticmethod
+    def scriptNode(id_: Union[str, int], script: dict, display: Optional[str]) -> Node:
+        return {
+            "id": id_,
+            "properties": script,
+            "_display": display,
             "_node_type": "JavaScript",
             "_node_class": "Script",
             "_color": "#FFBB78"
         }
-        if not node.get("id") in nodeSet:
-            nodeSet.add(node.get("id"))
-            nodes.append({"data": node})
-        scriptId = node.get("id")
-    edge = {
-        "id": max((x.get("data").get("id") for x in edges)) + 1,
-        "type": event_name,
-        "properties": {"timestamp": timestamp},
-        "source": scriptId,
-        "target": frameUID,
-        "_display": event_name
-    }
-    edges.append({"data": edge})
+
+    def frameCreated(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Main Frame Created]
+        # [Sub-Frame Created]
+        frameUID = eventData.get("frameUID")
+        assert type(frameUID) == str, f"eventData: {eventData}, newFrameUID: {frameUID}"
+
+        data = eventData.get("frameInfo")
+        self.addNode(
+            self.frameNode(self.scoped(frameUID), data, data.get("title") if data.get("title") else data.get("url", {}).get("netloc")),
+            merge = False
+        )
+        if data.get("parentFrameUID"):
+            self.addEdge(timestamp, event_name, self.scoped(data.get("parentFrameUID")), self.scoped(frameUID))
+        return None
+
+    def frameExecuteScript(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Frame Execute Script]
+        script = eventData.get("Script")
+        self.addNode(self.scriptNode(script.get("domainHash"), script, script.get("domain")), merge = False)
+        self.addEdge(timestamp, event_name, self.scoped(eventData.get('frameUID')), script.get("domainHash"))
+        return None
+
+    def frameNavigated(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Frame Navigate by User]
+        # [Frame Navigate by Script]
+        # [Frame Navigate by Other]
+        # [Frame Navigate by HTML]
+        # [Frame Navigate by HTTP]
+        newFrameId = eventData.get('frameUID')
+        if type(newFrameId) != str:
+            print(f"Invalid: {eventData}")
+        data = eventData.get('frameInfo')
+        title = data.get("title").encode('utf-8').decode() if data.get("title") else None
+        self.addNode(self.frameNode(self.scoped(newFrameId), data, title if title else data.get("url", {}).get("netloc")))
+        self.addEdge(timestamp, event_name, self.scoped(eventData.get("originFrameUID")), self.scoped(newFrameId))
+        return None
+
+    def frameAttachToFrame(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Frame Attach to Frame]
+        frameUID = eventData.get('frameUID')
+        data = eventData.get('frameInfo')
+        title = data.get("title").encode('utf-8').decode() if data.get("title") else None
+        self.addNode(self.frameNode(self.scoped(frameUID), data, title if title else data.get("url") if data.get("url") else "Empty"))
+        self.addEdge(timestamp, event_name, self.scoped(frameUID), self.scoped(eventData.get('parentFrameUID')))
+        return None
+
+    def scriptCreateSubFrame(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Script Create Sub-Frame]
+        scriptId = eventData.get('scriptDomainHash')
+        frameUID = eventData.get('frameUID')
+        if isinstance(scriptId, dict):
+            node = self.scriptNode(
+                scriptId.get("url") if scriptId.get("url") else self.scoped(scriptId.get("scriptId")),
+                scriptId,
+                scriptId.get('scriptId')
+            )
+            self.addNode(node, merge = False)
+            scriptId = node.get("id")
+        self.addEdge(timestamp, event_name, scriptId, self.scoped(frameUID))
+        return None
+
+    def scriptInitiateRemoteScript(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Script Initiate Remote Script]
+        parentScript = eventData.get("parentScript")
+        childScript = eventData.get("childScript")
+        if parentScript.get('domainHash') == "Null/Null":
+            self.addNode(self.scriptNode("Null/Null", parentScript, parentScript.get('scriptId')), merge = False)
+        self.addNode(self.scriptNode(childScript.get("domainHash"), childScript, childScript.get("domain")), merge = False)
+        self.addEdge(timestamp, event_name, parentScript.get('domainHash'), childScript.get("domainHash"))
+        return None
+
+    def frameInfoUpdate(self, timestamp: str, event_name: str, eventData: dict) -> None:
+        # [Frame Info Update to]
+        newFrameUID = eventData.get("frameNewUID")
+        assert type(newFrameUID) == str, f"eventData: {eventData}, newFrameUID: {newFrameUID}"
+        data = eventData.get("frameInfo")
+        title = data.get("title").encode('utf-8').decode() if data.get("title") else None
+        self.addNode(self.frameNode(self.scoped(newFrameUID), data, title if title else data.get("url", {}).get("netloc", "Empty")))
+        self.addEdge(timestamp, event_name, self.scoped(eventData.get('frameOriginUID')), self.scoped(newFrameUID))
+        return None
+
+def records(
+    paths: Iterable[str],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    events: Optional[Iterable[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Records of the log files, between the ISO timestamps `since` and `until` (a prefix
+    such as `2021-06-01T10` included), of the `events` names if set. The split streams of a
+    capture are merged back in writing order, see `logstream.mergeRecords`.
+    """
+    events = set(events) if events else None
+    for streams in captureFiles(paths).values():
+        readers = [chain.from_iterable(_fileRecords(x, since, until, events) for x in files) for files in streams.values()]
+        yield from readers[0] if len(readers) == 1 else mergeRecords(readers)
+
+def _fileRecords(path: str, since: Optional[str], until: Optional[str], events: Optional[Set[str]]) -> Iterator[Dict[str, Any]]:
+    with LogReader(path) as reader:
+        # Records of other events are skipped before being decoded
+        for record in reader.records(events = events):
+            timestamp = record.timestamp or ""
+            if until and timestamp[:len(until)] > until:
+                # Records of a file are in time order
+                break
+            if since and timestamp < since:
+                continue
+            if (decoded := (record.record())) is not None:
+                yield decoded
+
+def accept(record: Dict[str, Any], since: Optional[str] = None, events: Optional[Set[str]] = None) -> bool:
+    if since and (record.get("timestamp") or "") < since:
+        return False
+    return events is None or record.get("eventName") in events
+
+def expandLogs(paths: Iterable[str]) -> List[str]:
+    """Log files of `paths`, the files of a directory stream by stream, each in writing order.
+    `records` restores the combined order of split streams.
+    """
+    logs = []
+    for path in paths:
+        if not os.path.isdir(path):
+            logs.append(path)
+            continue
+        prefixes = sorted({m.group('prefix') for x in os.listdir(path) if (m := (LOG_NAME.match(x)))})
+        for prefix in prefixes:
+            logs.extend(streamFiles(path, prefix))
+    return logs
+
+class _EdgeSpool(object):
+    """Writer of the partial graph of a worker: edges go to a json lines file, the nodes are
+    returned to the parent process.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.fd = open(path, "w", encoding = "utf-8", buffering = 1 << 20)
+        return None
+
+    def edge(self, edge: Edge) -> None:
+        self.fd.write(json.dumps(edge) + "\n")
+        return None
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        self.fd.close()
+        return None
+
+def _partial(task: Tuple[List[str], Optional[str], str, Dict[str, Any]]) -> Tuple[Dict[Union[str, int], Node], str]:
+    paths, namespace, spool, filters = task
+    builder = GraphBuilder(_EdgeSpool(spool), namespace = namespace)
+    for record in records(paths, **filters):
+        builder.feed(record)
+    builder.close()
+    return builder.nodes, spool
+
+def transform(paths: Iterable[str], writer: Writer, jobs: int = 1, **filters) -> GraphBuilder:
+    """Build the graph of the log files. With several captures, ids local to a capture are
+    prefixed with its `<username>-<tag>`. With `jobs` > 1, the partial graph of each part is
+    built by a worker process, and merged in the order of `paths`. A part is a log file, or
+    all the files of a capture in the split layout, whose streams are read together.
+    """
+    captures = captureFiles(paths)
+    parts: List[Tuple[List[str], Optional[str]]] = []
+    for capture, streams in captures.items():
+        namespace = capture if len(captures) > 1 else None
+        if len(streams) == 1:
+            parts.extend(([x], namespace) for x in next(iter(streams.values())))
+        else:
+            parts.append(([x for files in streams.values() for x in files], namespace))
+    builder = GraphBuilder(writer)
+    if jobs <= 1 or len(parts) <= 1:
+        for part, namespace in parts:
+            builder.namespace = namespace
+            for record in records(part, **filters):
+                builder.feed(record)
+        builder.close()
+        return builder
+
+    with TemporaryDirectory(prefix = "chromo-graph-") as tmp, ProcessPoolExecutor(max_workers = jobs) as pool:
+        tasks = [(part, namespace, os.path.join(tmp, f"{i}.edges"), filters) for i, (part, namespace) in enumerate(parts)]
+        for nodes, spool in pool.map(_partial, tasks):
+            with open(spool, "r", encoding = "utf-8") as fd:
+                builder.merge(nodes.values(), (json.loads(x) for x in fd))
+            os.remove(spool)
+    builder.close()
+    return builder
+
+class _FollowWriter(object):
+    """Writer of the follow mode: edges are kept until the next delta is written, and spooled
+    for the snapshots.
+    """
+
+    def __init__(self, spool: Optional[str] = None) -> None:
+        self.pending: List[Edge] = []
+        self.spool = spool
+        self.fd = open(spool, "w", encoding = "utf-8") if spool else None
+        return None
+
+    def edge(self, edge: Edge) -> None:
+        self.pending.append(edge)
+        if self.fd:
+            self.fd.write(json.dumps(edge) + "\n")
+        return None
+
+    def edges(self) -> Iterator[Edge]:
+        self.fd.flush()
+        with open(self.spool, "r", encoding = "utf-8") as fd:
+            for line in fd:
+                yield json.loads(line)
+
+    def close(self, nodes: Iterable[Node]) -> None:
+        if self.fd:
+            self.fd.close()
+        return None
+
+def writeSnapshot(builder: GraphBuilder, path: str, format_: Optional[str] = None) -> None:
+    """Write the whole graph to `path`, replacing the previous snapshot only once complete"""
+    logdir, name = os.path.split(os.path.abspath(path))
+    with TemporaryDirectory(prefix = f".{name}.", dir = logdir) as tmp:
+        writer = getWriter(os.path.join(tmp, name), format_)
+        for edge in builder.writer.edges():
+            writer.edge(edge)
+        writer.close(builder.nodes.values())
+        for x in os.listdir(tmp):
+            os.replace(os.path.join(tmp, x), os.path.join(logdir, x))
     return None
 
-def scriptInitiateRemoteScript(timestamp: str, event_name: str, eventData: dict) -> None:
-    # [Script Initiate Remote Script]
-    parentScript = eventData.get("parentScript")
-    childScript = eventData.get("childScript")
-    if parentScript.get('domainHash') == "Null/Null":
-        if "Null/Null" not in nodeSet:
-            node = {
-                "id": "Null/Null",
-                "properties": parentScript,
-                "_display": parentScript.get('scriptId'),
-                "_node_type": "JavaScript",
-                "_node_class": "Script",
-                "_color": "#FFBB78"
-            }
-            nodes.append({"data": node})
-            nodeSet.add(node.get("id"))
-    if not childScript.get("domainHash") in nodeSet:
-        node = {
-            "id": childScript.get("domainHash"),
-            "properties": childScript,
-            "_display": childScript.get("domain"),
-            "_node_type": "JavaScript",
-            "_node_class": "Script",
-            "_color": "#FFBB78"
-        }
-        nodes.append({"data": node})
-        nodeSet.add(node.get("id"))
-    edge = {
-        "id": max((x.get("data").get("id") for x in edges)) + 1,
-        "type": event_name,
-        "properties": {"timestamp": timestamp},
-        "source": parentScript.get('domainHash'),
-        "target": childScript.get("domainHash"),
-        "_display": event_name
-    }
-    edges.append({"data": edge})
-    pass
-
-def frameInfoUpdate(timestamp: str, event_name: str, eventData: dict) -> None:
-    # [Frame Info Update to]
-    newFrameUID = eventData.get("frameNewUID")
-    assert type(newFrameUID) == str, f"eventData: {eventData}, newFrameUID: {newFrameUID}"
-    data = eventData.get("frameInfo")
-    title = data.get("title").encode('utf-8').decode() if data.get("title") else None
-    node = {
-        "id": newFrameUID,
-        "properties": data,
-        "_display": title if title else data.get("url", {}).get("netloc", "Empty"),
-        "_node_type": "Main-Frame" if data.get("mainFrame") else "Sub-Frame",
-        "_node_class": "Frame",
-        "_color": "#1F77B4" if data.get("mainFrame") else "#AEC7E8"
-    }
-    nodes.append({"data": node})
-    edge = {
-        "id": max((x.get("data").get("id") for x in edges)) + 1,
-        "type": event_name,
-        "properties": {"timestamp": timestamp},
-        "source": eventData.get('frameOriginUID'),
-        "target": newFrameUID,
-        "_display": event_name
-    }
-    edges.append({"data": edge})
-    pass
+def follow(
+    path: str,
+    out: str,
+    snapshot: Optional[str] = None,
+    format_: Optional[str] = None,
+    interval: float = 1.0,
+    snapshot_interval: float = 30.0,
+    since: Optional[str] = None,
+    events: Optional[Iterable[str]] = None
+) -> GraphBuilder:
+    """Build the graph of a capture while it is written, until interrupted. Every stream of
+    the capture of `path` is followed, see `logfollow.CaptureFollower`. Every `interval`
+    seconds, the records appended since the last poll are fed to the builder, and the delta
+    of the graph is appended to `out` as a json line:
+        {"timestamp": <iso>, "records": <records read>, "nodes": [<added or updated nodes>], "edges": [<new edges>]}
+    With `snapshot`, the whole graph is also written there in `format_` every
+    `snapshot_interval` seconds if it has changed, and when following stops.
+    """
+    events = set(events) if events else None
+    follower = CaptureFollower(path)
+    with TemporaryDirectory(prefix = "chromo-follow-") as tmp, open(out, "a", encoding = "utf-8") as fd:
+        builder = GraphBuilder(_FollowWriter(os.path.join(tmp, "edges") if snapshot else None))
+        builder.touched = set()
+        changed, snapshot_at = False, time.monotonic()
+        try:
+            while True:
+                polled = follower.poll()
+                for record in polled:
+                    if accept(record, since, events):
+                        builder.feed(record)
+                if builder.touched or builder.writer.pending:
+                    fd.write(json.dumps({
+                        "timestamp": datetime.now().isoformat(),
+                        "records": len(polled),
+                        "nodes": [builder.nodes[x] for x in builder.touched],
+                        "edges": builder.writer.pending
+                    }) + "\n")
+                    fd.flush()
+                    builder.touched.clear()
+                    builder.writer.pending = []
+                    changed = True
+                if snapshot and changed and time.monotonic() - snapshot_at >= snapshot_interval:
+                    writeSnapshot(builder, snapshot, format_)
+                    changed, snapshot_at = False, time.monotonic()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        if snapshot and changed:
+            writeSnapshot(builder, snapshot, format_)
+        builder.close()
+    return builder
 
 def main():
-    mapping = {
-        "[Frame Execute Script]": frameExecuteScript,
-        "[Frame Navigate by User]": frameNavigated,
-        "[Frame Navigate by Script]": frameNavigated,
-        "[Frame Navigate by Other]": frameNavigated,
-        "[Frame Navigate by HTTP]": frameNavigated,
-        "[Frame Navigate by HTML]": frameNavigated,
-        "[Main Frame Created]": frameCreated,
-        "[Sub-Frame Created]": frameCreated,
-        "[Frame Attach to Frame]": frameAttachToFrame,
-        "[Script Create Sub-Frame]": scriptCreateSubFrame,
-        "[Script Initiate Remote Script]": scriptInitiateRemoteScript,
-        "[Frame Info Update to]": frameInfoUpdate
-    }
-    with open(IN_FILE) as fd:
-        for line in fd:
-            try:
-                line = line.split(' - ')
-                line = " - ".join([line[-2], line[-1]])
-                info = json.loads(line)
-                print("success")
-            except:
-                continue
-            event: str = info.get("event", "")
-            eid, event_name = event.split(" - ")
-            event_data = info.get("eventData")
-            timestamp = info.get("timestamp")
-            handler = mapping.get(event_name)
-            if handler:
-                handler(timestamp, event_name, event_data)
-        pass
-
-    graph = {
-        "directed": True,
-        "multigraph": True,
-        "nodes": nodes,
-        "edges": edges
-    }
-    with open(OUT_DIR, mode = 'w') as fd:
-        json.dump(graph, fd)
+    parser = argparse.ArgumentParser(description = "Build the provenance graph of Chromo logs")
+    parser.add_argument("logs", type = str, nargs = "+", help = "Log files in time order, or directories of log files. Plain or gzipped, in any format.")
+    parser.add_argument("-o", "--out", type = str, required = True, help = "Output file, `<out>.nodes.csv` and `<out>.edges.csv` for csv")
+    parser.add_argument("-f", "--format", type = str, choices = list(WRITERS.keys()), help = "Output format, guessed from the output suffix if not set")
+    parser.add_argument("--since", type = str, help = "Earliest ISO timestamp of the records")
+    parser.add_argument("--until", type = str, help = "Latest ISO timestamp of the records, e.g. 2021-06-01T10")
+    parser.add_argument("--events", type = str, help = "Comma separated event names, e.g. \"Frame Execute Script,Sub-Frame Created\"")
+    parser.add_argument("-j", "--jobs", type = int, default = 1, help = "Worker processes building the graphs of the log files")
+    parser.add_argument("--levels", type = int, default = 0, choices = range(LEVELS + 1), help = "Also write that many summarized levels of detail next to the output, see `graphsummary`")
+    parser.add_argument("--follow", action = "store_true", help = "Follow the capture of a log while it is written, all of its streams. `--out` gets the graph deltas as json lines.")
+    parser.add_argument("--snapshot", type = str, help = "Follow mode: also write the whole graph there, in `--format`")
+    parser.add_argument("--interval", type = float, default = 1.0, help = "Follow mode: seconds between polls of the log")
+    parser.add_argument("--snapshot-interval", type = float, default = 30.0, help = "Follow mode: minimum seconds between snapshots")
+    args = parser.parse_args()
+
+    if args.follow:
+        if args.levels:
+            parser.error("levels of detail are only written by batch builds")
+        if len(args.logs) != 1 or not os.path.isfile(args.logs[0]):
+            parser.error("follow mode takes one log file, the first one to read")
+        builder = follow(
+            args.logs[0],
+            args.out,
+            snapshot = args.snapshot,
+            format_ = args.format,
+            interval = args.interval,
+            snapshot_interval = args.snapshot_interval,
+            since = args.since,
+            events = [f"[{x.strip().strip('[]')}]" for x in args.events.split(",")] if args.events else None
+        )
+        print(f"[+ {len(builder.nodes)} nodes, {builder.edges} edges followed]")
+        return None
+
+    logs = expandLogs(args.logs)
+    for path in logs:
+        if not os.path.exists(path):
+            parser.error(f"log file not found: {path}")
+    events = [f"[{x.strip().strip('[]')}]" for x in args.events.split(",")] if args.events else None
+    writer = getWriter(args.out, args.format)
+    if args.levels:
+        writer = SummaryWriter(writer, args.out, levels = args.levels)
+    builder = transform(
+        logs,
+        writer,
+        jobs = args.jobs,
+        since = args.since,
+        until = args.until,
+        events = events
+    )
+    print(f"[+ {len(builder.nodes)} nodes, {builder.edges} edges written to {args.out}]")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()